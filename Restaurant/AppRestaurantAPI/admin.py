@@ -7,4 +7,8 @@ admin.site.register(Category)
 admin.site.register(MenuItem)
 admin.site.register(Cart)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(Table)
+admin.site.register(Seating)
+admin.site.register(Booking)
+admin.site.register(ArchivedOrder)
\ No newline at end of file
@@ -0,0 +1,209 @@
+#Sales and menu reports (GET /api/analytics/<report>, managers only), served from the rollup tables DailySales and ItemSales.
+#The checkout adds every new order to the rollups inside its own transaction (record_order), with a constant number of queries:
+#the missing rows of the day are inserted empty (INSERT .. ON CONFLICT DO NOTHING), then incremented with one UPDATE per table.
+#A report over a year reads at most 365 DailySales rows or 365 x (menu items) ItemSales rows instead of every OrderItem.
+#Orders created or changed outside the checkout (admin, shell) are not counted until "manage.py rebuild_sales" is run
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Min, PositiveIntegerField, Q, Sum, Value, When
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import ArchivedOrder, ArchivedOrderItem, DailySales, ItemSales, Order, OrderItem
+
+
+#The most rows the top-items report returns
+MAX_TOP = 100
+
+
+#Adds a new order to the rollups. "items" are the rows of the order: dicts with menuitem_id, category_id, quantity and price
+def record_order(order, items):
+    DailySales.objects.bulk_create([DailySales(date=order.date)], ignore_conflicts=True)
+    DailySales.objects.filter(date=order.date).update(
+        orders=F('orders') + 1,
+        items=F('items') + sum(item['quantity'] for item in items),
+        revenue=F('revenue') + order.total,
+    )
+
+    ItemSales.objects.bulk_create([
+        ItemSales(date=order.date, menuitem_id=item['menuitem_id'], category_id=item['category_id']) for item in items
+    ], ignore_conflicts=True)
+    ItemSales.objects.filter(date=order.date, menuitem_id__in=[item['menuitem_id'] for item in items]).update(
+        quantity=F('quantity') + Case(
+            *[When(menuitem_id=item['menuitem_id'], then=Value(item['quantity'])) for item in items],
+            output_field=PositiveIntegerField(),
+        ),
+        revenue=F('revenue') + Case(
+            *[When(menuitem_id=item['menuitem_id'], then=Value(item['price'])) for item in items],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+#Builds the rollups of the days start..end (both included) again from the orders, live and archived (see archive.py), in one transaction.
+#The item rollups are written with INSERT .. SELECT, the aggregated rows never go through python
+def rebuild(start, end):
+    with transaction.atomic():
+        DailySales.objects.filter(date__range=(start, end)).delete()
+        ItemSales.objects.filter(date__range=(start, end)).delete()
+
+        days = {}
+        for orders, items in ((Order.objects, OrderItem.objects), (ArchivedOrder.objects, ArchivedOrderItem.objects)):
+            for day, count, revenue in (
+                orders.filter(date__range=(start, end)).order_by().values_list('date').annotate(Count('id'), Sum('total'))
+            ):
+                sales = days.setdefault(day, DailySales(date=day))
+                sales.orders += count
+                sales.revenue += revenue
+            for day, quantity in (
+                items.filter(order__date__range=(start, end)).order_by().values_list('order__date').annotate(Sum('quantity'))
+            ):
+                days[day].items += quantity
+        DailySales.objects.bulk_create(days.values())
+
+        sold = [
+            items.filter(order__date__range=(start, end)).order_by().values(
+                sold_date=F('order__date'), sold_menuitem=F('menuitem_id'), sold_category=F('menuitem__category_id'),
+                sold_quantity=F('quantity'), sold_price=F('price'),
+            )
+            for items in (OrderItem.objects, ArchivedOrderItem.objects)
+        ]
+        insert_grouped(ItemSales, ['date', 'menuitem', 'category'], ['quantity', 'revenue'], sold[0].union(sold[1], all=True))
+
+
+#Runs INSERT INTO <table of the model> (<columns of the fields>) SELECT <the columns of the queryset>
+def insert_from(model, fields, queryset):
+    sql, params = queryset.query.sql_with_params()
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) {sql}', params)
+
+
+#Like insert_from, for rows to add up first: the columns of the queryset (which can be a union) are the "keys" then the "sums",..
+#..and INSERT INTO .. SELECT <keys>, SUM(<sums>) FROM (<queryset>) GROUP BY <keys> is run
+def insert_grouped(model, keys, sums, queryset):
+    sql, params = queryset.query.sql_with_params()
+    quote = connection.ops.quote_name
+    aliases = [quote(alias) for alias in queryset.query.values_select or queryset.query.annotation_select]
+    grouped = ', '.join(aliases[:len(keys)])
+    selected = ', '.join([grouped, *(f'SUM({alias})' for alias in aliases[len(keys):])])
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in keys + sums)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) SELECT {selected} FROM ({sql}) sold GROUP BY {grouped}', params
+        )
+
+
+#Rebuilds the rollups of the whole history, "days" days per transaction. Returns the number of chunks
+def rebuild_all(days=31):
+    dates = [
+        date for orders in (Order.objects, ArchivedOrder.objects)
+        for date in orders.aggregate(first=Min('date'), last=Max('date')).values() if date is not None
+    ]
+    first, last = (min(dates), max(dates)) if dates else (None, None)
+    #rollups of days without any order anymore
+    outside = Q(date__lt=first) | Q(date__gt=last) if first else Q()
+    DailySales.objects.filter(outside).delete()
+    ItemSales.objects.filter(outside).delete()
+
+    chunks = 0
+    start = first
+    while start is not None and start <= last:
+        end = min(start + timedelta(days=days - 1), last)
+        rebuild(start, end)
+        chunks += 1
+        start = end + timedelta(days=1)
+    return chunks
+
+
+def money(value):
+    return str((value or Decimal(0)).quantize(Decimal('0.01')))
+
+
+#Reads ?from=YYYY-MM-DD&to=YYYY-MM-DD, both optional
+def date_range(params):
+    dates = {}
+    for name in ('from', 'to'):
+        value = params.get(name)
+        if value:
+            try:
+                dates[name] = parse_date(value)
+            except ValueError:
+                dates[name] = None
+            if dates[name] is None:
+                raise ValidationError({name: 'Use the YYYY-MM-DD format.'})
+    return dates.get('from'), dates.get('to')
+
+
+def in_range(queryset, start, end):
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def daily(params, start, end):
+    return [
+        {'date': row['date'], 'orders': row['orders'], 'items': row['items'], 'revenue': money(row['revenue'])}
+        for row in in_range(DailySales.objects.all(), start, end).order_by('date').values('date', 'orders', 'items', 'revenue')
+    ]
+
+
+def categories(params, start, end):
+    rows = (
+        in_range(ItemSales.objects.all(), start, end)
+        .values('category_id', 'category__title')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('-total_revenue', 'category_id')
+    )
+    return [
+        {'category': row['category_id'], 'title': row['category__title'], 'quantity': row['total_quantity'],
+         'revenue': money(row['total_revenue'])}
+        for row in rows
+    ]
+
+
+def item_rows(start, end, ordering):
+    return (
+        in_range(ItemSales.objects.all(), start, end)
+        .values('menuitem_id', 'menuitem__title')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by(*ordering)
+    )
+
+
+def format_items(rows):
+    return [
+        {'menuitem': row['menuitem_id'], 'title': row['menuitem__title'], 'quantity': row['total_quantity'],
+         'revenue': money(row['total_revenue'])}
+        for row in rows
+    ]
+
+
+def menu_items(params, start, end):
+    return format_items(item_rows(start, end, ['-total_revenue', 'menuitem_id']))
+
+
+#?limit=N (10 by default) items with the highest ?by=revenue (default) or ?by=quantity
+def top_items(params, start, end):
+    by = params.get('by', 'revenue')
+    if by not in ('revenue', 'quantity'):
+        raise ValidationError({'by': 'Use revenue or quantity.'})
+    try:
+        limit = min(max(int(params.get('limit', 10)), 1), MAX_TOP)
+    except ValueError:
+        raise ValidationError({'limit': 'A number is required.'})
+    return format_items(item_rows(start, end, [f'-total_{by}', 'menuitem_id'])[:limit])
+
+
+REPORTS = {
+    'daily': daily,
+    'categories': categories,
+    'menu-items': menu_items,
+    'top-items': top_items,
+}
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApprestaurantapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'AppRestaurantAPI'
+
+    #importing the signals module connects its receivers once the models are ready
+    def ready(self):
+        from . import signals
@@ -0,0 +1,56 @@
+#Archiving of the order history: the delivered orders older than ORDER_ARCHIVE_DAYS are moved with their items from Order /..
+#..OrderItem into ArchivedOrder / ArchivedOrderItem, so /api/orders and /api/orders/<id> (and their COUNT(*), index scans..
+#..and the prefetch of the items) only ever see the recent orders, however long the history gets. The history is read at..
+#../api/orders/archive. The sales rollups keep counting the archived orders (see analytics.rebuild).
+#The orders are moved in batches of ids, oldest first, one transaction per batch: the rows are copied with INSERT .. SELECT,..
+#..so they never go through python, then deleted from the live tables. Run it from cron with "manage.py archive_orders"
+
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import insert_from
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+BATCH_SIZE = 1000
+
+ORDER_FIELDS = ['id', 'user', 'delivery_crew', 'status', 'total', 'date']
+ITEM_FIELDS = ['order', 'menuitem', 'quantity', 'price']
+
+
+#The orders of days before this date can be archived
+def archive_cutoff(days=None):
+    days = getattr(settings, 'ORDER_ARCHIVE_DAYS', 365) if days is None else days
+    return timezone.localdate() - datetime.timedelta(days=days)
+
+
+#Moves the delivered orders older than "days" days (ORDER_ARCHIVE_DAYS by default) into the archive and returns how many were moved.
+#"limit" stops after about that many orders, "progress" is called with the running count after every batch
+def archive_orders(days=None, batch_size=BATCH_SIZE, limit=None, progress=None):
+    cutoff = archive_cutoff(days)
+    archived = 0
+    while limit is None or archived < limit:
+        with transaction.atomic():
+            #the batch is locked, an order changed meanwhile (e.g. by a manager) waits for the batch or is skipped
+            ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(status=True, date__lt=cutoff)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            insert_from(ArchivedOrder, ORDER_FIELDS, Order.objects.filter(id__in=ids).order_by().values_list(
+                'id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date'))
+            insert_from(ArchivedOrderItem, ITEM_FIELDS, OrderItem.objects.filter(order_id__in=ids).order_by().values_list(
+                'order_id', 'menuitem_id', 'quantity', 'price'))
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            #the events of the orders go with them, the checkout jobs lose the link to the order
+            Order.objects.filter(id__in=ids).delete()
+        archived += len(ids)
+        if progress is not None:
+            progress(archived)
+    return archived
@@ -0,0 +1,214 @@
+#Async versions of the read-heavy endpoints (menu items, categories and the orders list), used when ASYNC_VIEWS is on in settings.py.
+#Under ASGI (Restaurant/asgi.py) a GET here doesn't hold a thread while it waits for the database or the cache: the queries go through..
+#..django's async ORM (acount, async for) and the cache through its async methods (aget, aset).
+#Everything these views don't handle themselves (POST/DELETE, the browsable API, cursor/search/ordering params) is passed on to the..
+#..sync DRF views from views.py, so the behaviour of the API stays the same
+
+import asyncio
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import events, views
+from .authentication import CachedTokenAuthentication
+from .menu_cache import get_menu_state, menu_etag, menu_page_key
+from .roles import get_roles, is_customer, is_delivery_crew
+
+
+#The only query params the async views handle, any other param sends the request to the sync view
+SIMPLE_PARAMS = {'page', 'page_size'}
+
+#The menu pages of the async views are cached apart from the ones of the sync views (see menu_page_key)
+CACHE_NAMESPACE = 'async'
+
+sync_categories = views.CategoriesView.as_view()
+sync_menu_items = views.MenuItemsView.as_view()
+sync_orders = views.OrderView.as_view()
+
+
+#True when the request can't be served by the async view and has to go to the sync DRF view
+def needs_sync_view(request):
+    return (
+        request.method != 'GET'
+        or bool(set(request.GET) - SIMPLE_PARAMS)
+        or 'text/html' in request.headers.get('Accept', '')
+    )
+
+
+async def call_sync_view(view, request, *args, **kwargs):
+    response = await sync_to_async(view)(request, *args, **kwargs)
+    #DRF responses are rendered lazily, the rendering may touch the database so it is done in the thread as well
+    if hasattr(response, 'render') and not response.is_rendered:
+        response = await sync_to_async(response.render)()
+    return response
+
+
+#Reads one page of the queryset with the page number pagination of the sync view (its page size, page_size param and..
+#..limit) and returns the response data, or None if the page doesn't exist
+async def page_data(request, queryset, view_class):
+    paginator = view_class.pagination_class()
+    page_size = paginator.get_page_size(Request(request))
+    try:
+        page = int(request.GET.get(paginator.page_query_param, 1))
+    except ValueError:
+        return None
+
+    count = await queryset.acount()
+    pages = max(1, math.ceil(count / page_size))
+    if page < 1 or page > pages:
+        return None
+
+    start = (page - 1) * page_size
+    rows = [row async for row in queryset[start:start + page_size]]
+
+    url = request.build_absolute_uri()
+    if page == 1:
+        previous = None
+    elif page == 2:
+        previous = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous = replace_query_param(url, paginator.page_query_param, page - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, paginator.page_query_param, page + 1) if page < pages else None,
+        'previous': previous,
+        'results': view_class.serializer_class(rows, many=True).data,
+    }
+
+
+def invalid_page():
+    return JsonResponse({'detail': 'Invalid page.'}, status=404)
+
+
+#Lists of the menu, answered from the versioned menu cache (menu_cache.py) the same way MenuCacheMixin does
+async def menu_list(request, view_class, sync_view):
+    if needs_sync_view(request):
+        return await call_sync_view(sync_view, request)
+
+    version, modified = await sync_to_async(get_menu_state)()
+    key = menu_page_key(request, CACHE_NAMESPACE)
+    etag = menu_etag(version, key)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = await cache.aget(key, version=version)
+    if data is None:
+        data = await page_data(request, view_class.queryset.all(), view_class)
+        if data is None:
+            return invalid_page()
+        await cache.aset(key, data, getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60), version=version)
+
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    return response
+
+
+@csrf_exempt
+async def categories(request):
+    return await menu_list(request, views.CategoriesView, sync_categories)
+
+
+@csrf_exempt
+async def menu_items(request):
+    return await menu_list(request, views.MenuItemsView, sync_menu_items)
+
+
+#Finds the user of the request with the authentication classes of REST_FRAMEWORK: first the token (CachedTokenAuthentication,..
+#..the same cached lookup as the sync views), then the session. Returns (user, error message)
+async def authenticate(request):
+    try:
+        result = await CachedTokenAuthentication().aauthenticate(request)
+    except AuthenticationFailed as error:
+        return None, str(error.detail)
+    if result is not None:
+        return result[0], None
+
+    #request.auser is added by the AuthenticationMiddleware of django 5.0 and later, before that only the lazy request.user,..
+    #..which may read the session and the user from the database, so it is resolved in a thread
+    if hasattr(request, 'auser'):
+        user = await request.auser()
+    else:
+        user = await sync_to_async(lambda: getattr(request, 'user', None))()
+    if user is not None and user.is_authenticated:
+        return user, None
+    return None, 'Authentication credentials were not provided.'
+
+
+@csrf_exempt
+async def orders(request):
+    if needs_sync_view(request):
+        return await call_sync_view(sync_orders, request)
+
+    user, error = await authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': error}, status=401, headers={'WWW-Authenticate': 'Token'})
+    request.user = user
+
+    #the roles are loaded (and cached on the request) before get_order_queryset reads them
+    await sync_to_async(get_roles)(request)
+    data = await page_data(request, views.get_order_queryset(request), views.OrderView)
+    if data is None:
+        return invalid_page()
+    return JsonResponse(data)
+
+
+#Stream of the changes of the orders the user can see (events.py), as Server-Sent Events:
+#   event: order
+#   data: {"id": 12, "status": true, "delivery_crew": 5}
+#A comment line is sent every ORDER_EVENTS_KEEPALIVE seconds so proxies don't close an idle connection
+@csrf_exempt
+async def order_events(request):
+    user, error = await authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': error}, status=401, headers={'WWW-Authenticate': 'Token'})
+    request.user = user
+
+    await sync_to_async(get_roles)(request)
+    if user.is_superuser:
+        scope = events.ALL
+    elif is_customer(request):
+        scope = events.OWN
+    elif is_delivery_crew(request):
+        scope = events.ASSIGNED
+    else:
+        scope = events.ALL
+
+    subscriber = events.Subscriber(user.pk, scope)
+    events.broker.subscribe(subscriber)
+    if getattr(settings, 'ORDER_EVENTS_DATABASE', False):
+        events.broker.start_listener()
+
+    response = StreamingHttpResponse(event_stream(subscriber), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    #nginx would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def event_stream(subscriber):
+    keepalive = getattr(settings, 'ORDER_EVENTS_KEEPALIVE', 15)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                return
+            yield events.format_event(event)
+    finally:
+        #runs as well when the client disconnects and the response is cancelled
+        events.broker.unsubscribe(subscriber)
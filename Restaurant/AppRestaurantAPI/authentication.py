@@ -0,0 +1,56 @@
+#Token authentication with the token -> user lookup cached.
+#DRF's TokenAuthentication joins authtoken_token with auth_user on every request, here the token (with its user) is kept in the..
+#..cache for TOKEN_CACHE_TIMEOUT seconds, and the groups of the user come from the role cache (roles.py), so an authenticated..
+#..request doesn't query the auth tables at all once both are cached.
+#The cached token is deleted when the token is deleted (logout through djoser's auth/token/logout, admin) and when the user is saved,..
+#..e.g. deactivated or made superuser (see signals.py)
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+
+def token_cache_key(key):
+    return f'token:{key}'
+
+
+def cache_token(token):
+    cache.set(token_cache_key(token.key), token, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 60 * 5))
+
+
+def invalidate_tokens(*keys):
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = cache.get(token_cache_key(key))
+        if token is None:
+            #raises AuthenticationFailed for unknown tokens and inactive users, those are never cached
+            user, token = super().authenticate_credentials(key)
+            cache_token(token)
+        return token.user, token
+
+    #The same authentication for the async views (async_views.py), which don't go through DRF: returns (user, token), or None..
+    #..when the request has no token header, raises AuthenticationFailed like authenticate()
+    async def aauthenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+
+        token = await cache.aget(token_cache_key(key))
+        if token is None:
+            user, token = await sync_to_async(super().authenticate_credentials)(key)
+            await sync_to_async(cache_token)(token)
+        return token.user, token
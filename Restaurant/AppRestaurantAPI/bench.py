@@ -0,0 +1,89 @@
+#Small helpers shared by the benchmark management commands (manage.py bench_*)
+#They time a callable several times and count the SQL queries it sends to the database
+
+import time
+import math
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+
+#The exception below is raised at the end of a benchmark run to roll back all the rows the benchmark created
+class Rollback(Exception):
+    pass
+
+
+#Returns the value at the given percentile (e.g. 95 for p95) from a list of numbers
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+#Runs "func" the number of times passed in "runs" and returns the latency percentiles in milliseconds, the throughput..
+#..(runs per second of timed work) and the number of queries of the last run. "setup" is called before each run and is not timed
+def measure(func, runs, setup=None):
+    timings = []
+    queries = 0
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(ctx.captured_queries)
+    return {
+        'queries': queries,
+        'throughput_rps': round(runs / (sum(timings) / 1000), 1) if sum(timings) else 0.0,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+    }
+
+
+#Runs "func" inside a transaction that is always rolled back, so a benchmark never leaves its data in the database
+def rolled_back(func):
+    try:
+        with transaction.atomic():
+            result = func()
+            raise Rollback()
+    except Rollback:
+        pass
+    return result
+
+
+#Request factory for calling the views directly. "localhost" is always allowed by ALLOWED_HOSTS while DEBUG is on,..
+#..unlike the default "testserver" which only the test runner allows
+def request_factory():
+    return APIRequestFactory(SERVER_NAME='localhost')
+
+
+#Test client for driving the whole stack (middleware, urls, views) in-process, with the same host as request_factory
+def api_client():
+    return APIClient(SERVER_NAME='localhost')
+
+
+#Latency increases smaller than this are noise, whatever the threshold
+MIN_DELTA_MS = 1.0
+
+
+#Compares the results of a benchmark run with a baseline ({name: measure() result}) and returns the regressions as text:..
+#..p95 latency up or throughput down by more than "threshold" (0.2 = 20%), or more queries than before
+def find_regressions(baseline, results, threshold):
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + threshold) and current['p95_ms'] - base['p95_ms'] > MIN_DELTA_MS:
+            regressions.append(f"{name}: p95 {base['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current['throughput_rps'] * (1 + threshold) < base['throughput_rps'] and \
+                1000 / current['throughput_rps'] - 1000 / base['throughput_rps'] > MIN_DELTA_MS:
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {base['queries']} -> {current['queries']} queries")
+    return regressions
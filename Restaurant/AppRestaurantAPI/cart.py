@@ -0,0 +1,97 @@
+#Writes to the cart of a user. The price of a cart row always comes from MenuItem.price, adding an item that is already in..
+#..the cart increments its quantity with one UPDATE (F expressions) instead of failing on unique_together ('menuitem', 'user'),..
+#..and the total of the cart is kept in CartTotal, so reading the cart or checking out doesn't have to sum the rows.
+#Cart rows written any other way (a menu item deleted with its cart rows, the admin) refresh the total through the signal..
+#..receivers in signals.py once their transaction commits
+
+import threading
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Least
+
+from .models import Cart, CartTotal
+
+
+#The most of one item a cart can hold, whatever the number of adds (the quantity is a SmallIntegerField and the price..
+#..is sized for 1000 x 9999.99)
+MAX_QUANTITY = 1000
+
+_local = threading.local()
+
+
+#The helpers of this module keep CartTotal themselves, the Cart rows they write are skipped by the signal receivers
+@contextmanager
+def keeping_total():
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    try:
+        yield
+    finally:
+        _local.depth = depth
+
+
+def keeps_total():
+    return getattr(_local, 'depth', 0) > 0
+
+
+#Adds "quantity" of the menu item to the cart of the user and returns the cart row
+def add_to_cart(user, menuitem, quantity):
+    unit_price = menuitem.price
+    with transaction.atomic(), keeping_total():
+        updated = increment(user, menuitem, quantity, unit_price)
+        if not updated:
+            try:
+                #the savepoint lets us carry on if another request inserted the same row in the meantime
+                with transaction.atomic():
+                    Cart.objects.create(
+                        user=user, menuitem=menuitem, quantity=quantity, unit_price=unit_price, price=quantity * unit_price
+                    )
+            except IntegrityError:
+                increment(user, menuitem, quantity, unit_price)
+        refresh_cart_total(user)
+    return Cart.objects.get(user=user, menuitem=menuitem)
+
+
+#Increments the quantity of an existing cart row, up to MAX_QUANTITY, and reprices it with the current price.
+#Returns the number of rows updated (0 or 1)
+def increment(user, menuitem, quantity, unit_price):
+    new_quantity = Least(F('quantity') + quantity, MAX_QUANTITY)
+    return Cart.objects.filter(user=user, menuitem=menuitem).update(
+        quantity=new_quantity,
+        unit_price=unit_price,
+        price=new_quantity * unit_price,
+    )
+
+
+#Recalculates the stored total of a user's cart inside the database with one UPDATE ... SET total = (SELECT SUM(price) ...)
+def refresh_cart_total(user):
+    cart_sum = (
+        Cart.objects.filter(user=OuterRef('user'))
+        .order_by()
+        .values('user')
+        .annotate(total=Sum('price'))
+        .values('total')
+    )
+    total = Coalesce(Subquery(cart_sum), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+    if not CartTotal.objects.filter(user=user).update(total=total):
+        CartTotal.objects.get_or_create(user=user)
+        CartTotal.objects.filter(user=user).update(total=total)
+
+
+#Returns the stored total of a user's cart
+def get_cart_total(user):
+    total = CartTotal.objects.filter(user=user).values_list('total', flat=True)[:1]
+    if not total:
+        #the cart was never written through add_to_cart (e.g. rows created before CartTotal), so the total is calculated once now
+        refresh_cart_total(user)
+        total = CartTotal.objects.filter(user=user).values_list('total', flat=True)[:1]
+    return total[0]
+
+
+#Removes every item from the cart of a user
+def clear_cart(user):
+    with keeping_total():
+        Cart.objects.filter(user=user).delete()
+    CartTotal.objects.filter(user=user).update(total=0)
@@ -0,0 +1,151 @@
+#The checkout: turning the cart of a user into an Order with its OrderItems.
+#It is used by OrderView.create directly, or, when ASYNC_ORDERS is on, by the checkout workers..
+#..(manage.py checkout_worker) which process the CheckoutJob rows queued by OrderView.create
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from .analytics import record_order
+from .cart import clear_cart
+from .models import Cart, CheckoutJob, OrderItem
+from .order_totals import store_order_total
+from .serializers import OrderSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+#Raised inside the job transaction to roll it back when another worker has already finished the same job
+class JobAlreadyProcessed(Exception):
+    pass
+
+
+#Places the order of a user from his cart and returns the OrderSerializer of the new order, or None when the cart is empty.
+#The whole checkout runs inside one transaction so two concurrent checkouts can't turn the same cart into two orders:
+# 1) the cart rows of the user are locked once (select_for_update) and read in a single query
+# 2) all the OrderItems are written with one bulk INSERT
+# 3) the total of the order is summed from its items by the database with one UPDATE (see order_totals.py)
+# 4) the sales rollups are updated with a fixed number of queries
+# 5) the cart is cleared with one SELECT of its rows (for the Cart signal receivers) and one DELETE
+#If anything fails in the middle (e.g. the serializer raises ValidationError), the transaction is rolled back and the cart stays as it was
+def place_order(user, data):
+    with transaction.atomic():
+        #of=('self',) keeps the lock on the cart rows only, not on the menu items joined for their category
+        items = list(
+            Cart.objects.select_for_update(of=('self',))
+            .filter(user=user)
+            .values('menuitem_id', 'price', 'quantity', category_id=F('menuitem__category_id'))
+        )
+        if len(items) == 0:
+            return None
+
+        #A copy of the data is made so we can add "user" to it without changing the original data
+        data = data.copy()
+        data['user'] = user.id
+        order_serializer = OrderSerializer(data=data)
+        order_serializer.is_valid(raise_exception=True)
+        order = order_serializer.save()
+
+        #For each locked cart row an OrderItem is built in memory and all of them are saved with one query
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                menuitem_id=item['menuitem_id'],
+                price=item['price'],
+                quantity=item['quantity'],
+            )
+            for item in items
+        ])
+        store_order_total(order)
+        #the new order is added to the sales rollups (analytics.py) in the same transaction
+        record_order(order, items)
+        #after the order items are saved, all the items belonging to a user in his Cart get deleted
+        clear_cart(user)
+
+    return order_serializer
+
+
+#Queues the checkout of a user and returns the job. The cart rows are locked while we look for an open job of the same user,..
+#..so a retried POST gets the job that is already queued instead of a second one
+def enqueue_checkout(user, data):
+    with transaction.atomic():
+        list(Cart.objects.select_for_update().filter(user=user).values_list('id', flat=True))
+        job = CheckoutJob.objects.filter(user=user, status=CheckoutJob.PENDING).first()
+        if job is None:
+            job = CheckoutJob.objects.create(user=user, data=data)
+    return job
+
+
+#Takes the oldest pending job and places its order. Returns the job, or None if the queue is empty.
+#The job is marked done in the same transaction that creates the order, with an UPDATE that only matches a still pending job,..
+#..so if two workers get the same job (or a worker dies and the job is retried) only one order is ever kept.
+#Any other error of the job is logged and counted in "attempts", the job stays pending until it has failed..
+#..CHECKOUT_JOB_MAX_ATTEMPTS times and is then marked failed, so one bad job can't block the queue
+def process_next_job():
+    with transaction.atomic():
+        job = (
+            CheckoutJob.objects.select_for_update(skip_locked=True)
+            .filter(status=CheckoutJob.PENDING)
+            .order_by('created')
+            .first()
+        )
+        if job is None:
+            return None
+        try:
+            with transaction.atomic():
+                order_serializer = place_order(job.user, job.data)
+                if order_serializer is None:
+                    raise ValidationError({"message:": "no item in cart"})
+                updated = CheckoutJob.objects.filter(pk=job.pk, status=CheckoutJob.PENDING).update(
+                    status=CheckoutJob.DONE, order=order_serializer.instance
+                )
+                if updated == 0:
+                    raise JobAlreadyProcessed()
+        except ValidationError as error:
+            CheckoutJob.objects.filter(pk=job.pk, status=CheckoutJob.PENDING).update(
+                status=CheckoutJob.FAILED, errors=error.detail
+            )
+        except JobAlreadyProcessed:
+            pass
+        except Exception as error:
+            logger.exception('checkout job %s failed', job.pk)
+            attempts = job.attempts + 1
+            failed = attempts >= getattr(settings, 'CHECKOUT_JOB_MAX_ATTEMPTS', 3)
+            CheckoutJob.objects.filter(pk=job.pk, status=CheckoutJob.PENDING).update(
+                attempts=attempts,
+                status=CheckoutJob.FAILED if failed else CheckoutJob.PENDING,
+                errors={'detail': f'{type(error).__name__}: {error}'} if failed else None,
+            )
+    job.refresh_from_db()
+    return job
+
+
+#Processes jobs until the queue is empty. With "forever" the worker keeps waiting for new jobs, checking every "poll" seconds.
+#An error that escapes process_next_job (e.g. the connection was lost, so the attempt couldn't even be counted) rolls the job..
+#..back to pending, the worker logs it, waits a moment and goes on. Without "forever" it gives up after "max_errors" errors in a row
+def run_worker(forever=False, poll=None, max_errors=5):
+    poll = poll if poll is not None else getattr(settings, 'CHECKOUT_WORKER_POLL', 1.0)
+    processed = 0
+    errors = 0
+    while True:
+        try:
+            job = process_next_job()
+            errors = 0
+        except Exception:
+            logger.exception('checkout job failed, it will be retried')
+            errors += 1
+            if not forever and errors >= max_errors:
+                raise
+            time.sleep(poll)
+            continue
+        if job is not None:
+            processed += 1
+            continue
+        if not forever:
+            return processed
+        time.sleep(poll)
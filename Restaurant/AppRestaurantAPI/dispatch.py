@@ -0,0 +1,91 @@
+#Automatic dispatch of the orders to the delivery crew.
+#All the orders not delivered yet and without a delivery crew member are handed out, oldest first, to the members of the..
+#.."Delivery Crew" group: each order goes to the member with the smallest current load (his orders not delivered yet),..
+#..taken from a heap, so handing out n orders to c members costs O(n log c). The assignments are written with one UPDATE per 5000 orders
+
+import heapq
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+
+from .events import order_event, publish
+from .models import Order
+from .roles import DELIVERY_CREW
+
+
+#how many orders are written by one UPDATE, it keeps the number of query parameters under the limits of the databases
+BATCH_SIZE = 5000
+
+
+#Assigns the pending orders and returns a summary: how many orders were assigned, to how many members, and the count per member
+def dispatch_orders(limit=None):
+    with transaction.atomic():
+        couriers = list(
+            User.objects.filter(groups__name=DELIVERY_CREW, is_active=True).order_by('id').values_list('id', flat=True)
+        )
+        if not couriers:
+            return {'assigned': 0, 'couriers': 0, 'assignments': {}}
+
+        #the pending orders are locked, so two dispatches running at the same time don't assign the same order twice
+        pending = (
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status=False, delivery_crew__isnull=True)
+            .order_by('date', 'id')
+            .values_list('id', 'user_id')
+        )
+        if limit:
+            pending = pending[:limit]
+        #{order id: customer id}, oldest first
+        orders = dict(pending)
+        if not orders:
+            return {'assigned': 0, 'couriers': len(couriers), 'assignments': {}}
+
+        load = dict.fromkeys(couriers, 0)
+        for courier, count in (
+            Order.objects.filter(status=False, delivery_crew__in=couriers)
+            .order_by()
+            .values_list('delivery_crew')
+            .annotate(count=Count('id'))
+        ):
+            load[courier] = count
+
+        assignments = assign(orders, load)
+        write_assignments(assignments)
+        publish(
+            order_event(order, orders[order], False, courier)
+            for courier, ids in assignments.items() for order in ids
+        )
+
+    return {
+        'assigned': len(orders),
+        'couriers': len(couriers),
+        'assignments': {courier: len(ids) for courier, ids in assignments.items()},
+    }
+
+
+#Hands out the order ids, always to the member with the smallest load (ties go to the smaller id).
+#Returns {member id: [ids of the orders assigned to him now]}
+def assign(orders, load):
+    heap = [(count, courier) for courier, count in load.items()]
+    heapq.heapify(heap)
+    assignments = {}
+    for order in orders:
+        count, courier = heapq.heappop(heap)
+        assignments.setdefault(courier, []).append(order)
+        heapq.heappush(heap, (count + 1, courier))
+    return assignments
+
+
+#Writes the assignments with one UPDATE per batch of orders:
+#   UPDATE order SET delivery_crew_id = CASE WHEN id IN (...) THEN 7 WHEN id IN (...) THEN 9 ... END WHERE id IN (...)
+#The ids are grouped by member, so the statement has one WHEN per member instead of one per order (like bulk_update would)
+def write_assignments(assignments, batch_size=BATCH_SIZE):
+    pairs = [(order, courier) for courier, ids in assignments.items() for order in ids]
+    for start in range(0, len(pairs), batch_size):
+        by_courier = {}
+        for order, courier in pairs[start:start + batch_size]:
+            by_courier.setdefault(courier, []).append(order)
+        Order.objects.filter(id__in=[order for order, _ in pairs[start:start + batch_size]]).update(
+            delivery_crew=Case(*[When(id__in=ids, then=Value(courier)) for courier, ids in by_courier.items()])
+        )
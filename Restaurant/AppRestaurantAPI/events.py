@@ -0,0 +1,208 @@
+#Push of the order changes to the clients of GET /api/orders/events (Server-Sent Events, see async_views.order_events).
+#Every save of an order (signals.py) and every dispatch (dispatch.py) publishes an event with the status and the delivery crew..
+#..of the order. The events are fanned out inside the process: each connected client has an asyncio queue and only gets the..
+#..events of the orders it can see in /api/orders (superuser / manager: all, delivery crew: the ones assigned to him, customer: his own).
+#The stream needs ASGI (e.g. "uvicorn Restaurant.asgi:application"), under WSGI every client would hold a thread.
+#
+#By default the events go straight to the clients of the process that made the change, once its transaction commits.
+#With ORDER_EVENTS_DATABASE on in settings.py they are written as OrderEvent rows in the same transaction instead, and every..
+#..process with connected clients polls the table, so changes made by other processes (the dispatch_orders command, other..
+#..ASGI workers, WSGI) are pushed as well. The writers also delete the rows older than KEEP_EVENTS, so the table stays small..
+#..when no process is listening
+
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import OrderEvent
+
+
+#How many events can wait for a client, a client that doesn't read them is disconnected (the browser's EventSource reconnects by itself)
+QUEUE_SIZE = 1000
+
+#How long the OrderEvent rows are kept, and how often the old ones are deleted
+KEEP_EVENTS = timedelta(minutes=10)
+PRUNE_EVERY = 60
+
+#An event can commit after an event with a higher id has already been read (the id is taken at the INSERT, the row is seen..
+#..at the COMMIT), so the listener keeps the ids it skipped over and looks for them again for LATE_EVENTS seconds
+LATE_EVENTS = 5
+
+#What a client sees, like get_order_queryset in views.py
+ALL = 'all'
+ASSIGNED = 'assigned'
+OWN = 'own'
+
+
+def order_event(order_id, user_id, status, delivery_crew_id):
+    return {'id': order_id, 'user': user_id, 'status': bool(status), 'delivery_crew': delivery_crew_id}
+
+
+#The text sent for one event, the id of the customer is only used to find the clients
+def format_event(event):
+    data = {'id': event['id'], 'status': event['status'], 'delivery_crew': event['delivery_crew']}
+    return f'event: order\ndata: {json.dumps(data)}\n\n'
+
+
+#One connected client. Its queue belongs to the event loop serving it, events are put there with call_soon_threadsafe
+class Subscriber:
+    def __init__(self, user_id, scope):
+        self.user_id = user_id
+        self.scope = scope
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.closed = False
+
+    #runs in the loop of the client, None in the queue ends the stream
+    def push(self, events):
+        if self.closed:
+            return
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.close()
+                return
+
+    def close(self):
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+#The clients connected to this process, indexed by what they see so that an event only visits the clients it is meant for
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.everyone = set()
+        self.by_customer = defaultdict(set)
+        self.by_courier = defaultdict(set)
+        #the task polling the OrderEvent table (ORDER_EVENTS_DATABASE)
+        self.listener = None
+
+    def index(self, subscriber):
+        if subscriber.scope == ALL:
+            return self.everyone
+        if subscriber.scope == ASSIGNED:
+            return self.by_courier[subscriber.user_id]
+        return self.by_customer[subscriber.user_id]
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            self.index(subscriber).add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            index = self.index(subscriber)
+            index.discard(subscriber)
+            if not index and subscriber.scope != ALL:
+                del (self.by_courier if subscriber.scope == ASSIGNED else self.by_customer)[subscriber.user_id]
+
+    def count(self):
+        with self.lock:
+            return len(self.everyone) + sum(map(len, self.by_customer.values())) + sum(map(len, self.by_courier.values()))
+
+    #Hands the events to the clients that see them, each client gets its events with one call into its loop
+    def publish(self, events):
+        batches = defaultdict(list)
+        with self.lock:
+            for event in events:
+                for subscriber in self.everyone:
+                    batches[subscriber].append(event)
+                for subscriber in self.by_customer.get(event['user'], ()):
+                    batches[subscriber].append(event)
+                for subscriber in self.by_courier.get(event['delivery_crew'], ()):
+                    batches[subscriber].append(event)
+        for subscriber, batch in batches.items():
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, batch)
+            except RuntimeError:
+                #the loop of the client is already closed
+                pass
+
+    def start_listener(self):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(listen(self))
+
+
+broker = Broker()
+
+#When this process last deleted the old OrderEvent rows
+pruned = 0
+
+
+def old_events():
+    return OrderEvent.objects.filter(created__lt=timezone.now() - KEEP_EVENTS)
+
+
+#Deletes the old OrderEvent rows, at most once every PRUNE_EVERY seconds per process, after the transaction of the writer
+def prune_events():
+    global pruned
+    now = time.monotonic()
+    if now - pruned > PRUNE_EVERY:
+        pruned = now
+        transaction.on_commit(lambda: old_events().delete())
+
+
+#Publishes the changes of the orders, called inside the transaction making them
+def publish(events):
+    events = list(events)
+    if not events:
+        return
+    if getattr(settings, 'ORDER_EVENTS_DATABASE', False):
+        OrderEvent.objects.bulk_create([
+            OrderEvent(order_id=event['id'], status=event['status'], delivery_crew_id=event['delivery_crew'])
+            for event in events
+        ], batch_size=1000)
+        prune_events()
+    else:
+        transaction.on_commit(lambda: broker.publish(events))
+
+
+def event_rows(queryset):
+    return queryset.order_by('id').values_list('id', 'order_id', 'order__user_id', 'status', 'delivery_crew_id')
+
+
+#Polls the OrderEvent table while this process has clients, starting from the newest row when it starts.
+#The ids skipped over by a read (an event not committed yet, or rolled back) are read again until they show up or..
+#..LATE_EVENTS seconds have passed
+async def listen(broker):
+    poll = getattr(settings, 'ORDER_EVENTS_POLL', 0.5)
+    loop = asyncio.get_running_loop()
+    last = (await OrderEvent.objects.aaggregate(last=Max('id')))['last'] or 0
+    #skipped id -> when it is given up
+    gaps = {}
+    pruned = 0
+    while broker.count():
+        now = loop.time()
+        late = []
+        if gaps:
+            gaps = {id: until for id, until in gaps.items() if until > now}
+            late = [row async for row in event_rows(OrderEvent.objects.filter(id__in=list(gaps)))]
+            for row in late:
+                del gaps[row[0]]
+        rows = [row async for row in event_rows(OrderEvent.objects.filter(id__gt=last))[:QUEUE_SIZE]]
+        if rows:
+            #the ids are only tracked for a plausible gap, not after a jump of the sequence
+            if rows[-1][0] - last <= 2 * QUEUE_SIZE:
+                read = {row[0] for row in rows}
+                gaps.update((id, now + LATE_EVENTS) for id in range(last + 1, rows[-1][0]) if id not in read)
+            last = rows[-1][0]
+        if late or rows:
+            broker.publish([order_event(*row[1:]) for row in late + rows])
+        if rows:
+            continue
+
+        if now - pruned > PRUNE_EVERY:
+            pruned = now
+            await old_events().adelete()
+        await asyncio.sleep(poll)
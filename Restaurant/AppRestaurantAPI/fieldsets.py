@@ -0,0 +1,144 @@
+#Sparse fieldsets and the compact serialization of the lists of orders and menu items.
+#   ?fields=id,status        only these fields are sent, and only their columns are read (QuerySet.only)
+#   ?expand=category         the id of a relation is replaced by the related object, read by the same query (select_related)
+#Without the params the lists are the same as before, e.g. an order with its "orderitem" list.
+#
+#The pages of the lists are turned into JSON data by a "compact" reader instead of the serializer: the fields of the serializer are..
+#..compiled once into a list of (name, function reading the attribute) and every row is a single dict comprehension, instead of..
+#..DRF's to_representation walking the fields with get_attribute / SkipField checks for every row. The output is the same as the..
+#..serializer's (the decimals and dates still go through the DRF field), so it is only used for reading
+
+from functools import lru_cache
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+#The fields which can be copied as they come from the database, any other field is passed through its to_representation
+PLAIN_FIELDS = (serializers.IntegerField, serializers.BooleanField, serializers.CharField)
+
+
+#Serializer mixin taking the sparse fieldset: "fields" lists the fields to keep (None keeps all of them) and "expand" the relations..
+#..to replace by the serializers given in "expandable_fields"
+class SparseFieldsMixin:
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields is not None:
+            for name in [name for name in self.fields if name not in fields and name not in expand]:
+                self.fields.pop(name)
+
+
+#Splits a comma separated query param into a tuple of names, None when the param isn't sent
+def names_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return tuple(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+
+
+#Returns the function reading one field of a row, like the field's part of serializer.to_representation
+def field_reader(serializer, field):
+    source = field.source
+    if isinstance(field, serializers.ListSerializer):
+        child = compile_serializer(field.child)
+        return lambda row: [child(item) for item in getattr(row, source).all()]
+    if isinstance(field, serializers.BaseSerializer):
+        child = compile_serializer(field)
+        return lambda row: None if (value := getattr(row, source)) is None else child(value)
+    if source == '*' or '.' in source:
+        return lambda row: None if (value := field.get_attribute(row)) is None else field.to_representation(value)
+
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and model is not None:
+        #the id is read from the foreign key column, the related object isn't loaded
+        return attrgetter(model._meta.get_field(source).attname)
+    if isinstance(field, PLAIN_FIELDS):
+        return attrgetter(source)
+    return lambda row: None if (value := getattr(row, source)) is None else field.to_representation(value)
+
+
+#Turns a serializer into a function building the data of one row
+def compile_serializer(serializer):
+    readers = [(name, field_reader(serializer, field)) for name, field in serializer.fields.items() if not field.write_only]
+    return lambda row: {name: read(row) for name, read in readers}
+
+
+#The compiled reader of a serializer class with a sparse fieldset, built once per combination of fields
+@lru_cache(maxsize=256)
+def compact_reader(serializer_class, fields=None, expand=()):
+    return compile_serializer(serializer_class(fields=fields, expand=expand))
+
+
+#Serializes the rows with the compact reader, the result is the same as serializer_class(rows, many=True, ...).data
+def compact_data(serializer_class, rows, fields=None, expand=()):
+    read = compact_reader(serializer_class, fields, tuple(expand))
+    return [read(row) for row in rows]
+
+
+#Mixin for the list views: reads ?fields= and ?expand=, limits the columns of the queryset to the fields sent..
+#..and answers the list with the compact reader. The serializer_class must use SparseFieldsMixin
+class SparseFieldsetMixin:
+    def sparse_fieldset(self):
+        if not hasattr(self, '_sparse_fieldset'):
+            serializer_class = self.get_serializer_class()
+            fields = names_param(self.request, 'fields')
+            expand = names_param(self.request, 'expand') or ()
+            unknown = [name for name in fields or () if name not in serializer_class().fields]
+            if unknown:
+                raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown)}.'})
+            unknown = [name for name in expand if name not in serializer_class.expandable_fields]
+            if unknown:
+                raise ValidationError({'expand': f'Can\'t expand: {", ".join(unknown)}.'})
+            self._sparse_fieldset = (fields, expand)
+        return self._sparse_fieldset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method != 'GET':
+            return queryset
+        fields, expand = self.sparse_fieldset()
+        return self.sparse_queryset(queryset, self.get_serializer_class()(fields=fields, expand=expand))
+
+    #Reads only the columns of the fields sent, the expanded relations with a join and the nested lists only when they are sent
+    def sparse_queryset(self, queryset, serializer):
+        model = queryset.model
+        #the keyset pagination reads the position of the last row from its attributes
+        columns = {model._meta.pk.name, *(name.lstrip('-') for name in getattr(self.pagination_class, 'keyset_ordering', ()))}
+        related = []
+        nested = False
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                nested = True
+                continue
+            if field.source == '*' or '.' in field.source:
+                return queryset
+            try:
+                model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                #a property or a method of the model may read any column
+                return queryset
+            if isinstance(field, serializers.BaseSerializer):
+                related.append(field.source)
+                columns.update(f'{field.source}__{child.source}' for child in field.fields.values() if not child.write_only)
+            else:
+                columns.add(field.source)
+        if not nested:
+            queryset = queryset.prefetch_related(None)
+        return queryset.select_related(*related).only(*columns)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields, expand = self.sparse_fieldset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compact_data(self.get_serializer_class(), page, fields, expand))
+        return Response(compact_data(self.get_serializer_class(), queryset, fields, expand))
@@ -0,0 +1,73 @@
+#Filters of the menu items list (MenuItemsView), applied by the database before the page is cut:
+#   ?category=3 or ?category=pizzas      the id or the slug of the category
+#   ?featured=true / false
+#   ?min_price=5&max_price=12.50         both included
+#   ?in_stock=true / false               inventory above 0 / sold out
+#Combined with ?ordering=price (or -price) the common storefront lists, e.g. "featured in category X, cheapest first", are..
+#..read by one of the composite indexes of MenuItem as a range scan that is already in the order of the page
+
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .models import Category
+
+
+TRUE = ('true', '1', 'yes')
+FALSE = ('false', '0', 'no')
+
+
+def parse_bool(params, name):
+    value = params[name].lower()
+    if value in TRUE:
+        return True
+    if value in FALSE:
+        return False
+    raise ValidationError({name: 'Use true or false.'})
+
+
+def parse_price(params, name):
+    try:
+        value = Decimal(params[name])
+    except InvalidOperation:
+        raise ValidationError({name: 'A number is required.'})
+    if not value.is_finite() or value < 0:
+        raise ValidationError({name: 'A number is required.'})
+    return value
+
+
+class MenuItemFilter(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('category'):
+            category = params['category']
+            if category.isdigit():
+                queryset = queryset.filter(category_id=int(category))
+            else:
+                #the slug is looked up first, a join would keep the database from reading the page off the category indexes.
+                #The slug is only unique together with the title, all of the categories with it are listed
+                ids = list(Category.objects.filter(slug=category).values_list('id', flat=True))
+                if not ids:
+                    return queryset.none()
+                queryset = queryset.filter(category_id=ids[0]) if len(ids) == 1 else queryset.filter(category_id__in=ids)
+        if params.get('featured'):
+            #"featured IN (1)" instead of the bare "featured" Django writes for featured=True, which no index can answer
+            queryset = queryset.filter(featured__in=[parse_bool(params, 'featured')])
+        if params.get('min_price'):
+            queryset = queryset.filter(price__gte=parse_price(params, 'min_price'))
+        if params.get('max_price'):
+            queryset = queryset.filter(price__lte=parse_price(params, 'max_price'))
+        if params.get('in_stock'):
+            queryset = queryset.filter(inventory__gt=0) if parse_bool(params, 'in_stock') else queryset.filter(inventory=0)
+        return queryset
+
+
+#Ordering that always ends with the title, in the direction of the first field: the pages of "?ordering=price" are stable when..
+#..prices are equal, and "ORDER BY price, title" is exactly the order of the (.., price, title) indexes
+class MenuItemOrdering(OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or any(field.lstrip('-') == 'title' for field in ordering):
+            return ordering
+        return [*ordering, '-title' if ordering[0].startswith('-') else 'title']
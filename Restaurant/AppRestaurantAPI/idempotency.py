@@ -0,0 +1,179 @@
+#Idempotency keys for the POST endpoints: a client that sends "Idempotency-Key: <unique value>" with a POST can retry it safely.
+#The first request with a key claims it (one INSERT into IdempotencyKey, the unique (user, key) index lets only one request win),..
+#..does the work and stores its response. A retry with the same key gets the stored response again ("Idempotent-Replayed: true")..
+#..without running the view, e.g. a checkout retried after a timeout returns the order that was placed instead of placing another.
+#A retry arriving while the first request is still running waits for its response (up to IDEMPOTENCY_WAIT seconds, then 409),..
+#..so concurrent duplicates are coalesced into one piece of work. The replay carries the headers the view set (e.g. Location).
+#A request still running after IDEMPOTENCY_LOCK_TIMEOUT seconds is taken to be lost and a retry runs again, the first..
+#..request then only logs a warning when it finishes, its response isn't stored over the one of the retry.
+#Keys belong to the user and expire after IDEMPOTENCY_KEY_TTL seconds ("manage.py prune_idempotency_keys" deletes the old rows).
+#A key sent again with a different body is rejected (422). Server errors (5xx) are not stored, the claim is released so a retry runs again.
+#Requests without the header, and anonymous ones, work as before
+
+import datetime
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+#How often a duplicate looks whether the first request has finished
+POLL = 0.05
+
+#How many times a claim is tried when the key keeps being released by failing requests in the meantime
+CLAIM_TRIES = 3
+
+#The headers of a response that are not stored: they are set again when the replay is finalized and rendered
+NOT_STORED_HEADERS = {'allow', 'content-length', 'content-type', 'vary'}
+
+logger = logging.getLogger(__name__)
+
+
+def key_ttl():
+    return datetime.timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+#A claim whose request hasn't finished after this long is taken to be lost (e.g. the process was killed) and can be taken over
+def lock_timeout():
+    return datetime.timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+#Raised in the view's initial() to answer with the stored response instead of running the view
+class Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+#The same key must come with the same request: the method, the path and the body
+def fingerprint(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        #a multipart body was already parsed (e.g. by the CSRF check), the parsed fields are used instead
+        body = repr(sorted(request.POST.lists())).encode()
+    return hashlib.sha256(b'%s %s\n%s' % (request.method.encode(), request.path.encode(), body)).hexdigest()
+
+
+#Claims the key for the request. Returns (record, True) when this request must do the work, (record, False) when another..
+#..request has claimed the key before (its response may not be ready yet), (None, False) when the key kept being released
+def claim(user, key, digest):
+    for _ in range(CLAIM_TRIES):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user=user, key=key, fingerprint=digest, created=now, expires=now + key_ttl())
+                return record, True
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            #released by a failed request in the meantime
+            continue
+        if record.expires <= now or (record.status_code is None and record.created <= now - lock_timeout()):
+            #an expired or lost claim is taken over, the condition on "created" lets only one of several retries take it
+            taken = IdempotencyKey.objects.filter(pk=record.pk, created=record.created).update(
+                fingerprint=digest, status_code=None, response=None, headers=None, created=now, expires=now + key_ttl()
+            )
+            if taken:
+                record.refresh_from_db()
+                return record, True
+            record = IdempotencyKey.objects.filter(pk=record.pk).first()
+            if record is None:
+                continue
+        return record, False
+    return None, False
+
+
+#Starts the idempotent handling of a request: returns the claimed record when the view must run (None when the request has no..
+#..key), or raises Replay with the stored response of the first request
+def begin(request):
+    key = request.headers.get(HEADER)
+    if not key or request.method != 'POST' or not request.user.is_authenticated:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({HEADER: f'At most {MAX_KEY_LENGTH} characters.'})
+
+    digest = fingerprint(request)
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT', 10)
+    while True:
+        record, owner = claim(request.user, key, digest)
+        if owner:
+            return record
+        if record is not None and record.fingerprint != digest:
+            raise Replay(Response({'detail': f'This {HEADER} was already used with a different request.'},
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY))
+        if record is not None and record.status_code is not None:
+            headers = {**(record.headers or {}), 'Idempotent-Replayed': 'true'}
+            raise Replay(Response(record.response, record.status_code, headers=headers))
+        if time.monotonic() >= deadline:
+            raise Replay(Response({'detail': f'A request with this {HEADER} is still in progress.'},
+                                  status.HTTP_409_CONFLICT, headers={'Retry-After': '1'}))
+        time.sleep(POLL)
+
+
+#Stores the response (status, data and the headers set by the view) of the request that did the work, a server error..
+#..releases the key instead. Both only touch the claim of this request, not one a retry took over meanwhile
+def finish(record, response):
+    if response.status_code >= 500:
+        release(record)
+        return
+    headers = {name: value for name, value in response.items() if name.lower() not in NOT_STORED_HEADERS}
+    stored = own_claim(record).update(
+        status_code=response.status_code, response=getattr(response, 'data', None), headers=headers or None
+    )
+    if not stored:
+        logger.warning('%s %r was taken over by a retry while its first request was still running, the request ran twice',
+                       HEADER, record.key)
+
+
+def release(record):
+    own_claim(record).delete()
+
+
+def own_claim(record):
+    return IdempotencyKey.objects.filter(pk=record.pk, created=record.created)
+
+
+#Deletes the expired keys, returns how many
+def prune_expired():
+    return IdempotencyKey.objects.filter(expires__lte=timezone.now()).delete()[0]
+
+
+#Mixin for the views with a POST: the key is claimed (or the stored response replayed) once the user is authenticated and the..
+#..permissions are checked, and the response is stored once the view has answered. It works for generic views, APIViews and viewsets
+class IdempotentMixin:
+    def initial(self, request, *args, **kwargs):
+        self.idempotency_record = None
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = begin(request)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            #an unexpected error: nothing is stored, a retry with the same key runs again
+            if getattr(self, 'idempotency_record', None) is not None:
+                release(self.idempotency_record)
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'idempotency_record', None) is not None:
+            finish(self.idempotency_record, response)
+            self.idempotency_record = None
+        return response
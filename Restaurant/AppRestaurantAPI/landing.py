@@ -0,0 +1,162 @@
+#Fast delivery of the landing page (index.html) and of the static files.
+#The landing page doesn't depend on the request, so it is rendered once (at deploy time with "manage.py build_landing",..
+#..or on the first request) and kept in memory together with gzip and brotli versions built ahead of time.
+#Every response gets a strong ETag, so browsers revalidate with If-None-Match and get a 304 without a body.
+#The hashed files made by collectstatic (e.g. style.4f2a9c1b7e3d.css) never change, so they are served with a one year cache.
+#brotli is optional: "pip install brotli" adds the .br versions, without it only gzip is built
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.template.loader import render_to_string
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#the encodings we can send, best first, with the file suffix used for the prebuilt versions
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+#the types of files worth compressing, images and fonts are compressed already
+COMPRESSIBLE = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.xml', '.map'}
+
+#names like "style.4f2a9c1b7e3d.css" made by ManifestStaticFilesStorage
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+LANDING_TEMPLATE = 'index.html'
+ONE_YEAR = 60 * 60 * 24 * 365
+
+
+#Returns {encoding: bytes} with the identity content and its compressed versions
+def compress(content):
+    variants = {'identity': content, 'gzip': gzip.compress(content, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+def strong_etag(content):
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+#Picks the best encoding of "variants" the client accepts, following the Accept-Encoding header
+def choose_encoding(request, variants):
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding, _ in ENCODINGS:
+        if encoding in variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
+
+
+#Builds the response for one of the prebuilt variants, or a 304 when the client already has it.
+#Each encoding gets its own ETag, as a strong ETag has to change with the bytes sent
+def variant_response(request, variants, etag, content_type, cache_control):
+    encoding = choose_encoding(request, variants)
+    tag = f'"{etag}"' if encoding == 'identity' else f'"{etag}-{encoding}"'
+
+    if tag in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(variants[encoding], content_type=content_type)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = tag
+    response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+#-------------------------------------------------------------------------------- landing page
+
+#Writes the rendered landing page and its compressed versions to "directory", called by "manage.py build_landing" at deploy
+def build_landing_page(directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    variants = compress(render_to_string(LANDING_TEMPLATE).encode())
+    (directory / 'index.html').write_bytes(variants['identity'])
+    for encoding, suffix in ENCODINGS:
+        path = directory / f'index.html{suffix}'
+        if encoding in variants:
+            path.write_bytes(variants[encoding])
+        elif path.exists():
+            path.unlink()
+    return variants
+
+
+#Returns (variants, etag) of the landing page: the prebuilt files from LANDING_BUILD_DIR when they exist,..
+#..otherwise the page is rendered and compressed once and kept for the life of the process
+@lru_cache(maxsize=1)
+def get_landing_page():
+    directory = getattr(settings, 'LANDING_BUILD_DIR', None)
+    if directory and (Path(directory) / 'index.html').exists():
+        directory = Path(directory)
+        variants = {'identity': (directory / 'index.html').read_bytes()}
+        for encoding, suffix in ENCODINGS:
+            path = directory / f'index.html{suffix}'
+            if path.exists():
+                variants[encoding] = path.read_bytes()
+    else:
+        variants = compress(render_to_string(LANDING_TEMPLATE).encode())
+    return variants, strong_etag(variants['identity'])
+
+
+def landing_response(request):
+    variants, etag = get_landing_page()
+    #the url of the page never changes, so browsers keep it but check the ETag before using it
+    return variant_response(request, variants, etag, 'text/html; charset=utf-8', 'no-cache')
+
+
+#-------------------------------------------------------------------------------- static files
+
+#Reads a collected static file with its prebuilt .br/.gz versions (see storage.py). Kept per path and modification time
+@lru_cache(maxsize=512)
+def load_static_file(path, mtime):
+    variants = {'identity': Path(path).read_bytes()}
+    for encoding, suffix in ENCODINGS:
+        if os.path.exists(path + suffix):
+            variants[encoding] = Path(path + suffix).read_bytes()
+    return variants, strong_etag(variants['identity'])
+
+
+def static_response(request, path):
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+        mtime = os.stat(full_path).st_mtime_ns
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404(path)
+    if not os.path.isfile(full_path):
+        raise Http404(path)
+
+    variants, etag = load_static_file(full_path, mtime)
+    if HASHED_NAME.search(path):
+        cache_control = f'public, max-age={ONE_YEAR}, immutable'
+    else:
+        cache_control = 'no-cache'
+    content_type = guess_type(path)
+    return variant_response(request, variants, etag, content_type, cache_control)
+
+
+def guess_type(path):
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
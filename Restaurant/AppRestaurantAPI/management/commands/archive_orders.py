@@ -0,0 +1,24 @@
+#Moves the delivered orders older than ORDER_ARCHIVE_DAYS into the archive tables (see archive.py), e.g. nightly from cron
+#Usage: python manage.py archive_orders
+#       python manage.py archive_orders --days 180 --batch 5000 --limit 1000000
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI.archive import BATCH_SIZE, archive_cutoff, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Moves the old delivered orders from the live tables into the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='archive the orders older than this, default ORDER_ARCHIVE_DAYS')
+        parser.add_argument('--batch', type=int, default=BATCH_SIZE, help='orders moved per transaction')
+        parser.add_argument('--limit', type=int, default=None, help='stop after about this many orders')
+
+    def handle(self, *args, **options):
+        def progress(archived):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{archived} orders archived', ending='\r')
+
+        archived = archive_orders(days=options['days'], batch_size=options['batch'], limit=options['limit'], progress=progress)
+        self.stdout.write(f"archived {archived} delivered orders from before {archive_cutoff(options['days'])}")
@@ -0,0 +1,117 @@
+#Benchmark suite of the main endpoints, driven in-process through the test client (middleware, urls, views, serializers).
+#For every scenario it records the throughput, the p50/p95/p99 latency and the queries of a request, writes them to a JSON file..
+#..and, given a baseline from an earlier run, fails (exit code 1) when a scenario got slower than the threshold or sends more queries.
+#Run it on a seeded database (manage.py seed_data) so the numbers mean something. The rows it writes are rolled back at the end.
+#Usage: python manage.py bench_api --output bench-baseline.json                            (record a baseline)
+#       python manage.py bench_api --baseline bench-baseline.json --threshold 0.2          (compare, fails on regressions)
+
+import datetime
+import json
+import platform
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from AppRestaurantAPI.bench import api_client, find_regressions, measure, rolled_back
+from AppRestaurantAPI.cart import add_to_cart
+from AppRestaurantAPI.models import MenuItem, Order
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the menu, cart and order endpoints and compares the results with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='untimed requests per scenario before timing')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+        parser.add_argument('--only', help='comma separated names of the scenarios to run')
+
+    def handle(self, *args, **options):
+        if not MenuItem.objects.exists():
+            raise CommandError('There is no menu, run "manage.py seed_data" first')
+        report = rolled_back(lambda: self.run(options))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+            self.stdout.write(f"results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline['meta']['data'] != report['meta']['data']:
+                self.stderr.write('the baseline was recorded on different data, the comparison may not be meaningful')
+            regressions = find_regressions(baseline['results'], report['results'], options['threshold'])
+            if regressions:
+                raise CommandError('regressions past the threshold:\n  ' + '\n  '.join(regressions))
+            self.stdout.write('no regressions')
+
+    def run(self, options):
+        #the size of the data is taken before the scenarios add their own users and orders, so it only depends on the database
+        sizes = {
+            'menu_items': MenuItem.objects.count(),
+            'users': User.objects.count(),
+            'orders': Order.objects.count(),
+        }
+        menu = list(MenuItem.objects.order_by('id').values_list('id', flat=True)[:5])
+        menuitems = list(MenuItem.objects.filter(id__in=menu))
+        #a customer from the seeded data (with his order history), or a new one on an empty order table
+        customer_id = Order.objects.order_by('id').values_list('user_id', flat=True).first()
+        customer = User.objects.get(pk=customer_id) if customer_id else User.objects.create_user(username='bench-api-customer')
+        manager = User.objects.create_superuser(username='bench-api-manager')
+        for menuitem in menuitems:
+            add_to_cart(customer, menuitem, 1)
+
+        def refill_cart():
+            for menuitem in menuitems[:3]:
+                add_to_cart(customer, menuitem, 1)
+
+        today = datetime.date.today().isoformat()
+        scenarios = {
+            'menu-items': (None, 'get', '/api/menu-items?page=2', None, None),
+            'menu-items-cursor': (None, 'get', '/api/menu-items?cursor=', None, None),
+            'cart-list': (customer, 'get', '/api/cart/menu-items', None, None),
+            'cart-add': (customer, 'post', '/api/cart/menu-items', {'menuitem': menu[0], 'quantity': 1}, None),
+            'orders-customer': (customer, 'get', '/api/orders', None, None),
+            'orders-manager': (manager, 'get', '/api/orders?page=10', None, None),
+            'checkout': (customer, 'post', '/api/orders', {'date': today}, refill_cart),
+        }
+        if options['only']:
+            names = options['only'].split(',')
+            scenarios = {name: scenario for name, scenario in scenarios.items() if name in names}
+
+        results = {}
+        self.stdout.write(f"{'scenario':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for name, (user, method, url, data, setup) in scenarios.items():
+            client = api_client()
+            if user is not None:
+                client.force_authenticate(user)
+
+            def request():
+                response = getattr(client, method)(url, data, format='json') if data else getattr(client, method)(url)
+                if response.status_code >= 400:
+                    raise CommandError(f'{name}: {method.upper()} {url} answered {response.status_code}')
+
+            for _ in range(options['warmup']):
+                if setup:
+                    setup()
+                request()
+            result = measure(request, options['requests'], setup=setup)
+            results[name] = result
+            self.stdout.write(f"{name:<20} {result['throughput_rps']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                              f"{result['p99_ms']:>8} {result['queries']:>8}")
+
+        return {
+            'meta': {
+                'requests': options['requests'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'data': sizes,
+            },
+            'results': results,
+        }
@@ -0,0 +1,71 @@
+#Benchmark of the orders list of a manager as the order history grows: at every size the history is first kept in the live..
+#..tables and the list is timed, then it is archived (archive.py) and the list is timed again. With the history archived the..
+#..list only reads the recent orders, so its latency stays flat while the live one grows with the history.
+#The history is seeded as delivered orders without items. Everything is rolled back at the end.
+#Usage: python manage.py bench_archive --sizes 100000,1000000,10000000 --recent 10000
+
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import force_authenticate
+
+from AppRestaurantAPI.archive import archive_orders
+from AppRestaurantAPI.bench import measure, request_factory, rolled_back
+from AppRestaurantAPI.models import ArchivedOrder, Order
+from AppRestaurantAPI.views import OrderView
+
+
+BATCH = 10_000
+
+
+class Command(BaseCommand):
+    help = 'Times the orders list with the history in the live tables and in the archive, at growing history sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100000,1000000,10000000', help='comma separated sizes of the history')
+        parser.add_argument('--recent', type=int, default=10_000, help='orders newer than ORDER_ARCHIVE_DAYS')
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rolled_back(lambda: self.run(sizes, options['recent'], options['runs']))
+
+    def seed(self, user, count, first_day, days):
+        for start in range(0, count, BATCH):
+            Order.objects.bulk_create([
+                Order(user=user, status=True, total='12.50', date=first_day + datetime.timedelta(days=i % days))
+                for i in range(start, min(start + BATCH, count))
+            ], batch_size=BATCH)
+
+    def run(self, sizes, recent, runs):
+        manager = User.objects.create_superuser(username='bench-archive')
+        today = timezone.localdate()
+        self.seed(manager, recent, today - datetime.timedelta(days=30), 30)
+
+        factory = request_factory()
+        view = OrderView.as_view()
+
+        def fetch(query):
+            request = factory.get('/api/orders' + query)
+            force_authenticate(request, user=manager)
+            response = view(request)
+            assert response.status_code == 200, response.data
+
+        def timings():
+            return [measure(lambda: fetch(query), runs)['p50_ms'] for query in ('?page=1', '?page=50', '?cursor=')]
+
+        self.stdout.write(f"{'history':>10} {'live page=1':>12} {'live page=50':>13} {'live cursor':>12} "
+                          f"{'archived page=1':>16} {'archived page=50':>17} {'archived cursor':>16}")
+        history = 0
+        for size in sizes:
+            #the history is 5 years before the archiving age
+            self.seed(manager, size - history, today - datetime.timedelta(days=6 * 365), 5 * 365)
+            history = size
+            live = timings()
+            archive_orders(batch_size=BATCH)
+            archived = timings()
+            assert ArchivedOrder.objects.count() == size
+            self.stdout.write(f'{size:>10} {live[0]:>12} {live[1]:>13} {live[2]:>12} {archived[0]:>16} {archived[1]:>17} {archived[2]:>16}')
+        self.stdout.write('p50 latency in ms of the orders list of a manager')
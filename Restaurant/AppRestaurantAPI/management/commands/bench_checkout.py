@@ -0,0 +1,53 @@
+#Benchmark for the checkout (POST /api/orders). For every cart size it fills the cart of a throwaway user, places the order..
+#..and prints the number of queries and the p50/p95 latency. Everything is rolled back at the end.
+#Usage: python manage.py bench_checkout --sizes 1 10 20 50 100 --runs 30
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import force_authenticate
+
+from AppRestaurantAPI.cart import refresh_cart_total
+from AppRestaurantAPI.bench import measure, request_factory, rolled_back
+from AppRestaurantAPI.models import Cart, Category, MenuItem
+from AppRestaurantAPI.views import OrderView
+
+
+class Command(BaseCommand):
+    help = 'Measures query count and latency of the checkout for different cart sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1, 5, 10, 20, 50, 100])
+        parser.add_argument('--runs', type=int, default=30)
+
+    def handle(self, *args, **options):
+        rolled_back(lambda: self.run(options['sizes'], options['runs']))
+
+    def run(self, sizes, runs):
+        user = User.objects.create_user(username='bench-checkout')
+        category = Category.objects.create(title='Bench', slug='bench')
+        menuitems = MenuItem.objects.bulk_create([
+            MenuItem(title=f'bench-checkout-{i}', price=Decimal('2.50'), featured=False, category=category)
+            for i in range(max(sizes))
+        ])
+        factory = request_factory()
+        view = OrderView.as_view()
+
+        self.stdout.write(f"{'cart size':>10} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9}")
+        for size in sizes:
+            def fill_cart():
+                Cart.objects.bulk_create([
+                    Cart(user=user, menuitem=menuitem, quantity=2, unit_price=menuitem.price, price=menuitem.price * 2)
+                    for menuitem in menuitems[:size]
+                ])
+                refresh_cart_total(user)
+
+            def checkout():
+                request = factory.post('/api/orders', {'date': '2024-01-01'}, format='json')
+                force_authenticate(request, user=user)
+                response = view(request)
+                assert response.status_code == 201, response.data
+
+            result = measure(checkout, runs, setup=fill_cart)
+            self.stdout.write(f"{size:>10} {result['queries']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9}")
@@ -0,0 +1,42 @@
+#Benchmark of the dispatch: seeds pending orders and delivery crew members, runs one dispatch and prints how long it took.
+#Everything is rolled back at the end.
+#Usage: python manage.py bench_dispatch --orders 10000 --couriers 200
+
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from AppRestaurantAPI.bench import rolled_back
+from AppRestaurantAPI.dispatch import dispatch_orders
+from AppRestaurantAPI.models import Order
+from AppRestaurantAPI.roles import DELIVERY_CREW
+
+
+class Command(BaseCommand):
+    help = 'Times the dispatch of pending orders across the delivery crew'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--couriers', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rolled_back(lambda: self.run(options['orders'], options['couriers']))
+
+    def run(self, total, couriers):
+        customer = User.objects.create_user(username='bench-dispatch')
+        crew, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+        members = User.objects.bulk_create([User(username=f'bench-courier-{i}') for i in range(couriers)])
+        crew.user_set.add(*members)
+        Order.objects.bulk_create([Order(user=customer, date='2024-01-01') for _ in range(total)], batch_size=5000)
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            summary = dispatch_orders()
+            elapsed = time.perf_counter() - start
+
+        counts = summary['assignments'].values()
+        self.stdout.write(f"assigned {summary['assigned']} orders to {len(counts)} couriers in {elapsed * 1000:.1f} ms "
+                          f"({len(ctx.captured_queries)} queries), {min(counts)}-{max(counts)} orders each")
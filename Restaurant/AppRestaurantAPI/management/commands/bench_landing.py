@@ -0,0 +1,32 @@
+#Benchmark of the landing page: bytes on the wire and time to first byte when the template is rendered on every request..
+#..(how the index view worked before) and with the prerendered, precompressed page, for each Accept-Encoding
+#Usage: python manage.py bench_landing --runs 200
+
+from django.core.management.base import BaseCommand
+from django.shortcuts import render
+
+from AppRestaurantAPI.bench import measure, request_factory
+from AppRestaurantAPI.landing import get_landing_page, landing_response
+
+
+class Command(BaseCommand):
+    help = 'Compares the rendered and the precompressed landing page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=200)
+
+    def handle(self, *args, **options):
+        factory = request_factory()
+        get_landing_page.cache_clear()
+
+        self.stdout.write(f"{'mode':<28} {'bytes':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        request = factory.get('/')
+        size = len(render(request, 'index.html').content)
+        result = measure(lambda: render(request, 'index.html'), options['runs'])
+        self.stdout.write(f"{'rendered per request':<28} {size:>8} {result['p50_ms']:>8} {result['p95_ms']:>8}")
+
+        for accept in ['identity', 'gzip', 'br, gzip']:
+            request = factory.get('/', HTTP_ACCEPT_ENCODING=accept)
+            size = len(landing_response(request).content)
+            result = measure(lambda: landing_response(request), options['runs'])
+            self.stdout.write(f"{'precompressed (' + accept + ')':<28} {size:>8} {result['p50_ms']:>8} {result['p95_ms']:>8}")
@@ -0,0 +1,90 @@
+#Benchmark of the menu search: seeds a menu of made-up dishes, builds the search index once and times searches as a user..
+#..types them: prefixes of the titles, whole words, and words with a typo. Everything is rolled back at the end.
+#Usage: python manage.py bench_menu_search --items 50000 --searches 5000
+
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI import menu_search
+from AppRestaurantAPI.bench import percentile, rolled_back
+from AppRestaurantAPI.menu_cache import bump_menu_version
+from AppRestaurantAPI.models import Category, MenuItem
+
+
+STYLES = ['Spicy', 'Grilled', 'Roasted', 'Crispy', 'Smoked', 'Creamy', 'Fried', 'Baked', 'Steamed', 'Braised', 'Glazed',
+          'Stuffed', 'Sweet', 'Sour', 'Garlic', 'Lemon', 'Honey', 'Pepper', 'Truffle', 'Herb']
+DISHES = ['Pizza', 'Burger', 'Salad', 'Soup', 'Risotto', 'Lasagna', 'Taco', 'Burrito', 'Curry', 'Ramen', 'Noodles', 'Dumplings',
+          'Sandwich', 'Wrap', 'Steak', 'Chicken', 'Salmon', 'Tuna', 'Shrimp', 'Tofu', 'Falafel', 'Hummus', 'Pancakes', 'Waffles',
+          'Omelette', 'Quiche', 'Gnocchi', 'Ravioli', 'Paella', 'Moussaka', 'Souvlaki', 'Gyros', 'Kebab', 'Biryani', 'Tagine',
+          'Cheesecake', 'Brownie', 'Tiramisu', 'Sorbet', 'Pudding']
+EXTRAS = ['Mushrooms', 'Spinach', 'Bacon', 'Feta', 'Mozzarella', 'Parmesan', 'Avocado', 'Chorizo', 'Pesto', 'Olives', 'Capers',
+          'Basil', 'Chili', 'Ginger', 'Sesame', 'Coconut', 'Mango', 'Walnuts', 'Almonds', 'Pistachio', 'Caramel', 'Chocolate',
+          'Vanilla', 'Cinnamon', 'Saffron', 'Paprika', 'Cumin', 'Rosemary', 'Thyme', 'Oregano']
+SIZES = ['Small', 'Regular', 'Large', 'Family', 'Sharing', 'Kids', 'Double', 'Classic', 'House', 'Chef']
+CATEGORIES = ['Starters', 'Mains', 'Pasta', 'Pizzas', 'Burgers', 'Salads', 'Soups', 'Asian', 'Mexican', 'Greek', 'Indian',
+              'Seafood', 'Vegan', 'Desserts', 'Breakfast', 'Kids Menu', 'Specials', 'Grill', 'Street Food', 'Bakery']
+
+
+#A typo at a random place of the word: a letter dropped, doubled, or swapped with the next one
+def misspell(rng, word):
+    i = rng.randrange(1, len(word) - 1)
+    return rng.choice([word[:i] + word[i + 1:], word[:i] + word[i] + word[i:], word[:i] + word[i + 1] + word[i] + word[i + 2:]])
+
+
+class Command(BaseCommand):
+    help = 'Times the search as you type of the menu over the in-memory index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50_000)
+        parser.add_argument('--searches', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rolled_back(lambda: self.run(options))
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        categories = Category.objects.bulk_create([
+            Category(title=f'Bench {title}', slug=f'bench-{i}') for i, title in enumerate(CATEGORIES)
+        ])
+        titles = set()
+        while len(titles) < min(options['items'], len(STYLES) * len(DISHES) * len(EXTRAS) * len(SIZES)):
+            titles.add(f'{rng.choice(SIZES)} {rng.choice(STYLES)} {rng.choice(DISHES)} with {rng.choice(EXTRAS)}')
+        titles = sorted(titles)
+        MenuItem.objects.bulk_create([
+            MenuItem(title=title, price=Decimal(rng.randrange(300, 3000)) / 100, featured=rng.random() < 0.05,
+                     category=rng.choice(categories))
+            for title in titles
+        ], batch_size=5000)
+        #bulk_create sends no signals, the new version makes the next search rebuild the index
+        bump_menu_version()
+
+        start = time.perf_counter()
+        menu_search.search('')
+        self.stdout.write(f'index of {len(menu_search.index.items)} items and {len(menu_search.index.words)} words '
+                          f'built in {time.perf_counter() - start:.2f}s')
+
+        queries = {'prefix': [], 'words': [], 'typo': []}
+        for _ in range(options['searches']):
+            words = rng.choice(titles).split()
+            first = rng.randrange(len(words) - 1)
+            typed = words[first:first + 2]
+            #what is typed so far: one or two words, the last of them cut somewhere
+            queries['prefix'].append(' '.join(typed[:-1] + [typed[-1][:rng.randint(1, len(typed[-1]))]]))
+            queries['words'].append(' '.join(typed))
+            queries['typo'].append(' '.join(misspell(rng, word) if len(word) > 3 else word for word in typed))
+
+        self.stdout.write(f"{'searches':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'found':>6}")
+        for name, texts in queries.items():
+            timings = []
+            found = 0
+            for text in texts:
+                start = time.perf_counter()
+                results = menu_search.search(text)
+                timings.append((time.perf_counter() - start) * 1000)
+                found += bool(results)
+            self.stdout.write(f'{name:<10} {percentile(timings, 50):>8.3f} {percentile(timings, 99):>8.3f} '
+                              f'{max(timings):>8.3f} {found / len(texts):>6.0%}')
@@ -0,0 +1,60 @@
+#Benchmark comparing page number and keyset (cursor) pagination of /api/orders at different depths.
+#It seeds a throwaway order table (1M rows by default), reads pages near the start, the middle and the end with both modes..
+#..and prints the latency. Everything is rolled back at the end.
+#Usage: python manage.py bench_pagination --orders 1000000 --runs 10
+
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import force_authenticate
+
+from AppRestaurantAPI.bench import measure, request_factory, rolled_back
+from AppRestaurantAPI.models import Order
+from AppRestaurantAPI.pagination import OrderPagination
+from AppRestaurantAPI.views import OrderView
+
+
+class Command(BaseCommand):
+    help = 'Compares page number and cursor pagination of the orders list at increasing depth'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rolled_back(lambda: self.run(options['orders'], options['runs'], options['page_size']))
+
+    def run(self, total, runs, page_size):
+        admin = User.objects.create_superuser(username='bench-pagination')
+        first_day = datetime.date(2020, 1, 1)
+        batch = 10_000
+        for start in range(0, total, batch):
+            Order.objects.bulk_create([
+                Order(user=admin, date=first_day + datetime.timedelta(days=i // 500))
+                for i in range(start, min(start + batch, total))
+            ], batch_size=batch)
+        self.stdout.write(f'seeded {total} orders')
+
+        factory = request_factory()
+        view = OrderView.as_view()
+        paginator = OrderPagination()
+
+        def fetch(query):
+            request = factory.get('/api/orders' + query)
+            force_authenticate(request, user=admin)
+            response = view(request)
+            assert response.status_code == 200, response.data
+
+        self.stdout.write(f"{'depth':>10} {'page p50 ms':>12} {'cursor p50 ms':>14} {'cursor queries':>15}")
+        for depth in (0, total // 100, total // 10, total // 2, total - page_size):
+            page = depth // page_size + 1
+            if depth:
+                row = Order.objects.order_by(*paginator.keyset_ordering)[depth - 1]
+                cursor = paginator.encode_cursor(paginator.position_of(row))
+            else:
+                cursor = ''
+            by_page = measure(lambda: fetch(f'?page={page}&page_size={page_size}'), runs)
+            by_cursor = measure(lambda: fetch(f'?cursor={cursor}&page_size={page_size}'), runs)
+            self.stdout.write(f"{depth:>10} {by_page['p50_ms']:>12} {by_cursor['p50_ms']:>14} {by_cursor['queries']:>15}")
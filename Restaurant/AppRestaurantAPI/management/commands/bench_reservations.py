@@ -0,0 +1,85 @@
+#Benchmark of the table availability search: seeds tables, opening hours and bookings over the next weeks, then runs many..
+#..availability searches for random parties, days and time windows and prints how many per second were answered, called directly..
+#..and through the view. Everything is rolled back at the end.
+#The floor plan is cached after the first search, like in production, so the numbers are those of the slot query
+#Usage: python manage.py bench_reservations --tables 40 --bookings 5000 --searches 5000
+
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from AppRestaurantAPI.bench import percentile, request_factory, rolled_back
+from AppRestaurantAPI.models import Booking, BookingSlot, Seating, Table
+from AppRestaurantAPI.reservations import find_availability, slot_length, slot_numbers
+from AppRestaurantAPI.views import AvailabilityView
+
+
+class Command(BaseCommand):
+    help = 'Times the availability search of the table reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, default=40)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--bookings', type=int, default=5_000)
+        parser.add_argument('--searches', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rolled_back(lambda: self.run(options))
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create_user(username='bench-reservations')
+        tables = Table.objects.bulk_create([
+            Table(number=10_000 + i, seats=rng.choice([2, 2, 4, 4, 6, 8])) for i in range(options['tables'])
+        ])
+        Seating.objects.bulk_create([Seating(name='Open', weekday=day, opens='11:00', closes='23:00') for day in range(7)])
+
+        first_day = timezone.localdate() + datetime.timedelta(days=1)
+        duration = datetime.timedelta(minutes=90)
+        slots_per_day = int((datetime.timedelta(hours=12) - duration) / slot_length()) + 1
+        taken = set()
+        bookings = []
+        for _ in range(options['bookings']):
+            table = rng.choice(tables)
+            day = first_day + datetime.timedelta(days=rng.randrange(options['days']))
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(11))) + slot_length() * rng.randrange(slots_per_day)
+            slots = slot_numbers(start, duration)
+            if any((table.id, slot) in taken for slot in slots):
+                continue
+            taken.update((table.id, slot) for slot in slots)
+            bookings.append(Booking(user=user, table=table, party_size=min(table.seats, 2), start=start, end=start + duration))
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        BookingSlot.objects.bulk_create([
+            BookingSlot(booking=booking, table=booking.table, slot=slot)
+            for booking in bookings for slot in slot_numbers(booking.start, duration)
+        ], batch_size=5000)
+        self.stdout.write(f'seeded {len(bookings)} bookings on {len(tables)} tables over {options["days"]} days')
+
+        searches = [
+            (rng.randint(1, 8), first_day + datetime.timedelta(days=rng.randrange(options['days'])), rng.randrange(11, 21))
+            for _ in range(options['searches'])
+        ]
+
+        timings = []
+        started = time.perf_counter()
+        for party, day, hour in searches:
+            start = time.perf_counter()
+            find_availability(party, day, datetime.time(hour), datetime.time(hour + 2))
+            timings.append((time.perf_counter() - start) * 1000)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'find_availability: {len(searches) / elapsed:.0f} searches/s, '
+                          f'p50 {percentile(timings, 50):.2f} ms, p99 {percentile(timings, 99):.2f} ms')
+
+        factory = request_factory()
+        view = AvailabilityView.as_view()
+        started = time.perf_counter()
+        for party, day, hour in searches:
+            response = view(factory.get(f'/api/reservations/availability?party={party}&date={day}&from={hour}:00&to={hour + 2}:00'))
+            response.render()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'GET /api/reservations/availability: {len(searches) / elapsed:.0f} searches/s')
@@ -0,0 +1,60 @@
+#Benchmark of the serialization of the orders list: the time to turn 1000 orders (with their items) into response data with the..
+#..DRF serializer and with the compact reader of fieldsets.py, for the full orders and for a sparse fieldset (?fields=id,status),..
+#..and the size of the JSON. The orders are loaded once, only the serialization is timed. Everything is rolled back at the end.
+#Usage: python manage.py bench_serialization --orders 1000 --items 3 --runs 20
+
+import datetime
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.utils.encoders import JSONEncoder
+
+from AppRestaurantAPI.bench import measure, rolled_back
+from AppRestaurantAPI.fieldsets import compact_data
+from AppRestaurantAPI.models import Category, MenuItem, Order, OrderItem
+from AppRestaurantAPI.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Times the serialization of 1000 orders with the DRF serializer and with the compact reader'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--items', type=int, default=3, help='items per order')
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rolled_back(lambda: self.run(options['orders'], options['items'], options['runs']))
+
+    def run(self, total, items, runs):
+        customer = User.objects.create_user(username='bench-serialization')
+        category = Category.objects.create(title='Bench serialization', slug='bench-serialization')
+        menuitems = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Bench serialization {i}', price=Decimal('4.25'), featured=False, category=category) for i in range(items)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=customer, date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365), total=Decimal('12.75'))
+            for i in range(total)
+        ], batch_size=5000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=1, price=menuitem.price) for order in orders for menuitem in menuitems
+        ], batch_size=5000)
+
+        full = list(Order.objects.filter(user=customer).prefetch_related('order').order_by('id'))
+        sparse = list(Order.objects.filter(user=customer).only('id', 'status').order_by('id'))
+        scenarios = {
+            'full': (full, None),
+            'fields=id,status': (sparse, ('id', 'status')),
+        }
+
+        per_thousand = 1000 / total
+        self.stdout.write(f"{'orders':<18} {'serializer ms':>14} {'compact ms':>11} {'speedup':>8} {'JSON bytes':>11}")
+        for name, (rows, fields) in scenarios.items():
+            serializer = measure(lambda: OrderSerializer(rows, many=True, fields=fields).data, runs)
+            compact = measure(lambda: compact_data(OrderSerializer, rows, fields), runs)
+            size = len(json.dumps(compact_data(OrderSerializer, rows, fields), cls=JSONEncoder))
+            self.stdout.write(f"{name:<18} {serializer['p50_ms'] * per_thousand:>14.2f} {compact['p50_ms'] * per_thousand:>11.2f} "
+                              f"{serializer['p50_ms'] / compact['p50_ms']:>7.1f}x {size * per_thousand:>11.0f}")
+        self.stdout.write('times and sizes are per 1000 orders')
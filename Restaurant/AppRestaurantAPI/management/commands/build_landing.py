@@ -0,0 +1,20 @@
+#Renders the landing page once and writes it with its gzip/brotli versions to LANDING_BUILD_DIR, run it at deploy after collectstatic:
+#   python manage.py collectstatic --noinput && python manage.py build_landing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI.landing import build_landing_page
+
+
+class Command(BaseCommand):
+    help = 'Pre-renders and pre-compresses the landing page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='directory to write to, LANDING_BUILD_DIR by default')
+
+    def handle(self, *args, **options):
+        directory = options['output'] or settings.LANDING_BUILD_DIR
+        variants = build_landing_page(directory)
+        sizes = ', '.join(f'{encoding} {len(content)} bytes' for encoding, content in variants.items())
+        self.stdout.write(f'landing page written to {directory}: {sizes}')
@@ -0,0 +1,49 @@
+#Starts the local workers which place the orders queued by POST /api/orders when ASYNC_ORDERS is on.
+#Usage: python manage.py checkout_worker --processes 4          (runs until stopped)
+#       python manage.py checkout_worker --once                 (drains the queue and exits, e.g. from cron)
+
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+#Entry point of a worker process. Every process needs its own database connection, the ones inherited from the parent are closed first
+def work(forever, poll):
+    django.setup()
+    connections.close_all()
+
+    from AppRestaurantAPI.checkout import run_worker
+    run_worker(forever=forever, poll=poll)
+
+
+class Command(BaseCommand):
+    help = 'Runs the checkout workers that turn queued checkout jobs into orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--once', action='store_true', help='stop when the queue is empty')
+        parser.add_argument('--poll', type=float, default=None, help='seconds between checks of an empty queue')
+
+    def handle(self, *args, **options):
+        forever = not options['once']
+        if options['processes'] <= 1:
+            from AppRestaurantAPI.checkout import run_worker
+            processed = run_worker(forever=forever, poll=options['poll'])
+            self.stdout.write(f'processed {processed} checkout jobs')
+            return
+
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=work, args=(forever, options['poll']), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
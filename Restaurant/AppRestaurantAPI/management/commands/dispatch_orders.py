@@ -0,0 +1,25 @@
+#Assigns the pending orders to the delivery crew (see dispatch.py), once or periodically
+#Usage: python manage.py dispatch_orders                  (once, e.g. from cron)
+#       python manage.py dispatch_orders --every 30       (every 30 seconds until stopped)
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI.dispatch import dispatch_orders
+
+
+class Command(BaseCommand):
+    help = 'Assigns the orders without a delivery crew member to the least loaded members'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=None, help='repeat every N seconds')
+        parser.add_argument('--limit', type=int, default=None, help='the most orders assigned in one run')
+
+    def handle(self, *args, **options):
+        while True:
+            summary = dispatch_orders(limit=options['limit'])
+            self.stdout.write(f"assigned {summary['assigned']} orders to {len(summary['assignments'])} of {summary['couriers']} delivery crew members")
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
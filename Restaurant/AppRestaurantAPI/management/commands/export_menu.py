@@ -0,0 +1,25 @@
+#Writes the whole menu to stdout or a file as CSV or JSON lines, the same way as GET /api/menu-items/export
+#Usage: python manage.py export_menu --format jsonl --output menu.jsonl
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI import menu_bulk
+
+
+class Command(BaseCommand):
+    help = 'Exports all the menu items as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=[menu_bulk.CSV, menu_bulk.JSON_LINES], default=menu_bulk.CSV)
+        parser.add_argument('--output', help='file to write, stdout by default')
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in menu_bulk.export_lines(options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
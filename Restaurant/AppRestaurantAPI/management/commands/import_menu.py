@@ -0,0 +1,31 @@
+#Imports menu items from a CSV or JSON lines file, the same way as POST /api/menu-items/import
+#Usage: python manage.py import_menu spring-menu.csv
+#       python manage.py import_menu spring-menu.jsonl --batch-size 1000
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI import menu_bulk
+
+
+class Command(BaseCommand):
+    help = 'Creates or updates menu items (matched by title) from a CSV or JSON lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=[menu_bulk.CSV, menu_bulk.JSON_LINES],
+                            help='format of the file, by default taken from its extension')
+        parser.add_argument('--batch-size', type=int, default=menu_bulk.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or (menu_bulk.CSV if path.suffix.lower() == '.csv' else menu_bulk.JSON_LINES)
+        with path.open('rb') as f:
+            rows = menu_bulk.read_rows(menu_bulk.decode_lines(f), file_format)
+            report = menu_bulk.import_rows(rows, batch_size=options['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(f"created {report['created']}, updated {report['updated']}, rejected {len(report['errors'])}")
@@ -0,0 +1,131 @@
+#Load test for a running server: opens many concurrent keep-alive connections to one url and reports requests/sec and latency,..
+#..and, when the pid of the server is given, how much memory the server needed per 1,000 connections.
+#It is used to compare the same endpoint under WSGI and ASGI, e.g.:
+#   gunicorn Restaurant.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+#   python manage.py load_test --url http://127.0.0.1:8000/api/menu-items --connections 1000 --pid <gunicorn pid>
+#   uvicorn Restaurant.asgi:application --workers 4 --port 8001        (with ASYNC_VIEWS = True)
+#   python manage.py load_test --url http://127.0.0.1:8001/api/menu-items --connections 1000 --pid <uvicorn pid>
+
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI.bench import percentile
+
+
+#Resident memory (in KB) of a process and its children (the workers of gunicorn/uvicorn), read from /proc
+def rss_kb(pid):
+    pids = [pid]
+    children = f'/proc/{pid}/task/{pid}/children'
+    if os.path.exists(children):
+        with open(children) as f:
+            pids += [int(child) for child in f.read().split()]
+    total = 0
+    for process in pids:
+        try:
+            with open(f'/proc/{process}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Measures requests/sec, latency and server memory for many concurrent connections to one url'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', required=True)
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=10, help='requests sent by every connection')
+        parser.add_argument('--token', help='value for the "Authorization: Token <token>" header')
+        parser.add_argument('--pid', type=int, help='pid of the server, to measure its memory')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        headers = f'Host: {url.netloc}\r\nConnection: keep-alive\r\nAccept: application/json\r\n'
+        if options['token']:
+            headers += f'Authorization: Token {options["token"]}\r\n'
+        path = url.path + (f'?{url.query}' if url.query else '')
+        request = f'GET {path} HTTP/1.1\r\n{headers}\r\n'.encode()
+
+        pid = options['pid']
+        memory_before = rss_kb(pid) if pid else None
+        result = asyncio.run(self.run(url.hostname, url.port or 80, request, options['connections'], options['requests'], pid))
+
+        self.stdout.write(f"connections:        {options['connections']}")
+        self.stdout.write(f"requests:           {result['ok']} ok, {result['failed']} failed")
+        self.stdout.write(f"requests/sec:       {result['ok'] / result['elapsed']:.1f}")
+        self.stdout.write(f"latency p50/p95/p99: {percentile(result['latencies'], 50):.1f} / "
+                          f"{percentile(result['latencies'], 95):.1f} / {percentile(result['latencies'], 99):.1f} ms")
+        if pid:
+            grown = result['peak_memory'] - memory_before
+            self.stdout.write(f"server memory:      {memory_before / 1024:.1f} MB idle, {result['peak_memory'] / 1024:.1f} MB peak")
+            self.stdout.write(f"memory per 1,000 connections: {grown / options['connections'] * 1000 / 1024:.1f} MB")
+
+    async def run(self, host, port, request, connections, requests, pid):
+        latencies = []
+        counts = {'ok': 0, 'failed': 0}
+        peak = [rss_kb(pid) if pid else 0]
+        done = asyncio.Event()
+
+        async def sample_memory():
+            while not done.is_set():
+                peak[0] = max(peak[0], rss_kb(pid))
+                await asyncio.sleep(0.1)
+
+        async def connection():
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError:
+                counts['failed'] += requests
+                return
+            try:
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    writer.write(request)
+                    await writer.drain()
+                    status = await self.read_response(reader)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    counts['ok' if status < 400 else 'failed'] += 1
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                counts['failed'] += 1
+            finally:
+                writer.close()
+
+        sampler = asyncio.create_task(sample_memory()) if pid else None
+        start = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(connections)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        if sampler:
+            await sampler
+        return {'elapsed': elapsed, 'latencies': latencies, 'peak_memory': peak[0], **counts}
+
+    #Reads one HTTP/1.1 response (status line, headers and a Content-Length or chunked body) and returns its status code
+    async def read_response(self, reader):
+        status = int((await reader.readline()).split()[1])
+        length = None
+        chunked = False
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+            elif name.lower() == 'transfer-encoding' and 'chunked' in value.lower():
+                chunked = True
+        if chunked:
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length:
+            await reader.readexactly(length)
+        return status
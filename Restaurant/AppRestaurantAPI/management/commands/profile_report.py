@@ -0,0 +1,37 @@
+#Prints the slowest endpoints and the most repeated SQL statements recorded by a running server with PROFILING = True.
+#The numbers are read from /api/_metrics?format=json, the token must belong to a manager or a superuser
+#Usage: python manage.py profile_report --token <token>
+#       python manage.py profile_report --url http://127.0.0.1:8000/api/_metrics --token <token> --limit 10
+
+import json
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Dumps the slowest endpoints and the duplicate SQL statements of a server running with PROFILING on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/_metrics')
+        parser.add_argument('--token', required=True)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = Request(f"{options['url']}?format=json&limit={options['limit']}",
+                          headers={'Authorization': f"Token {options['token']}"})
+        with urlopen(request) as response:
+            report = json.load(response)
+        self.print_report(report)
+
+    def print_report(self, report):
+        self.stdout.write(f"{'endpoint':<45} {'requests':>8} {'mean ms':>9} {'p95 ms':>8} {'queries':>8} {'db ms':>8} {'render ms':>10}")
+        for row in report['endpoints']:
+            self.stdout.write(
+                f"{row['method'] + ' ' + row['endpoint']:<45} {row['requests']:>8} {row['mean_ms']:>9.1f} {row['p95_ms']:>8.0f} "
+                f"{row['mean_queries']:>8.1f} {row['mean_db_ms']:>8.1f} {row['mean_render_ms']:>10.1f}"
+            )
+        if report['duplicates']:
+            self.stdout.write('\nrepeated SQL statements:')
+        for row in report['duplicates']:
+            self.stdout.write(f"{row['repeated']:>6}x  {row['method']} {row['endpoint']}: {row['sql']}")
@@ -0,0 +1,13 @@
+#Deletes the expired Idempotency-Key rows (see idempotency.py), e.g. hourly from cron
+#Usage: python manage.py prune_idempotency_keys
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired idempotency keys and their stored responses'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'deleted {prune_expired()} expired idempotency keys')
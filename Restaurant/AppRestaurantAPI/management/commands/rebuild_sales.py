@@ -0,0 +1,19 @@
+#Builds the sales rollups (DailySales, ItemSales) again from the whole order history, e.g. after the first deploy or after..
+#..orders were changed in the admin. Each chunk of days is rebuilt in its own transaction, so the reports stay available meanwhile
+#Usage: python manage.py rebuild_sales
+#       python manage.py rebuild_sales --days 7
+
+from django.core.management.base import BaseCommand
+
+from AppRestaurantAPI.analytics import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the sales rollups used by /api/analytics from the orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=31, help='days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        chunks = rebuild_all(days=options['days'])
+        self.stdout.write(f'rebuilt the sales rollups in {chunks} chunks')
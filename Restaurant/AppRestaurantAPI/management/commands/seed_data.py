@@ -0,0 +1,151 @@
+#Fills the database with realistic volumes of synthetic data for load tests and benchmarks (see bench_api).
+#Everything is written with bulk INSERTs in batches, one transaction per batch; the orders and their items (the bulk of the rows)..
+#..are sent as plain tuples with executemany, skipping the model instances bulk_create would build. The same --seed always..
+#..produces the same data.
+#The rows are named "Seed ..." / "seed-user-N" and the command refuses to run twice on the same database: use a throwaway..
+#..database and "manage.py flush" to start again
+#Usage: python manage.py seed_data                                         (50 categories, 5k menu items, 100k users, 1M orders)
+#       python manage.py seed_data --users 1000 --orders 20000 --seed 7
+
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from AppRestaurantAPI.analytics import rebuild_all
+from AppRestaurantAPI.models import Category, MenuItem, Order, OrderItem
+from AppRestaurantAPI.roles import DELIVERY_CREW, MANAGER
+
+
+USER_PREFIX = 'seed-user-'
+
+
+#INSERT of many rows given as tuples, in the order of "fields", with one executemany
+def insert_rows(model, fields, rows):
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+class Command(BaseCommand):
+    help = 'Seeds synthetic categories, menu items, users and orders with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--menu-items', type=int, default=5_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--couriers', type=int, default=200, help='how many of the users join the delivery crew')
+        parser.add_argument('--managers', type=int, default=5, help='how many of the users join the managers')
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--items-per-order', type=int, default=3, help='average number of items of an order')
+        parser.add_argument('--days', type=int, default=365, help='the orders are spread over this many past days')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=USER_PREFIX).exists():
+            raise CommandError('The database is already seeded, run "manage.py flush" first')
+        if options['couriers'] + options['managers'] >= options['users']:
+            raise CommandError('--users must be more than --couriers and --managers, the rest of them place the orders')
+        if options['categories'] < 1 or options['menu_items'] < 1:
+            raise CommandError('At least one category and one menu item are needed')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        categories = self.seed_categories(options['categories'])
+        prices = self.seed_menu(options['menu_items'], categories)
+        users, couriers = self.seed_users(options['users'], options['couriers'], options['managers'])
+        self.seed_orders(options['orders'], options['items_per_order'], options['days'], users, couriers, prices)
+        rebuild_all()
+        self.stdout.write(f'done in {time.perf_counter() - started:.1f}s')
+
+    def log(self, message, started):
+        self.stdout.write(f'{message} in {time.perf_counter() - started:.1f}s')
+
+    def seed_categories(self, count):
+        started = time.perf_counter()
+        Category.objects.bulk_create([Category(title=f'Seed category {i}', slug=f'seed-category-{i}') for i in range(count)])
+        self.log(f'{count} categories', started)
+        return list(Category.objects.filter(slug__startswith='seed-category-').values_list('id', flat=True))
+
+    #Returns {menu item id: price}
+    def seed_menu(self, count, categories):
+        started = time.perf_counter()
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                title=f'Seed dish {i}',
+                price=Decimal(self.rng.randrange(200, 3000)) / 100,
+                featured=self.rng.random() < 0.05,
+                category_id=self.rng.choice(categories),
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        self.log(f'{count} menu items', started)
+        return dict(MenuItem.objects.filter(title__startswith='Seed dish ').values_list('id', 'price'))
+
+    #Returns the ids of the customers and of the delivery crew members
+    def seed_users(self, count, couriers, managers):
+        started = time.perf_counter()
+        #the seeded users can't log in with a password, the benchmarks authenticate them directly
+        password = make_password(None)
+        for start in range(0, count, self.batch_size):
+            User.objects.bulk_create([
+                User(username=f'{USER_PREFIX}{i}', password=password)
+                for i in range(start, min(start + self.batch_size, count))
+            ])
+        ids = list(User.objects.filter(username__startswith=USER_PREFIX).order_by('id').values_list('id', flat=True))
+        crew, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+        crew.user_set.add(*ids[:couriers])
+        manager, _ = Group.objects.get_or_create(name=MANAGER)
+        manager.user_set.add(*ids[couriers:couriers + managers])
+        self.log(f'{count} users', started)
+        return ids[couriers + managers:], ids[:couriers]
+
+    def seed_orders(self, count, items_per_order, days, users, couriers, prices):
+        started = time.perf_counter()
+        menu = list(prices)
+        today = datetime.date.today()
+        #the ids of the orders are set here, so their items can be built in the same batch without reading the ids back
+        next_id = (Order.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+        adapt_date = connection.ops.adapt_datefield_value
+        adapt_decimal = connection.ops.adapt_decimalfield_value
+        for start in range(0, count, self.batch_size):
+            orders, items = [], []
+            for order_id in range(next_id + start, next_id + min(start + self.batch_size, count)):
+                age = self.rng.randrange(days)
+                total = Decimal(0)
+                for menuitem in self.rng.sample(menu, min(len(menu), self.rng.randint(1, 2 * items_per_order - 1))):
+                    quantity = self.rng.randint(1, 3)
+                    price = prices[menuitem] * quantity
+                    total += price
+                    items.append((order_id, menuitem, quantity, adapt_decimal(price)))
+                #orders older than two days are delivered, newer ones are on their way or not assigned yet
+                assigned = couriers and (age > 2 or self.rng.random() < 0.5)
+                orders.append((
+                    order_id,
+                    self.rng.choice(users),
+                    self.rng.choice(couriers) if assigned else None,
+                    age > 2,
+                    adapt_decimal(total),
+                    adapt_date(today - datetime.timedelta(days=age)),
+                ))
+            with transaction.atomic():
+                insert_rows(Order, ['id', 'user', 'delivery_crew', 'status', 'total', 'date'], orders)
+                insert_rows(OrderItem, ['order', 'menuitem', 'quantity', 'price'], items)
+            self.stdout.write(f'{start + len(orders)} orders', ending='\r')
+
+        #the ids were given explicitly, so the sequence of the table must move past them (postgres, oracle)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Order]):
+                cursor.execute(sql)
+        self.log(f'{count} orders', started)
@@ -0,0 +1,28 @@
+#Checks that the stored total of every order is the sum of its items (see order_totals.py) and, with --repair, fixes the ones that..
+#..drifted and rebuilds the sales rollups of their days. The orders are read in chunks, the table is never loaded as a whole.
+#Exits with an error when drifted totals were found and not repaired, so it can run from cron / CI
+#Usage: python manage.py verify_order_totals
+#       python manage.py verify_order_totals --repair --chunk 10000
+
+from django.core.management.base import BaseCommand, CommandError
+
+from AppRestaurantAPI.order_totals import CHUNK_SIZE, verify_totals
+
+
+class Command(BaseCommand):
+    help = 'Finds (and with --repair fixes) the orders whose total is not the sum of their items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='set the drifted totals again from the items')
+        parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help='orders checked per query')
+
+    def handle(self, *args, **options):
+        def progress(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"checked {report['checked']} orders, {report['drifted']} drifted")
+
+        report = verify_totals(repair=options['repair'], chunk_size=options['chunk'], progress=progress)
+        self.stdout.write(f"checked {report['checked']} orders: {report['drifted']} drifted, {report['repaired']} repaired")
+        if report['drifted'] > report['repaired']:
+            raise CommandError(f"drifted totals, e.g. the orders {', '.join(map(str, report['orders'][:10]))} "
+                               f"(run with --repair to fix them)")
@@ -0,0 +1,189 @@
+#Bulk import and export of the menu as CSV or JSON lines, used by the menu-items/import and menu-items/export endpoints..
+#..and by the import_menu / export_menu management commands.
+#A row has the fields: title, price, featured, category (the slug of the category), inventory, e.g.
+#   CSV:         title,price,featured,category,inventory
+#                Greek Salad,12.50,true,salads,40
+#   JSON lines:  {"title": "Greek Salad", "price": "12.50", "featured": true, "category": "salads", "inventory": 40}
+#Without featured or inventory (e.g. a file made before inventory was exported) a new item starts as not featured with no..
+#..stock, an existing one keeps its values
+#The rows are read as a stream and handled in batches: every batch is validated, then upserted by the unique MenuItem.title..
+#..with one bulk_create and one bulk_update. Neither the input nor the menu table is ever loaded into memory as a whole.
+#Problems are reported in the errors of the report, never as a server error: a line that isn't UTF-8 ends the import there..
+#..(the batches before it are kept), and a batch whose new titles were created meanwhile by another import is tried again once
+
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .menu_cache import bump_menu_version
+from .models import Category, MenuItem
+
+
+BATCH_SIZE = 500
+FIELDS = ['title', 'price', 'featured', 'category', 'inventory']
+
+CSV = 'csv'
+JSON_LINES = 'jsonl'
+
+
+#Validates one imported row, the category is given by its slug and turned into an id with the slugs loaded before the import
+class MenuItemRowSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2)
+    featured = serializers.BooleanField(required=False)
+    category = serializers.SlugField()
+    inventory = serializers.IntegerField(min_value=0, max_value=2147483647, required=False)
+
+    def validate_category(self, value):
+        if value not in self.context['categories']:
+            raise serializers.ValidationError(f'Unknown category "{value}".')
+        return self.context['categories'][value]
+
+
+#Raised while reading a line that isn't UTF-8, "line" is its number (from 1)
+class InvalidEncoding(ValueError):
+    def __init__(self, line):
+        super().__init__(f'Line {line} is not valid UTF-8.')
+        self.line = line
+
+
+#Turns a stream of byte lines (an uploaded file, the body of a request) into text lines, dropping the BOM some editors put in CSV files
+def decode_lines(lines):
+    for number, line in enumerate(lines):
+        try:
+            line = line.decode('utf-8')
+        except UnicodeDecodeError:
+            raise InvalidEncoding(number + 1)
+        yield line.lstrip('\ufeff') if number == 0 else line
+
+
+#Turns a stream of text lines into a stream of (row number, dict) pairs
+def read_rows(lines, file_format):
+    if file_format == CSV:
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {'__invalid__': line}
+
+
+#Imports the rows and returns a report with the number of created and updated items and the errors of the rejected rows
+def import_rows(rows, batch_size=BATCH_SIZE):
+    #all the category slugs are resolved with one query before the first batch (if a slug is used twice the oldest category wins)
+    categories = {}
+    for slug, pk in Category.objects.values_list('slug', 'id').order_by('id'):
+        categories.setdefault(slug, pk)
+
+    report = {'created': 0, 'updated': 0, 'errors': []}
+    rows = iter(rows)
+    while True:
+        batch = []
+        try:
+            batch.extend(islice(rows, batch_size))
+        except InvalidEncoding as error:
+            report['errors'].append({'row': error.line, 'errors': {'non_field_errors': [
+                f'{error} The rest of the input was not imported.'
+            ]}})
+            rows = iter(())
+        if not batch:
+            break
+        import_batch(batch, categories, report)
+
+    if report['created'] or report['updated']:
+        #bulk_create and bulk_update don't send post_save signals, so the cached menu pages are invalidated here
+        bump_menu_version()
+    return report
+
+
+def import_batch(batch, categories, report):
+    valid = {}
+    for number, row in batch:
+        if '__invalid__' in row:
+            report['errors'].append({'row': number, 'errors': {'non_field_errors': ['Invalid JSON.']}})
+            continue
+        serializer = MenuItemRowSerializer(data=row, context={'categories': categories})
+        if serializer.is_valid():
+            #when a title comes twice in the same batch the last row wins
+            valid[serializer.validated_data['title']] = (number, serializer.validated_data)
+        else:
+            report['errors'].append({'row': number, 'errors': serializer.errors})
+    if not valid:
+        return
+
+    #a concurrent import inserting one of the new titles first makes bulk_create fail, the batch then sees it as existing
+    for attempt in range(2):
+        try:
+            to_create, to_update = upsert_batch(valid)
+            break
+        except IntegrityError:
+            if attempt:
+                report['errors'] += [
+                    {'row': number, 'errors': {'non_field_errors': ['The item was changed by another import at the same time.']}}
+                    for number, _ in valid.values()
+                ]
+                return
+
+    report['created'] += len(to_create)
+    report['updated'] += len(to_update)
+
+
+def upsert_batch(valid):
+    with transaction.atomic():
+        existing = MenuItem.objects.select_for_update().in_bulk(list(valid), field_name='title')
+        to_create = []
+        to_update = []
+        for title, (_, data) in valid.items():
+            item = existing.get(title)
+            if item is None:
+                to_create.append(MenuItem(title=title, price=data['price'], featured=data.get('featured', False),
+                                          category_id=data['category'], inventory=data.get('inventory', 0)))
+            else:
+                item.price = data['price']
+                item.featured = data.get('featured', item.featured)
+                item.category_id = data['category']
+                item.inventory = data.get('inventory', item.inventory)
+                to_update.append(item)
+        MenuItem.objects.bulk_create(to_create)
+        MenuItem.objects.bulk_update(to_update, ['price', 'featured', 'category', 'inventory'])
+    return to_create, to_update
+
+
+#Yields the whole menu as lines of CSV or JSON lines. The items are read in chunks by id, so only one chunk is in memory at a time
+def export_lines(file_format, chunk_size=BATCH_SIZE):
+    if file_format == CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+        yield buffer.getvalue()
+
+    last_id = 0
+    while True:
+        chunk = list(
+            MenuItem.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'title', 'price', 'featured', 'category__slug', 'inventory')[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+
+        if file_format == CSV:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([row[1:] for row in chunk])
+            yield buffer.getvalue()
+        else:
+            yield ''.join(
+                json.dumps({'title': title, 'price': str(price), 'featured': featured, 'category': slug, 'inventory': inventory}) + '\n'
+                for _, title, price, featured, slug, inventory in chunk
+            )
@@ -0,0 +1,80 @@
+#Cache layer for the public menu (MenuItemsView and CategoriesView)
+#Every serialized page is stored in the cache under a key made from the url and its query params (search, ordering, page)..
+#..and under the current "menu version". When a menu item or a category is saved or deleted the version is bumped (see signals.py),..
+#..so all the old pages stop being read at once and simply expire. That works the same with the local memory cache used in tests..
+#..and with a shared cache (redis, memcached) in production, because bumping is a single atomic cache.incr call
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from rest_framework.response import Response
+
+
+VERSION_KEY = 'menu:version'
+MODIFIED_KEY = 'menu:modified'
+
+
+#Returns the current menu version and the time (unix seconds) of the last change.
+#If the cache has lost the keys they are recreated starting from the current time, so a version number is never reused
+def get_menu_state():
+    state = cache.get_many([VERSION_KEY, MODIFIED_KEY])
+    if VERSION_KEY not in state or MODIFIED_KEY not in state:
+        now = int(time.time())
+        cache.add(VERSION_KEY, now, None)
+        cache.add(MODIFIED_KEY, now, None)
+        state = cache.get_many([VERSION_KEY, MODIFIED_KEY])
+    return state[VERSION_KEY], state[MODIFIED_KEY]
+
+
+#Invalidates all the cached menu pages by moving to a new version
+def bump_menu_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time()), None)
+    cache.set(MODIFIED_KEY, int(time.time()), None)
+
+
+#Builds the cache key for a request. Query params are sorted so "?page=2&search=x" and "?search=x&page=2" share one entry,..
+#..the host is part of the key because paginated responses contain absolute "next"/"previous" links.
+#It works with DRF requests and with plain django requests. The async views (async_views.py) build their pages themselves,..
+#..so they pass their own "namespace" and never read a page cached by the DRF views (or the other way round)
+def menu_page_key(request, namespace=''):
+    query_params = getattr(request, 'query_params', request.GET)
+    params = sorted((key, value) for key, values in query_params.lists() for value in values)
+    raw = f'{namespace}|{request.get_host()}|{request.path}|{params}'
+    return 'menu:page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+#The ETag of a cached page changes with the menu version and is different for every page
+def menu_etag(version, key):
+    return quote_etag(f'{version}-{key[len("menu:page:"):]}')
+
+
+#Mixin for the list views of the menu. GET requests are answered from the cache when possible and always carry..
+#..ETag and Last-Modified headers, so clients that send If-None-Match / If-Modified-Since get a 304 without a body
+class MenuCacheMixin:
+    def list(self, request, *args, **kwargs):
+        version, modified = get_menu_state()
+        key = menu_page_key(request)
+        etag = menu_etag(version, key)
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = cache.get(key, version=version)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data, getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60), version=version)
+        else:
+            response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        return response
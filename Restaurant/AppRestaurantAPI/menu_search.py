@@ -0,0 +1,333 @@
+#Search as you type over the titles of the menu items and of their categories (GET /api/menu-items/search?q=...).
+#The menu is held in memory by every process in an inverted index: a sorted list of all the words (prefixes are found with..
+#..bisect, like walking a trie), the items of every word ordered by rank, and the trigrams of the words for typo tolerance.
+#Every word of the query has to match a word of the item, the last one as a prefix ("chicken piz"); a word that matches..
+#..nothing is looked up again allowing one typo (two for long words), so "piza" still finds the pizzas.
+#The index follows the menu version of menu_cache.py: a saved or deleted menu item (or category) is applied to the index of..
+#..the process after the commit, and when the version moved in another way (another process, a bulk import) the index is..
+#..rebuilt from the database on the next search
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice, product
+
+from django.db import transaction
+from django.db.models import Q
+
+from .menu_cache import get_menu_state
+from .models import MenuItem
+
+
+#How many words a prefix or a typo expands to at most, and how many results a search returns at most
+MAX_EXPANSIONS = 50
+MAX_RESULTS = 50
+
+#A query whose rarest word matches more than DENSE items ranks only the first DENSE_CANDIDATES items matching all its words..
+#..(in the order of the rarest word), instead of intersecting sets that large
+DENSE = 20000
+DENSE_CANDIDATES = 100
+
+#How many words of queries keep their matches at most
+MAX_TOKENS = 1000
+
+#Below this many items of a score they are simply sorted by rank, above it the postings are walked in the order of the rank
+SORT_BELOW = 200
+
+#Scores of a word of the query matching a word of the item, a match in the title counts twice as much as in the category
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+TITLE, CATEGORY = 'title', 'category'
+COLUMNS = ['id', 'title', 'price', 'featured', 'category_id', 'category__title']
+
+
+#The lowercase words of a text without accents: "Crème Brûlée" -> ['creme', 'brulee']
+def words_of(text):
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return re.findall(r'[^\W_]+', ''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def trigrams(word):
+    padded = f'$${word}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+#The edit distance between "token" and the closest prefix of "word" ("piz" is 0 from "pizza", "pzz" is 1)
+def prefix_distance(token, word):
+    previous = list(range(len(word) + 1))
+    for i, char in enumerate(token, 1):
+        current = [i]
+        for j, other in enumerate(word, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return min(previous)
+
+
+def allowed_typos(token):
+    return 1 if len(token) < 7 else 2
+
+
+class MenuIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        #the menu version the index was built at, None until the first search
+        self.version = None
+        #id -> (title, price, featured, category id, category title, words of the title, words of the category)
+        self.items = {}
+        #id -> rank: featured items first, then shorter titles, then by title
+        self.ranks = {}
+        #field (TITLE or CATEGORY) -> word -> sorted [(rank, id), ...] of the items having the word in that field
+        self.postings = {TITLE: {}, CATEGORY: {}}
+        #field -> word -> set of the ids of the items having the word in that field, for intersecting the words of a query
+        self.ids = {TITLE: {}, CATEGORY: {}}
+        #all the words, sorted
+        self.words = []
+        #trigram -> words having it
+        self.grams = {}
+        #word of a query -> its matches (see matches())
+        self.tokens = {}
+
+    #Loads the whole menu (one query)
+    def rebuild(self, version):
+        self.clear()
+        for row in MenuItem.objects.values_list(*COLUMNS).iterator(chunk_size=5000):
+            item_id = self.store(row)
+            entry = (self.ranks[item_id], item_id)
+            for field, words in self.fields_of(item_id):
+                for word in words:
+                    self.postings[field].setdefault(word, []).append(entry)
+                    self.ids[field].setdefault(word, set()).add(item_id)
+        for postings in self.postings.values():
+            for items in postings.values():
+                items.sort()
+        self.words = sorted(set(self.ids[TITLE]) | set(self.ids[CATEGORY]))
+        for word in self.words:
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, set()).add(word)
+        self.version = version
+
+    def store(self, row):
+        item_id, title, price, featured, category_id, category_title = row
+        self.items[item_id] = (title, str(price), featured, category_id, category_title, set(words_of(title)), set(words_of(category_title)))
+        self.ranks[item_id] = (not featured, len(title), title.casefold(), item_id)
+        return item_id
+
+    def fields_of(self, item_id):
+        item = self.items[item_id]
+        return (TITLE, item[5]), (CATEGORY, item[6])
+
+    def add(self, row):
+        self.tokens.clear()
+        item_id = self.store(row)
+        entry = (self.ranks[item_id], item_id)
+        for field, words in self.fields_of(item_id):
+            for word in words:
+                if not self.known(word):
+                    insort(self.words, word)
+                    for gram in trigrams(word):
+                        self.grams.setdefault(gram, set()).add(word)
+                insort(self.postings[field].setdefault(word, []), entry)
+                self.ids[field].setdefault(word, set()).add(item_id)
+
+    def remove(self, item_id):
+        if item_id not in self.items:
+            return
+        self.tokens.clear()
+        entry = (self.ranks[item_id], item_id)
+        for field, words in self.fields_of(item_id):
+            for word in words:
+                items = self.postings[field][word]
+                del items[bisect_left(items, entry)]
+                self.ids[field][word].discard(item_id)
+                if not items:
+                    del self.postings[field][word]
+                    del self.ids[field][word]
+                if not self.known(word):
+                    del self.words[bisect_left(self.words, word)]
+                    for gram in trigrams(word):
+                        self.grams[gram].discard(word)
+                        if not self.grams[gram]:
+                            del self.grams[gram]
+        del self.items[item_id]
+        del self.ranks[item_id]
+
+    def known(self, word):
+        return word in self.ids[TITLE] or word in self.ids[CATEGORY]
+
+    #Reads the menu items matching "condition" again from the database, the ones in "removed" are dropped
+    def refresh(self, condition, removed=()):
+        for item_id in removed:
+            self.remove(item_id)
+        for row in MenuItem.objects.filter(condition).values_list(*COLUMNS):
+            self.remove(row[0])
+            self.add(row)
+
+    #The words of the index "token" matches as a prefix (at most MAX_EXPANSIONS) and, if there are none, the ones it matches..
+    #..with typos. Returns {word: EXACT, PREFIX or FUZZY}
+    def expand(self, token):
+        words = {}
+        i = bisect_left(self.words, token)
+        while i < len(self.words) and len(words) < MAX_EXPANSIONS and self.words[i].startswith(token):
+            words[self.words[i]] = EXACT if self.words[i] == token else PREFIX
+            i += 1
+        if words or len(token) < 3:
+            return words
+
+        typos = allowed_typos(token)
+        grams = trigrams(token)
+        shared = Counter(word for gram in grams for word in self.grams.get(gram, ()))
+        #an edit changes at most 3 trigrams
+        needed = max(1, len(grams) - 3 * typos)
+        fuzzy = sorted(word for word, count in shared.items() if count >= needed and prefix_distance(token, word) <= typos)
+        return dict.fromkeys(fuzzy[:MAX_EXPANSIONS], FUZZY)
+
+    #The matches of a word of the query: its expansion and the matched items grouped by score (quality x weight of the field),..
+    #..{score: (the postings to merge, the set of their ids)}. As the user types the same words come back again and again,..
+    #..so they are kept until the index changes
+    def matches(self, token):
+        if token in self.tokens:
+            return self.tokens[token]
+        words = self.expand(token)
+        levels = {}
+        for word, quality in words.items():
+            for field, weight in ((TITLE, 2), (CATEGORY, 1)):
+                if word in self.ids[field]:
+                    levels.setdefault(quality * weight, []).append((self.postings[field][word], self.ids[field][word]))
+        levels = {
+            score: ([postings for postings, _ in level], level[0][1] if len(level) == 1 else set().union(*(ids for _, ids in level)))
+            for score, level in levels.items()
+        }
+        if len(self.tokens) >= MAX_TOKENS:
+            self.tokens.clear()
+        self.tokens[token] = words, levels
+        return words, levels
+
+    #The items matching one word of the query in the order of (score, rank), walking the postings of its matches: only the..
+    #..items taken from the generator are touched
+    def search_word(self, levels):
+        seen = set()
+        for score in sorted(levels, reverse=True):
+            for _, item_id in heapq.merge(*levels[score][0]):
+                if item_id not in seen:
+                    seen.add(item_id)
+                    yield item_id
+
+    #More words: the score of an item is the sum of the scores of the words, so the combinations of their score levels are..
+    #..visited from the highest total down. The items of a combination are the intersection of the id sets (done by the set..
+    #..operations in C); only the ones returned are put in the order of the rank
+    def search_words(self, matches, limit):
+        matches = sorted(matches, key=lambda match: sum(len(ids) for _, ids in match[1].values()))
+        if sum(len(ids) for _, ids in matches[0][1].values()) > DENSE:
+            return self.search_dense(matches, limit)
+
+        combinations = {}
+        for combination in product(*(levels.items() for _, levels in matches)):
+            combinations.setdefault(sum(score for score, _ in combination), []).append([level for _, level in combination])
+
+        found = []
+        seen = set()
+        for total in sorted(combinations, reverse=True):
+            group = set()
+            walks = []
+            for levels in combinations[total]:
+                sets = sorted((ids for _, ids in levels), key=len)
+                group |= sets[0].intersection(*sets[1:])
+                #the postings of the rarest word
+                walks += levels[0][0]
+            group -= seen
+            needed = limit - len(found)
+            if len(group) <= SORT_BELOW:
+                found += sorted(group, key=self.ranks.__getitem__)[:needed]
+            else:
+                #many items, the postings are walked in the order of the rank instead of sorting them all
+                taken = set()
+                for _, item_id in heapq.merge(*walks):
+                    if item_id in group and item_id not in taken:
+                        taken.add(item_id)
+                        found.append(item_id)
+                        if len(taken) == needed:
+                            break
+            if len(found) == limit:
+                break
+            seen |= group
+        return found
+
+    #Every word of the query matches more than DENSE items (e.g. "with s"), so matching items are everywhere: the rarest..
+    #..word is walked in the order of (score, rank) and the first DENSE_CANDIDATES items matching all the words are scored
+    def search_dense(self, matches, limit):
+        expansions = [words for words, _ in matches]
+        scored = []
+        for item_id in self.search_word(matches[0][1]):
+            score = self.score(item_id, expansions)
+            if score:
+                scored.append((-score, self.ranks[item_id]))
+                if len(scored) == DENSE_CANDIDATES:
+                    break
+        return [rank[-1] for _, rank in heapq.nsmallest(limit, scored)]
+
+    #The score of an item for the words of the query (given as {word: quality} each), 0 when one of them doesn't match
+    def score(self, item_id, expansions):
+        _, _, _, _, _, title_words, category_words = self.items[item_id]
+        total = 0
+        for words in expansions:
+            best = max([words[word] * 2 for word in title_words if word in words] +
+                       [words[word] for word in category_words if word in words], default=0)
+            if not best:
+                return 0
+            total += best
+        return total
+
+    def search(self, query, limit):
+        matches = [self.matches(token) for token in dict.fromkeys(words_of(query))]
+        if not matches or not all(levels for _, levels in matches):
+            return []
+        if len(matches) == 1:
+            found = list(islice(self.search_word(matches[0][1]), limit))
+        else:
+            found = self.search_words(matches, limit)
+
+        results = []
+        for item_id in found:
+            title, price, featured, category_id, category_title, _, _ = self.items[item_id]
+            results.append({'id': item_id, 'title': title, 'price': price, 'featured': featured,
+                            'category': category_id, 'category_title': category_title})
+        return results
+
+
+index = MenuIndex()
+
+
+#Returns the best "limit" menu items for the query, [{'id', 'title', 'price', 'featured', 'category', 'category_title'}, ...]
+def search(query, limit=10):
+    version, _ = get_menu_state()
+    with index.lock:
+        if index.version != version:
+            index.rebuild(version)
+        return index.search(query, min(max(limit, 1), MAX_RESULTS))
+
+
+#Called for every saved or deleted menu item or category (see signals.py).
+#The change is applied once the transaction commits, right after the menu version was bumped for it, so a rolled back..
+#..change never reaches the index
+def menu_changed(instance, deleted):
+    if isinstance(instance, MenuItem):
+        condition, removed = Q(pk=instance.pk), [instance.pk] if deleted else []
+    else:
+        condition, removed = Q(category_id=instance.pk), []
+
+    def apply():
+        version, _ = get_menu_state()
+        with index.lock:
+            #the index is only patched when it is at most at the version bumped by this change (it may have been rebuilt..
+            #..meanwhile), otherwise another change came in between and the next search rebuilds it
+            if index.version is not None and version - 1 <= index.version <= version:
+                index.refresh(condition, removed)
+                index.version = version
+
+    transaction.on_commit(apply)
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+#Fills CartTotal for the carts which already exist
+def fill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('AppRestaurantAPI', 'Cart')
+    CartTotal = apps.get_model('AppRestaurantAPI', 'CartTotal')
+    totals = Cart.objects.order_by().values('user_id').annotate(total=Sum('price'))
+    CartTotal.objects.bulk_create(
+        [CartTotal(user_id=row['user_id'], total=row['total']) for row in totals.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppRestaurantAPI', '0003_checkoutjob'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartTotal',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+            ],
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
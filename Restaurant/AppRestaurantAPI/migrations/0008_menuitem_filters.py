@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppRestaurantAPI', '0007_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='inventory',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='AppRestaurantAPI.category'),
+        ),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='featured',
+            field=models.BooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=6),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['category', 'featured', 'price', 'title'], name='menuitem_cat_feat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['category', 'price', 'title'], name='menuitem_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['featured', 'price', 'title'], name='menuitem_feat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['price', 'title'], name='menuitem_price_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['inventory', 'title'], name='menuitem_inventory_idx'),
+        ),
+    ]
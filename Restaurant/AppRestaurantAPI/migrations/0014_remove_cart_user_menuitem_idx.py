@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppRestaurantAPI', '0013_idempotencykey_headers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_user_menuitem_idx',
+        ),
+    ]
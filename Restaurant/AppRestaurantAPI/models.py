@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 
 from rest_framework.validators import UniqueValidator
 
@@ -32,13 +33,28 @@ class Category(models.Model):
 #Creating a model for the Menuitem after which comes the fields with formats and params, ID fields is set by default so no need to specify it
 class MenuItem(models.Model):
     title = models.CharField(max_length=255, db_index=True, unique=True)
-    price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
-    featured = models.BooleanField(db_index=True)
-    category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+    featured = models.BooleanField()
+    #no index of its own, the composite indexes below start with the category
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, db_index=False)
+    #How many portions are in stock
+    inventory = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
 
+    #The lists of the menu filter by category and/or featured and order by price (the title breaks the ties, see filters.py),..
+    #..each of these indexes answers one combination as a range scan already in the order of the page.
+    #They replace the single column indexes of price, featured and category
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'featured', 'price', 'title'], name='menuitem_cat_feat_price_idx'),
+            models.Index(fields=['category', 'price', 'title'], name='menuitem_cat_price_idx'),
+            models.Index(fields=['featured', 'price', 'title'], name='menuitem_feat_price_idx'),
+            models.Index(fields=['price', 'title'], name='menuitem_price_title_idx'),
+            models.Index(fields=['inventory', 'title'], name='menuitem_inventory_idx'),
+        ]
+
 
 
 
@@ -57,28 +73,207 @@ class Cart(models.Model):
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
-    price = models.DecimalField(max_digits=6, decimal_places=2)
+    #quantity x unit price, up to 1000 x 9999.99
+    price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    #The cart is read by user (CartView, checkout) through the index of the user FK, one item of a user's cart (cart.py) through..
+    #..the unique (menuitem, user) index
     class Meta:
         unique_together = ('menuitem', 'user')
 
+#The total of the cart of a user, kept up to date by cart.py every time the cart changes, so it doesn't have to be summed on every read
+class CartTotal(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
 #Creating a model for the Order after which comes the fields with formats and params, ID fields is set by default so no need to specify it
 class Order(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    #no index of their own, the composite indexes below start with the user, the delivery crew and the status
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     delivery_crew = models.ForeignKey(
-        User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True)
-    status = models.BooleanField(default=0, db_index=True)
-    total = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+        User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True, db_index=False)
+    status = models.BooleanField(default=0)
+    #The sum of the prices of the items, set by the database when the order is placed (see order_totals.py)..
+    #..and as wide as the revenue of the sales rollups, so big catering orders fit
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     date = models.DateField(db_index=True)
 
+    #Composite indexes for the way the orders are read (see OrderView.get_queryset), all of the lists are ordered by date:
+    # - a customer's orders: user = ? ORDER BY date
+    # - a delivery crew member's orders: delivery_crew = ? ORDER BY date
+    # - the orders not delivered yet: status = ? ORDER BY date
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='order_crew_date_idx'),
+            models.Index(fields=['status', 'date'], name='order_status_date_idx'),
+        ]
+
 #Creating a model for the OrderItem after which comes the fields with formats and params, ID fields is set by default so no need to specify it
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order, on_delete=models.CASCADE, related_name='order')
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
-    price = models.DecimalField(max_digits=6, decimal_places=2)
+    #the price of the line, quantity x unit price like in the cart
+    price = models.DecimalField(max_digits=10, decimal_places=2)
 
 #The class below sets the unique values for the listed fields so that they can't double
     class Meta:
-        unique_together = ('order', 'menuitem')
\ No newline at end of file
+        unique_together = ('order', 'menuitem')
+
+
+#Delivered orders older than ORDER_ARCHIVE_DAYS, moved out of Order / OrderItem by the archiving (see archive.py) so the..
+#..live tables only hold the recent orders. They keep their ids, the id a customer knows still finds the order in /api/orders/archive
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    status = models.BooleanField(default=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    date = models.DateField()
+
+    #The archive is read like the live orders, newest first: all of it, a customer's orders or a delivery crew member's orders
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='archivedorder_date_idx'),
+            models.Index(fields=['user', 'date'], name='archivedorder_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='archivedorder_crew_date_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='+')
+    quantity = models.SmallIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
+
+
+#A checkout queued by OrderView.create when ASYNC_ORDERS is on, the checkout workers (manage.py checkout_worker) turn it into an Order
+class CheckoutJob(models.Model):
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    #the data posted to /api/orders (e.g. the date), it is validated again by the worker
+    data = models.JSONField(default=dict)
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    #the validation errors when the job failed
+    errors = models.JSONField(null=True, blank=True)
+    #the unexpected errors of the job so far, after CHECKOUT_JOB_MAX_ATTEMPTS of them the job is failed
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    #The workers look for the oldest pending jobs, enqueueing looks for the open job of a user
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created'], name='checkoutjob_status_created_idx'),
+            models.Index(fields=['user', 'status'], name='checkoutjob_user_status_idx'),
+        ]
+
+
+#A change of the status / delivery crew of an order, written only when ORDER_EVENTS_DATABASE is on (see events.py).
+#Every process serving /api/orders/events reads the new rows and pushes them to its own clients
+class OrderEvent(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    status = models.BooleanField()
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+#Rollups of the sales, kept up to date by the checkout (see analytics.py) so the reports don't scan Order / OrderItem.
+#"manage.py rebuild_sales" builds them again from the orders
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    #how many units of menu items were sold
+    items = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+#The sales of one menu item on one day, with the category the item had when it was sold
+class ItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    #the unique index (date, menuitem) also serves the reports, which always filter a range of dates
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+
+#The tables of the restaurant that can be booked (see reservations.py)
+class Table(models.Model):
+    number = models.PositiveSmallIntegerField(unique=True)
+    seats = models.PositiveSmallIntegerField(db_index=True)
+    active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f'Table {self.number} ({self.seats} seats)'
+
+
+#The opening hours in which tables can be booked, e.g. lunch and dinner on each day of the week (0 = Monday)
+class Seating(models.Model):
+    WEEKDAYS = [(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')]
+
+    name = models.CharField(max_length=50)
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS, db_index=True)
+    opens = models.TimeField()
+    closes = models.TimeField()
+
+    def __str__(self):
+        return f'{self.name} ({self.get_weekday_display()} {self.opens}-{self.closes})'
+
+
+class Booking(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    table = models.ForeignKey(Table, on_delete=models.PROTECT)
+    party_size = models.PositiveSmallIntegerField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    #a user's bookings and the bookings of a table are both listed by start
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start'], name='booking_user_start_idx'),
+            models.Index(fields=['table', 'start'], name='booking_table_start_idx'),
+        ]
+
+
+#The slot grid of the bookings: one row per table and RESERVATION_SLOT_MINUTES slot a booking holds. "slot" is the number..
+#..of the slot counted from the unix epoch (see reservations.slot_number), so the grid is read and compared as plain integers.
+#The unique (table, slot) index is both the interval index the availability search reads and what makes double-booking..
+#..impossible: of two concurrent bookings of the same slot only one INSERT can succeed, on every database
+class BookingSlot(models.Model):
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='slots')
+    table = models.ForeignKey(Table, on_delete=models.CASCADE)
+    slot = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('table', 'slot')
+
+
+#The Idempotency-Key of a POST (see idempotency.py) and, once the request has finished, its stored response.
+#A row without status_code is a request still running. Expired rows are deleted by "manage.py prune_idempotency_keys"
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    #the headers set by the view (e.g. Location), sent again with the replay
+    headers = models.JSONField(null=True)
+    created = models.DateTimeField()
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
@@ -0,0 +1,99 @@
+#Bulk change of the status / delivery crew of many orders (PATCH /api/orders/bulk), e.g. at the change of a shift:
+#   {"ids": [12, 13, 14], "status": true}                               the orders 12, 13 and 14 are delivered
+#   {"filter": {"delivery_crew": 7, "status": false}, "delivery_crew": 9}   the pending orders of member 7 go to member 9
+#The orders are chosen among the ones the user can see (views.get_order_queryset) and the role rules of an update apply:..
+#..customers can't change orders, a delivery crew member can only change the status of the orders assigned to him.
+#Inside one transaction the orders are locked and read once (for the events of /api/orders/events), then changed with one..
+#..UPDATE per 5000 orders instead of a save() per order. The response only counts the orders: {"matched": 120, "updated": 97}
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+
+from .dispatch import BATCH_SIZE
+from .events import order_event, publish
+from .models import Order
+from .roles import DELIVERY_CREW, is_customer, is_delivery_crew, is_manager_or_super
+
+
+#The most ids a request can list, bigger changes are sent as a filter
+MAX_IDS = 10_000
+
+
+#The lookups of the filter fields that aren't fields of Order
+LOOKUPS = {'date_from': 'date__gte', 'date_to': 'date__lte'}
+
+
+#Which orders a filter matches, all the given fields must match
+class OrderFilterSerializer(serializers.Serializer):
+    status = serializers.BooleanField(required=False)
+    delivery_crew = serializers.IntegerField(required=False, allow_null=True)
+    user = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('Give at least one field of the orders to match.')
+        return attrs
+
+
+class OrderBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=MAX_IDS)
+    filter = OrderFilterSerializer(required=False)
+    status = serializers.BooleanField(required=False)
+    delivery_crew = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(groups__name=DELIVERY_CREW), required=False, allow_null=True
+    )
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Give either "ids" or "filter".')
+        if 'status' not in attrs and 'delivery_crew' not in attrs:
+            raise serializers.ValidationError('Give the new "status" and/or "delivery_crew".')
+        return attrs
+
+    #The new values as fields of Order
+    def changes(self):
+        changes = {}
+        if 'status' in self.validated_data:
+            changes['status'] = self.validated_data['status']
+        if 'delivery_crew' in self.validated_data:
+            crew = self.validated_data['delivery_crew']
+            changes['delivery_crew_id'] = crew.pk if crew else None
+        return changes
+
+
+#Applies the change to the orders of "queryset" (the orders the user can see) and returns the summary.
+#Orders that already have the new values are matched but not written, and don't publish an event
+def bulk_update_orders(request, queryset, data):
+    if is_customer(request):
+        raise PermissionDenied('Customers can\'t change orders.')
+    serializer = OrderBulkUpdateSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    changes = serializer.changes()
+    if not is_manager_or_super(request) and (not is_delivery_crew(request) or set(changes) != {'status'}):
+        raise PermissionDenied('Only managers can assign the delivery crew.')
+
+    queryset = queryset.prefetch_related(None).order_by()
+    if 'ids' in serializer.validated_data:
+        queryset = queryset.filter(id__in=serializer.validated_data['ids'])
+    else:
+        queryset = queryset.filter(**{LOOKUPS.get(name, name): value for name, value in serializer.validated_data['filter'].items()})
+
+    with transaction.atomic():
+        #the orders are locked, so a concurrent change can't slip in between the read and the UPDATE
+        rows = list(queryset.select_for_update().values_list('id', 'user_id', 'status', 'delivery_crew_id'))
+        changed = [
+            (order, user, changes.get('status', status), changes.get('delivery_crew_id', crew))
+            for order, user, status, crew in rows
+            if changes.get('status', status) != status or changes.get('delivery_crew_id', crew) != crew
+        ]
+        for start in range(0, len(changed), BATCH_SIZE):
+            Order.objects.filter(id__in=[row[0] for row in changed[start:start + BATCH_SIZE]]).update(**changes)
+        #update() sends no post_save, the events are published here like the ones of the dispatch
+        publish(order_event(*row) for row in changed)
+
+    return {'matched': len(rows), 'updated': len(changed)}
@@ -0,0 +1,70 @@
+#The total of an order is the sum of the prices of its OrderItems. It is stored in Order.total so the lists and the reports don't..
+#..sum the items again, and it is computed by the database: the checkout writes the items, then sets the total with
+#   UPDATE order SET total = (SELECT COALESCE(SUM(price), 0) FROM orderitem WHERE order_id = order.id) WHERE id = ?
+#in the same transaction, so the stored total is always the one of the rows that were committed with it.
+#Items changed outside the checkout (admin, shell, a bulk fix) can still leave a total behind, "manage.py verify_order_totals"..
+#..walks the whole order table in chunks of ids, reports those orders and with --repair sets their totals again the same way
+
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import analytics
+from .models import Order, OrderItem
+
+
+CHUNK_SIZE = 5000
+
+
+#The sum of the items of the order of the current row, 0 for an order without items
+def items_total():
+    items = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by().values('order')
+        .annotate(total=Sum('price'))
+        .values('total')
+    )
+    return Coalesce(Subquery(items), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+#Sets the total of the order from its items (inside the transaction of the caller) and reads it back into order.total
+def store_order_total(order):
+    Order.objects.filter(pk=order.pk).update(total=items_total())
+    order.refresh_from_db(fields=['total'])
+
+
+#Checks the stored totals of all the orders against their items, CHUNK_SIZE orders per step: the ids of a chunk are read by..
+#..keyset (id > last id of the previous chunk), then the stored and the summed totals of the chunk with one query.
+#With "repair" the drifted orders of a chunk are set again with one UPDATE, in the transaction of the chunk, and the sales..
+#..rollups of their days are rebuilt at the end. Returns {'checked': n, 'drifted': n, 'repaired': n, 'orders': [first ids]}
+def verify_totals(repair=False, chunk_size=CHUNK_SIZE, progress=None):
+    report = {'checked': 0, 'drifted': 0, 'repaired': 0, 'orders': []}
+    days = set()
+    last = 0
+    while True:
+        ids = list(Order.objects.filter(id__gt=last).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        chunk = Order.objects.filter(id__gt=last, id__lte=ids[-1])
+        last = ids[-1]
+
+        with transaction.atomic():
+            drifted = [
+                (order, date)
+                for order, date, total, expected in chunk.annotate(expected=items_total()).values_list('id', 'date', 'total', 'expected')
+                if total != expected
+            ]
+            if drifted and repair:
+                report['repaired'] += Order.objects.filter(id__in=[order for order, _ in drifted]).update(total=items_total())
+                days.update(date for _, date in drifted)
+
+        report['checked'] += len(ids)
+        report['drifted'] += len(drifted)
+        #the first 100 drifted orders are listed, to look at them
+        report['orders'] += [order for order, _ in drifted][:100 - len(report['orders'])]
+        if progress is not None:
+            progress(report)
+
+    for day in sorted(days):
+        analytics.rebuild(day, day)
+    return report
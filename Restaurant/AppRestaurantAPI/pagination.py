@@ -0,0 +1,120 @@
+#Pagination classes of the app.
+#By default the lists keep the page number pagination from settings.py (?page=3), and clients can ask for a bigger page with..
+#..?page_size=N up to MAX_PAGE_SIZE. Sending the "cursor" param (empty for the first page: ?cursor=) switches a list to keyset pagination:..
+#..instead of COUNT(*) + OFFSET the next page is read with "WHERE (date, id) < (last date, last id) ORDER BY date, id LIMIT n",..
+#..which costs the same no matter how deep the client has scrolled.
+#The cursor pages always come in the keyset order, a cursor sent together with ?ordering= is answered with 400
+
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+MAX_PAGE_SIZE = getattr(settings, 'MAX_PAGE_SIZE', 100)
+
+
+class PageSizePagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+#Page number pagination that switches to keyset pagination when the "cursor" query param is sent.
+#"keyset_ordering" lists the fields the pages are ordered by, the last field must be unique (e.g. the id) so every row has its own position
+class KeysetOrPageNumberPagination(PageSizePagination):
+    keyset_ordering = ('id',)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering_query_param = api_settings.ORDERING_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        if request.query_params.get(self.ordering_query_param):
+            ordering = ', '.join(self.keyset_ordering)
+            raise ValidationError({self.ordering_query_param: f'Cannot be used with {self.cursor_query_param}, its pages are ordered by {ordering}.'})
+        self.request = request
+        self.display_page_controls = False
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.keyset_ordering)
+        position = self.decode_cursor(request.query_params[self.cursor_query_param], queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        #one row more than the page size is read to know if there is a next page without counting the table
+        rows = list(queryset[:page_size + 1])
+        self.page_rows = rows[:page_size]
+        self.next_position = self.position_of(self.page_rows[-1]) if len(rows) > page_size else None
+        return self.page_rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    #Builds the condition "row comes after position" for the ordering, e.g. for ('-date', '-id'):
+    #   date <= d AND (date < d OR (date = d AND id < i))
+    #The first "date <= d" is redundant for the result, but it is what lets the database seek into the index instead of scanning it from the start
+    def after(self, position):
+        first = self.keyset_ordering[0]
+        condition = Q()
+        for index, field in enumerate(self.keyset_ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(self.keyset_ordering[:index], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
+
+    def position_of(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.keyset_ordering]
+
+    def encode_cursor(self, position):
+        raw = json.dumps([str(value) for value in position])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    #Reads the cursor back into python values using the model fields (dates, decimals, ids), an empty cursor means the first page
+    def decode_cursor(self, cursor, model):
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if len(values) != len(self.keyset_ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.keyset_ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+#Newest orders first
+class OrderPagination(KeysetOrPageNumberPagination):
+    keyset_ordering = ('-date', '-id')
+
+
+#Cheapest items first, the title is unique so it breaks ties between items with the same price
+class MenuItemPagination(KeysetOrPageNumberPagination):
+    keyset_ordering = ('price', 'title')
@@ -0,0 +1,251 @@
+#Per-endpoint profiling of the requests, turned on with PROFILING = True in settings.py.
+#ProfilingMiddleware measures for every request: the total latency, the number of SQL queries and the time spent in them,..
+#..and the time spent rendering (serializing) the response. The values go into in-process histograms labelled with the..
+#..method and the url pattern of the endpoint (e.g. "api/orders/<int:pk>"), which are exposed at /api/_metrics in the..
+#..Prometheus text format (?format=json gives the report used by "manage.py profile_report").
+#SQL statements run more than once by the same request (the usual sign of an N+1 problem) are counted as well.
+#The queries are recorded by an execute wrapper on the connections of the thread serving the request, which under ASGI is..
+#..not the thread of the event loop (sync views and the async ORM run on sync_to_async threads), the recorder of the request..
+#..reaches them through a context variable.
+#With PROFILING off the middleware removes itself from the stack (MiddlewareNotUsed), so it costs nothing
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from rest_framework.renderers import BaseRenderer
+
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200)
+
+#name, buckets, help text
+METRICS = {
+    'latency': ('restaurant_request_duration_seconds', SECONDS, 'Total time of the request'),
+    'queries': ('restaurant_request_queries', QUERIES, 'SQL queries run by the request'),
+    'db': ('restaurant_request_db_seconds', SECONDS, 'Time spent in SQL queries'),
+    'render': ('restaurant_request_render_seconds', SECONDS, 'Time spent rendering (serializing) the response'),
+}
+
+#How many different duplicated statements are remembered, so the memory used stays bounded
+MAX_DUPLICATES = 500
+
+#The label of requests that didn't match any url
+UNMATCHED = '<unmatched>'
+
+#The methods labelled as they are, any other method sent by a client is labelled OTHER so the number of series stays bounded
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+OTHER = 'OTHER'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        #per bucket, not cumulative; the last one counts the values above the biggest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    #The upper bound of the bucket holding the q-th quantile (the biggest bucket when it is above all of them)
+    def quantile(self, q):
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return self.buckets[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        #(metric, method, endpoint) -> Histogram
+        self.histograms = {}
+        #(method, endpoint, sql) -> how many times the statement was repeated
+        self.duplicates = Counter()
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.duplicates.clear()
+
+    def record(self, method, endpoint, values, statements):
+        repeated = [(sql, count - 1) for sql, count in Counter(statements).items() if count > 1]
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, method, endpoint)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(METRICS[metric][1])
+                self.histograms[key].observe(value)
+            for sql, count in repeated:
+                key = (method, endpoint, sql)
+                if key in self.duplicates or len(self.duplicates) < MAX_DUPLICATES:
+                    self.duplicates[key] += count
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            for metric, (name, buckets, help_text) in METRICS.items():
+                series = sorted((key[1:], histogram) for key, histogram in self.histograms.items() if key[0] == metric)
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (method, endpoint), histogram in series:
+                    labels = f'method="{escape(method)}",endpoint="{escape(endpoint)}"'
+                    total = 0
+                    for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                        total += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:g}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    #The endpoints, slowest (by mean latency) first, and the most repeated statements
+    def report(self, limit=20):
+        with self.lock:
+            endpoints = []
+            for (metric, method, endpoint), latency in self.histograms.items():
+                if metric != 'latency':
+                    continue
+                row = {'method': method, 'endpoint': endpoint, 'requests': latency.count,
+                       'mean_ms': latency.sum / latency.count * 1000, 'p95_ms': latency.quantile(0.95) * 1000}
+                for other in ('queries', 'db', 'render'):
+                    histogram = self.histograms[(other, method, endpoint)]
+                    row[f'mean_{other}' if other == 'queries' else f'mean_{other}_ms'] = (
+                        histogram.sum / histogram.count * (1 if other == 'queries' else 1000)
+                    )
+                endpoints.append(row)
+            duplicates = [
+                {'method': method, 'endpoint': endpoint, 'sql': sql, 'repeated': count}
+                for (method, endpoint, sql), count in self.duplicates.most_common(limit)
+            ]
+        endpoints.sort(key=lambda row: row['mean_ms'], reverse=True)
+        return {'endpoints': endpoints[:limit], 'duplicates': duplicates}
+
+
+registry = Registry()
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+#Collects the queries of one request through connection.execute_wrapper
+class QueryRecorder:
+    def __init__(self):
+        self.statements = []
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.statements.append(sql)
+
+
+#The recorder of the request being served, seen by the sync_to_async threads it runs code on
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+#request_started is sent in the thread that serves the request (under ASGI through sync_to_async), the connections of..
+#..that thread get the wrapper once
+def install_wrapper(**kwargs):
+    for conn in connections.all():
+        if record_query not in conn.execute_wrappers:
+            conn.execute_wrappers.append(record_query)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        request_started.connect(install_wrapper, dispatch_uid='profiling_install_wrapper')
+        install_wrapper()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start, recorder, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.finish(request, start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        start, recorder, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.finish(request, start, recorder)
+        return response
+
+    def start(self, request):
+        request._profile_render = 0
+        recorder = QueryRecorder()
+        return time.perf_counter(), recorder, current_recorder.set(recorder)
+
+    def finish(self, request, start, recorder):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.route if match is not None else UNMATCHED
+        method = request.method if request.method in METHODS else OTHER
+        registry.record(method, endpoint, {
+            'latency': time.perf_counter() - start,
+            'queries': len(recorder.statements),
+            'db': recorder.seconds,
+            'render': request._profile_render,
+        }, recorder.statements)
+
+    #DRF responses are rendered after the view returns, the render is timed here
+    def process_template_response(self, request, response):
+        render = response.render
+
+        def timed_render():
+            start = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request._profile_render += time.perf_counter() - start
+
+        response.render = timed_render
+        return response
+
+
+#Renders the text of /api/_metrics as it is (anything else, e.g. an error, as JSON)
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return data.encode(self.charset)
@@ -0,0 +1,186 @@
+#Table reservations: the availability search and the booking of a table.
+#Time is cut into RESERVATION_SLOT_MINUTES slots, numbered from the unix epoch, and a booking holds one BookingSlot row per slot..
+#..it covers (e.g. 6 rows for 90 minutes with 15 minute slots). The availability of a time window is read from the unique..
+#..(table, slot) index of BookingSlot with one range query over the window, instead of comparing the window with every booking.
+#A booking writes its slots with one bulk INSERT inside a savepoint: when a concurrent request took one of the slots first, the unique..
+#..index rejects the INSERT (IntegrityError), the savepoint is rolled back and the next free table is tried. So two requests can never..
+#..hold the same table at the same time, without locking the tables
+#Bookings are only possible inside the opening hours given by the Seating rows of the weekday. The tables and the opening hours..
+#..(the "floor plan") rarely change and are kept in the cache, a save or delete of a Table or Seating drops it (see signals.py),..
+#..so a search usually runs a single query
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Booking, BookingSlot, Seating, Table
+
+
+FLOOR_PLAN_KEY = 'reservations:floor-plan'
+
+
+def slot_length():
+    return datetime.timedelta(minutes=getattr(settings, 'RESERVATION_SLOT_MINUTES', 15))
+
+
+def default_duration():
+    return datetime.timedelta(minutes=getattr(settings, 'RESERVATION_DURATION_MINUTES', 90))
+
+
+def max_duration():
+    return datetime.timedelta(minutes=getattr(settings, 'RESERVATION_MAX_MINUTES', 240))
+
+
+#The number of the slot a moment falls in
+def slot_number(moment):
+    return int(moment.timestamp() // slot_length().total_seconds())
+
+
+#The numbers of the slots covered by [start, start + duration)
+def slot_numbers(start, duration):
+    first = slot_number(start)
+    return range(first, first + duration // slot_length())
+
+
+#Moves a datetime forward to the next start of a slot (slots are counted from midnight)
+def align(moment):
+    minutes = slot_length().total_seconds() // 60
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    passed = (moment - midnight).total_seconds() / 60
+    return midnight + datetime.timedelta(minutes=-(-passed // minutes) * minutes)
+
+
+def local(day, time):
+    return timezone.make_aware(datetime.datetime.combine(day, time))
+
+
+#The active tables, smallest first, as (id, number, seats) and the opening hours of every weekday as (opens, closes) times
+def floor_plan():
+    plan = cache.get(FLOOR_PLAN_KEY)
+    if plan is None:
+        seatings = {weekday: [] for weekday, _ in Seating.WEEKDAYS}
+        for weekday, opens, closes in Seating.objects.order_by('opens').values_list('weekday', 'opens', 'closes'):
+            seatings[weekday].append((opens, closes))
+        plan = {
+            'tables': list(Table.objects.filter(active=True).order_by('seats', 'number').values_list('id', 'number', 'seats')),
+            'seatings': seatings,
+        }
+        cache.set(FLOOR_PLAN_KEY, plan, getattr(settings, 'FLOOR_PLAN_CACHE_TIMEOUT', 60 * 60))
+    return plan
+
+
+def invalidate_floor_plan():
+    cache.delete(FLOOR_PLAN_KEY)
+
+
+#The opening hours of a day as (opens, closes) aware datetimes
+def seatings_of(day):
+    return [(local(day, opens), local(day, closes)) for opens, closes in floor_plan()['seatings'][day.weekday()]]
+
+
+#The start times on "day" between from_time and to_time at which a booking of "duration" fits inside the opening hours
+def candidate_starts(day, from_time, to_time, duration):
+    window_start, window_end = local(day, from_time), local(day, to_time)
+    slot = slot_length()
+    starts = []
+    for opens, closes in seatings_of(day):
+        start = align(max(opens, window_start))
+        last = min(closes - duration, window_end)
+        while start <= last:
+            starts.append(start)
+            start += slot
+    return sorted(set(starts))
+
+
+#The active tables a party fits at, smallest first: (id, number, seats)
+def tables_for(party_size):
+    return [table for table in floor_plan()['tables'] if table[2] >= party_size]
+
+
+#The set of (table id, slot number) already booked among the given tables in the slots first..last (both included).
+#The statement is written out instead of built by the ORM: it is the hot path of the search and building the filter with..
+#..a long IN list took longer than running it
+def taken_slots(table_ids, first, last):
+    if not table_ids:
+        return set()
+    quote = connection.ops.quote_name
+    sql = (
+        f'SELECT {quote("table_id")}, {quote("slot")} FROM {quote(BookingSlot._meta.db_table)} '
+        f'WHERE {quote("slot")} BETWEEN %s AND %s AND {quote("table_id")} IN ({", ".join(["%s"] * len(table_ids))})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [first, last, *table_ids])
+        return set(cursor.fetchall())
+
+
+#Returns the start times of the day, between from_time and to_time, at which a table for the party is free for "duration",..
+#..with the free tables (smallest first): [{'start': datetime, 'tables': [{'id', 'number', 'seats'}, ...]}, ...]
+def find_availability(party_size, day, from_time=datetime.time.min, to_time=datetime.time.max, duration=None):
+    duration = duration or default_duration()
+    starts = candidate_starts(day, from_time, to_time, duration)
+    tables = tables_for(party_size)
+    if not starts or not tables:
+        return []
+    length = duration // slot_length()
+    taken = taken_slots([table[0] for table in tables], slot_number(starts[0]), slot_number(starts[-1]) + length - 1)
+
+    #a booked slot blocks the starts of the "length" slots up to it, so each start is then checked with one set lookup per table
+    blocked = {(table_id, slot - i) for table_id, slot in taken for i in range(length)}
+    available = []
+    for start in starts:
+        first = slot_number(start)
+        free = [
+            {'id': table_id, 'number': number, 'seats': seats}
+            for table_id, number, seats in tables
+            if (table_id, first) not in blocked
+        ]
+        if free:
+            available.append({'start': start, 'tables': free})
+    return available
+
+
+#Checks that a booking of [start, start + duration) is in the future, on the slot grid and inside the opening hours
+def validate_time(start, duration):
+    slot = slot_length()
+    if duration <= datetime.timedelta(0) or duration % slot or duration > max_duration():
+        raise ValidationError({'duration': f'Must be a multiple of {slot.seconds // 60} minutes, at most {max_duration().seconds // 60}.'})
+    if start <= timezone.now():
+        raise ValidationError({'start': 'Must be in the future.'})
+    start = timezone.localtime(start)
+    if align(start) != start:
+        raise ValidationError({'start': f'Must be at a multiple of {slot.seconds // 60} minutes.'})
+    if not any(opens <= start and start + duration <= closes for opens, closes in seatings_of(start.date())):
+        raise ValidationError({'start': 'The restaurant is closed at that time.'})
+
+
+#Books a table for the party and returns the Booking. With "table" given only that table is tried, otherwise the smallest free..
+#..table the party fits at. Raises ValidationError when no table is free
+def book(user, party_size, start, duration=None, table=None):
+    duration = duration or default_duration()
+    validate_time(start, duration)
+    if table is not None:
+        if not table.active or table.seats < party_size:
+            raise ValidationError({'table': 'The party doesn\'t fit at this table.'})
+        tables = [(table.id, table.number, table.seats)]
+    else:
+        tables = tables_for(party_size)
+
+    slots = slot_numbers(start, duration)
+    taken = {table_id for table_id, _ in taken_slots([table[0] for table in tables], slots[0], slots[-1])}
+    for table_id, _, _ in tables:
+        if table_id in taken:
+            continue
+        try:
+            with transaction.atomic():
+                booking = Booking.objects.create(
+                    user=user, table_id=table_id, party_size=party_size, start=start, end=start + duration
+                )
+                BookingSlot.objects.bulk_create([BookingSlot(booking=booking, table_id=table_id, slot=slot) for slot in slots])
+            return booking
+        except IntegrityError:
+            #a concurrent booking took one of the slots after we read them, the next table is tried
+            continue
+    raise ValidationError({'start': 'No table is free for the party at that time.'})
@@ -0,0 +1,55 @@
+#Resolves the roles (group names) of the user making a request.
+#The group names are loaded with one query, then kept on the request for the rest of it and in the cache for a short time,..
+#..so the permission checks, get_queryset and update methods don't query the auth_group join again and again.
+#When a user is added to or removed from a group the cached entry is deleted (see signals.py)
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery Crew'
+
+
+def role_cache_key(user_id):
+    return f'roles:{user_id}'
+
+
+#Deletes the cached roles of the given users, so their next request reads the groups from the database again
+def invalidate_roles(*user_ids):
+    cache.delete_many([role_cache_key(user_id) for user_id in user_ids])
+
+
+#Returns a frozenset with the names of the groups the user of the request belongs to
+def get_roles(request):
+    #DRF wraps the django request, the roles are stored on the django one so both of them see the same value
+    http_request = getattr(request, '_request', request)
+    roles = getattr(http_request, '_cached_roles', None)
+    if roles is not None:
+        return roles
+
+    user = request.user
+    if not user.is_authenticated:
+        roles = frozenset()
+    else:
+        key = role_cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, getattr(settings, 'ROLE_CACHE_TIMEOUT', 60))
+
+    http_request._cached_roles = roles
+    return roles
+
+
+def is_manager_or_super(request):
+    return request.user.is_superuser or MANAGER in get_roles(request)
+
+
+def is_delivery_crew(request):
+    return DELIVERY_CREW in get_roles(request)
+
+
+#A customer is a normal user which doesn't belong to any group
+def is_customer(request):
+    return not request.user.is_superuser and len(get_roles(request)) == 0
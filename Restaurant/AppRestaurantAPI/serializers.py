@@ -8,8 +8,19 @@ from django.contrib.auth.models import User
 #importing a decimal package for decimals
 from decimal import Decimal
 
+#importing the function which adds an item to the cart or increments its quantity
+from .cart import MAX_QUANTITY, add_to_cart
+
 #importing models created
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, OrderItem, CheckoutJob, Table, Seating, Booking
+from .models import ArchivedOrder, ArchivedOrderItem
+
+#importing the mixin which lets the lists send only some of the fields (?fields= / ?expand=)
+from .fieldsets import SparseFieldsMixin
+
+#importing the booking of tables
+from . import reservations
+import datetime
 
 
 
@@ -21,19 +32,22 @@ class CategorySerializer (serializers.ModelSerializer):
         fields = ['id', 'title', 'slug']
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     #Below we specify that category table is used to represent the target of the relationship using its primary key and also add there all objects
     #of the category table
     category = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all()
     )
     # category = CategorySerializer(read_only=True)
+    #with ?expand=category the lists send the category object instead of its id
+    expandable_fields = {'category': CategorySerializer}
+
     class Meta:
         model = MenuItem
         #We can change the name of the field if we want, for that we remove the one we want from the list below, add there a new name of field
         # After that, above the MEta class we create a variable named after the name we want and assign it
         # =serializers.type_of_field(source='original name of field we changed')
-        fields = ['id', 'title', 'price', 'category', 'featured']
+        fields = ['id', 'title', 'price', 'category', 'featured', 'inventory']
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -44,16 +58,33 @@ class CartSerializer(serializers.ModelSerializer):
     )
 
 
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+
+    #The unit price always comes from the menu item, whatever the client sends
     def validate(self, attrs):
+        attrs['unit_price'] = attrs['menuitem'].price
         attrs['price'] = attrs['quantity'] * attrs['unit_price']
         return attrs
 
+    #Adding an item which is already in the cart increments its quantity (see cart.py)
+    def create(self, validated_data):
+        return add_to_cart(validated_data['user'], validated_data['menuitem'], validated_data['quantity'])
+
     class Meta:
         model = Cart
         fields = ['user', 'menuitem', 'unit_price', 'quantity', 'price']
         extra_kwargs = {
-            'price': {'read_only': True}
+            'price': {'read_only': True},
+            'unit_price': {'read_only': True},
         }
+        #the unique ('menuitem', 'user') check is removed, a second add of the same item is an increment and not an error
+        validators = []
+
+
+class UserSerilializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id','username','email']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -62,18 +93,85 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['order', 'menuitem', 'quantity', 'price']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     #Below represents the edited order field to orderitem which represents order and its dependancies (many=True)
     # and is able only for GET request (read_only=True)
     orderitem = OrderItemSerializer(many=True, read_only=True, source='order')
+    #with ?expand=user,delivery_crew the lists send the users instead of their ids
+    expandable_fields = {'user': UserSerilializer, 'delivery_crew': UserSerilializer}
 
     class Meta:
         model = Order
         fields = ['id', 'user', 'delivery_crew',
                   'status', 'date', 'total', 'orderitem']
+        #the total is always the sum of the items (see order_totals.py)
+        read_only_fields = ['total']
 
 
-class UserSerilializer(serializers.ModelSerializer):
+#Read only serializers of the archived orders, an archived order looks the same as a live one
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
     class Meta:
-        model = User
-        fields = ['id','username','email']
\ No newline at end of file
+        model = ArchivedOrderItem
+        fields = ['order', 'menuitem', 'quantity', 'price']
+        read_only_fields = fields
+
+
+class ArchivedOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    orderitem = ArchivedOrderItemSerializer(many=True, read_only=True, source='items')
+    expandable_fields = {'user': UserSerilializer, 'delivery_crew': UserSerilializer}
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'user', 'delivery_crew', 'status', 'date', 'total', 'orderitem']
+        read_only_fields = fields
+
+
+#Read only serializer for the status of a queued checkout
+class CheckoutJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CheckoutJob
+        fields = ['id', 'status', 'order', 'errors', 'created']
+        read_only_fields = fields
+
+
+class TableSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Table
+        fields = ['id', 'number', 'seats', 'active']
+
+
+class SeatingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Seating
+        fields = ['id', 'name', 'weekday', 'opens', 'closes']
+
+    def validate(self, attrs):
+        opens = attrs.get('opens', getattr(self.instance, 'opens', None))
+        closes = attrs.get('closes', getattr(self.instance, 'closes', None))
+        if opens is not None and closes is not None and closes <= opens:
+            raise serializers.ValidationError({'closes': 'Must be after opens.'})
+        return attrs
+
+
+#A booking is made by reservations.book, which picks the table (unless one is asked for) and rejects a double booking.
+#"duration" is in minutes, by default RESERVATION_DURATION_MINUTES
+class BookingSerializer(serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    table = serializers.PrimaryKeyRelatedField(queryset=Table.objects.all(), required=False)
+    party_size = serializers.IntegerField(min_value=1, max_value=100)
+    duration = serializers.IntegerField(write_only=True, required=False, min_value=1)
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'user', 'table', 'party_size', 'start', 'end', 'duration', 'created']
+        read_only_fields = ['end', 'created']
+
+    def create(self, validated_data):
+        duration = validated_data.get('duration')
+        return reservations.book(
+            self.context['request'].user,
+            validated_data['party_size'],
+            validated_data['start'],
+            duration=datetime.timedelta(minutes=duration) if duration else None,
+            table=validated_data.get('table'),
+        )
@@ -0,0 +1,83 @@
+#Signal receivers of the app, they are connected when the app is loaded (see apps.py)
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import Cart, Category, MenuItem, Order, Seating, Table
+from . import cart
+from .events import order_event, publish
+from .menu_cache import bump_menu_version
+from . import menu_search
+from .roles import invalidate_roles
+from .authentication import invalidate_tokens
+from .reservations import invalidate_floor_plan
+
+
+#Any save or delete of a menu item or a category (API views, admin, shell) makes the cached menu pages outdated..
+#..and is applied to the search index of the process. The version is bumped once the change is committed: bumped earlier,..
+#..a concurrent GET could still read the old menu and cache it under the new version
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def menu_changed(sender, instance, signal, **kwargs):
+    transaction.on_commit(bump_menu_version)
+    menu_search.menu_changed(instance, deleted=signal is post_delete)
+
+
+#Cart rows written outside cart.py (the rows deleted with their menu item, admin edits) refresh the stored total of the..
+#..user's cart once the change is committed
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    if cart.keeps_total():
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: cart.refresh_cart_total(user_id))
+
+
+#Adding or removing users to/from groups (GroupViewSet, DeliveryCrewViewSet, admin) makes their cached roles outdated.
+#The signal is sent from both sides of the relation: user.groups.add(...) and group.user_set.add(...)
+@receiver(m2m_changed, sender=User.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_roles(instance.pk)
+    elif pk_set:
+        invalidate_roles(*pk_set)
+    else:
+        invalidate_roles(*instance.user_set.values_list('pk', flat=True))
+
+
+#Every save of an order (checkout, SingleOrderView, admin) is pushed to the clients of /api/orders/events
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    publish([order_event(instance.pk, instance.user_id, instance.status, instance.delivery_crew_id)])
+
+
+#A deleted token (logout through djoser's auth/token/logout, admin, deleting the user) must stop working right away
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens(instance.key)
+
+
+#The cached token holds a copy of the user, any change of the user (deactivation, superuser status, username..) drops it.
+#Only the last_login update done at every login is ignored, the cached copy doesn't need it
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    invalidate_tokens(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+#The tables and opening hours are cached for the availability search, any change of them drops the cached copy
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+@receiver(post_save, sender=Seating)
+@receiver(post_delete, sender=Seating)
+def floor_plan_changed(sender, **kwargs):
+    invalidate_floor_plan()
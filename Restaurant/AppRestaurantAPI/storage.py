@@ -0,0 +1,36 @@
+#Storage for the static files used by collectstatic: it adds the content hash to every file name (ManifestStaticFilesStorage,..
+#..e.g. style.css -> style.4f2a9c1b7e3d.css, so a changed file gets a new url) and writes .gz and .br (when brotli is..
+#..installed) versions of the text files next to them, so neither the web server nor django compresses them per request
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from .landing import COMPRESSIBLE, ENCODINGS, compress
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    #Some vendor files point to source maps which are not shipped (e.g. swiper-bundle.min.js.map), so the..
+    #.."sourceMappingURL" comments are left as they are instead of failing collectstatic
+    patterns = tuple(
+        (extension, tuple(
+            pattern for pattern in extension_patterns
+            if 'sourceMappingURL' not in (pattern[0] if isinstance(pattern, tuple) else pattern)
+        ))
+        for extension, extension_patterns in ManifestStaticFilesStorage.patterns
+    )
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and isinstance(hashed_name, str) and self.is_compressible(hashed_name):
+                self.write_compressed(hashed_name)
+            yield name, hashed_name, processed
+
+    def is_compressible(self, name):
+        return any(name.endswith(extension) for extension in COMPRESSIBLE)
+
+    def write_compressed(self, name):
+        with self.open(name) as f:
+            variants = compress(f.read())
+        for encoding, suffix in ENCODINGS:
+            if encoding in variants and len(variants[encoding]) < len(variants['identity']):
+                with open(self.path(name + suffix), 'wb') as f:
+                    f.write(variants[encoding])
@@ -1,3 +1,1608 @@
-from django.test import TestCase
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.http import Http404
+from unittest import skipUnless
 
 # Create your tests here.
+
+import asyncio
+import gzip
+import io
+import json
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import Group, User
+from django.core import signals as request_signals
+from django.core.management import CommandError, call_command
+from django.db import models
+from django.db.models.query import QuerySet
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from .models import Category, MenuItem, Cart, Order, OrderItem, CheckoutJob, DailySales, ItemSales
+from .models import Table, Seating, Booking, BookingSlot, ArchivedOrder, ArchivedOrderItem, IdempotencyKey, OrderEvent
+from .checkout import process_next_job, run_worker
+from . import checkout
+from .cart import refresh_cart_total
+from .roles import get_roles
+from . import async_views
+from .landing import get_landing_page
+from .views import static_asset, OrderView
+from .dispatch import assign, dispatch_orders
+from .events import broker
+from . import events
+from .analytics import rebuild_all
+from .profiling import Registry, registry
+from .bench import find_regressions
+from . import reservations
+from . import menu_search
+from .menu_cache import bump_menu_version, get_menu_state, menu_page_key
+from .fieldsets import compact_data
+from .archive import archive_orders
+from .serializers import MenuItemSerializer, OrderSerializer
+from . import idempotency
+from unittest import mock
+from django.db import IntegrityError
+from django.utils import timezone
+import datetime
+from Restaurant.asgi import application
+
+
+#Base class with a small menu and a customer that the other tests build on
+class RestaurantTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer', password='pass')
+        cls.category = Category.objects.create(title='Mains', slug='mains')
+        cls.menuitems = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Dish {i}', price=Decimal('3.50'), featured=False, category=cls.category)
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def fill_cart(self, user, size, quantity=2):
+        Cart.objects.bulk_create([
+            Cart(user=user, menuitem=menuitem, quantity=quantity, unit_price=menuitem.price, price=menuitem.price * quantity)
+            for menuitem in self.menuitems[:size]
+        ])
+        refresh_cart_total(user)
+
+
+class CheckoutTests(RestaurantTestCase):
+    def checkout(self):
+        self.client.force_authenticate(self.customer)
+        return self.client.post('/api/orders', {'date': '2024-01-01'}, format='json')
+
+    def test_checkout_moves_cart_into_order(self):
+        self.fill_cart(self.customer, 3)
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total, Decimal('21.00'))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_empty_cart(self):
+        response = self.checkout()
+        self.assertEqual(response.data, {"message:": "no item in cart"})
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_query_count_does_not_depend_on_cart_size(self):
+        #clearing the cart reads the rows before deleting them, for the post_delete receiver of Cart (signals.py)
+        self.fill_cart(self.customer, 1)
+        with self.assertNumQueries(16):
+            self.checkout()
+        self.fill_cart(self.customer, 20)
+        with self.assertNumQueries(16):
+            self.checkout()
+
+
+class OrderTotalTests(RestaurantTestCase):
+    def test_catering_order_total(self):
+        Cart.objects.bulk_create([
+            Cart(user=self.customer, menuitem=menuitem, quantity=1000, unit_price=Decimal('99.99'), price=Decimal('99990.00'))
+            for menuitem in self.menuitems[:3]
+        ])
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders', {'date': '2024-01-01', 'total': '1.00'}, format='json')
+        self.assertEqual(response.data['total'], '299970.00')
+        self.assertEqual(Order.objects.get().total, Decimal('299970.00'))
+
+    def test_verify_and_repair_drifted_totals(self):
+        orders = Order.objects.bulk_create([Order(user=self.customer, date='2024-01-01', total=Decimal('7.00')) for _ in range(5)])
+        OrderItem.objects.bulk_create([OrderItem(order=order, menuitem=self.menuitems[0], quantity=2, price=Decimal('7.00')) for order in orders])
+        #a total changed by hand and an item changed after the checkout
+        Order.objects.filter(pk=orders[1].pk).update(total=Decimal('3.00'))
+        OrderItem.objects.filter(order=orders[3]).update(price=Decimal('8.00'))
+        rebuild_all()
+
+        with self.assertRaises(CommandError):
+            call_command('verify_order_totals', chunk=2, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('verify_order_totals', chunk=2, repair=True, stdout=out)
+        self.assertIn('checked 5 orders: 2 drifted, 2 repaired', out.getvalue())
+        self.assertEqual([order.total for order in Order.objects.order_by('id')], [Decimal('7.00')] * 3 + [Decimal('8.00'), Decimal('7.00')])
+        self.assertEqual(DailySales.objects.get().revenue, Decimal('36.00'))
+        call_command('verify_order_totals', stdout=io.StringIO())
+
+
+class MenuCacheTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.manager = User.objects.create_superuser(username='boss', password='pass')
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get('/api/menu-items?page=2')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/menu-items?page=2')
+        self.assertEqual(first.data, second.data)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get('/api/menu-items?page=1')
+        with self.assertNumQueries(2):
+            self.client.get('/api/menu-items?page=2')
+
+    def test_update_bumps_version(self):
+        menuitem = self.menuitems[0]
+        self.client.get('/api/menu-items?ordering=price')
+        self.client.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/menu-items/{menuitem.pk}', {'price': '1.00'}, format='json')
+        self.client.force_authenticate(None)
+
+        response = self.client.get('/api/menu-items?ordering=price')
+        self.assertEqual(response.data['results'][0]['price'], '1.00')
+
+    def test_conditional_get(self):
+        response = self.client.get('/api/categories')
+        self.assertIn('Last-Modified', response)
+        not_modified = self.client.get('/api/categories', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        #the version is bumped once the change is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title='Desserts', slug='desserts')
+            self.assertEqual(self.client.get('/api/categories', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        changed = self.client.get('/api/categories', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['count'], 2)
+
+
+class MenuSearchTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pizzas = Category.objects.create(title='Pizzas', slug='pizzas')
+        cls.margherita = MenuItem.objects.create(title='Margherita Pizza', price=Decimal('9.00'), featured=False, category=cls.pizzas)
+        cls.calzone = MenuItem.objects.create(title='Calzone', price=Decimal('11.00'), featured=False, category=cls.pizzas)
+        cls.brulee = MenuItem.objects.create(title='Crème Brûlée', price=Decimal('6.00'), featured=True, category=cls.category)
+
+    def setUp(self):
+        super().setUp()
+        menu_search.index.clear()
+
+    def titles(self, query, limit=10):
+        return [item['title'] for item in menu_search.search(query, limit)]
+
+    def test_prefixes_typos_and_ranking(self):
+        #a match in the title ranks above a match in the category only
+        self.assertEqual(self.titles('piz'), ['Margherita Pizza', 'Calzone'])
+        self.assertEqual(self.titles('marg pi'), ['Margherita Pizza'])
+        self.assertEqual(self.titles('margerita'), ['Margherita Pizza'])
+        self.assertEqual(self.titles('creme brul'), ['Crème Brûlée'])
+        self.assertEqual(self.titles('dish 1', limit=3), ['Dish 1', 'Dish 10', 'Dish 11'])
+        self.assertEqual(self.titles('pizza sushi'), [])
+        self.assertEqual(self.titles('  '), [])
+
+    def test_changes_are_applied_to_the_index(self):
+        self.titles('piz')
+        with self.captureOnCommitCallbacks(execute=True):
+            diavola = MenuItem.objects.create(title='Diavola Pizza', price=Decimal('10.00'), featured=True, category=self.pizzas)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.calzone.delete()
+        #the index was patched, the search doesn't go to the database
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('piz'), ['Diavola Pizza', 'Margherita Pizza'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizzas.title = 'Pies'
+            self.pizzas.save()
+        self.assertEqual(self.titles('pies'), ['Diavola Pizza', 'Margherita Pizza'])
+        self.assertEqual(diavola.pk, menu_search.search('diav')[0]['id'])
+
+    def test_bulk_import_rebuilds_the_index(self):
+        self.titles('piz')
+        MenuItem.objects.bulk_create([MenuItem(title='Quattro Formaggi Pizza', price=Decimal('12.00'), featured=False, category=self.pizzas)])
+        bump_menu_version()
+        self.assertIn('Quattro Formaggi Pizza', self.titles('pizza'))
+
+    def test_search_endpoint(self):
+        response = self.client.get('/api/menu-items/search?q=calz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{
+            'id': self.calzone.pk, 'title': 'Calzone', 'price': '11.00', 'featured': False,
+            'category': self.pizzas.pk, 'category_title': 'Pizzas',
+        }])
+        self.assertEqual(self.client.get('/api/menu-items/search?q=calz&limit=x').status_code, 400)
+
+
+class MenuFilterTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pizzas = Category.objects.create(title='Pizzas', slug='pizzas')
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f'Pizza {i}', price=Decimal(8 + i % 4), featured=i % 2 == 0, inventory=i % 3, category=cls.pizzas)
+            for i in range(12)
+        ])
+
+    def titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['title'] for item in response.data['results']]
+
+    def test_filters(self):
+        #featured pizzas, cheapest first, the title breaks the ties of the price
+        self.assertEqual(self.titles('/api/menu-items?category=pizzas&featured=true&ordering=price'),
+                         ['Pizza 0', 'Pizza 4', 'Pizza 8', 'Pizza 10'])
+        self.assertEqual(self.titles(f'/api/menu-items?category={self.pizzas.pk}&min_price=10&max_price=10.50&ordering=-price'),
+                         ['Pizza 6', 'Pizza 2', 'Pizza 10'])
+        response = self.client.get('/api/menu-items?category=pizzas&in_stock=false&ordering=title&page_size=10')
+        self.assertEqual([item['inventory'] for item in response.data['results']], [0, 0, 0, 0])
+        for url in ('/api/menu-items?featured=maybe', '/api/menu-items?min_price=cheap', '/api/menu-items?ordering=inventory'):
+            self.assertEqual(self.client.get(url).status_code, 400 if 'ordering' not in url else 200)
+
+    def test_slug_shared_by_categories(self):
+        #the slug is only unique with the title, "?category=pizzas" lists the items of both categories
+        other = Category.objects.create(title='Pizzas (lunch)', slug='pizzas')
+        MenuItem.objects.create(title='Lunch pizza', price=Decimal('6.00'), featured=True, category=other)
+        self.assertEqual(self.titles('/api/menu-items?category=pizzas&featured=true&ordering=price&page_size=10'),
+                         ['Lunch pizza', 'Pizza 0', 'Pizza 4', 'Pizza 8', 'Pizza 10', 'Pizza 2', 'Pizza 6'])
+        self.assertEqual(self.titles('/api/menu-items?category=calzones'), [])
+
+    def test_storefront_lists_are_index_range_scans(self):
+        for url, index in (('/api/menu-items?category=pizzas&featured=true&ordering=price', 'menuitem_cat_feat_price_idx'),
+                           (f'/api/menu-items?category={self.pizzas.pk}&ordering=-price', 'menuitem_cat_price_idx'),
+                           ('/api/menu-items?featured=true&ordering=price', 'menuitem_feat_price_idx')):
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            page = ctx.captured_queries[-1]['sql']
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + page)
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class RoleTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.managers = Group.objects.create(name='Manager')
+        cls.crew = Group.objects.create(name='Delivery Crew')
+        cls.manager = User.objects.create_user(username='manager')
+        cls.manager.groups.add(cls.managers)
+        cls.courier = User.objects.create_user(username='courier')
+        cls.courier.groups.add(cls.crew)
+        cls.order = Order.objects.create(user=cls.customer, date='2024-01-01')
+
+    def test_order_list_reads_groups_once(self):
+        for user in (self.customer, self.manager, self.courier):
+            cache.clear()
+            self.client.force_authenticate(user)
+            #1 query for the groups, 1 count, 1 page of orders and 1 for the items of each listed order (the courier has no orders)
+            expected = 2 if user == self.courier else 4
+            with self.assertNumQueries(expected):
+                self.client.get('/api/orders')
+            #the groups are now cached between requests
+            with self.assertNumQueries(expected - 1):
+                self.client.get('/api/orders')
+
+    def test_single_order_update(self):
+        self.client.force_authenticate(self.customer)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.patch(f'/api/orders/{self.order.pk}', {'status': True}).data, 'Not Ok')
+
+        self.client.force_authenticate(self.manager)
+        #groups, order, delivery crew validation skipped (not sent), update, items of the order
+        with self.assertNumQueries(4):
+            response = self.client.patch(f'/api/orders/{self.order.pk}', {'status': True})
+        self.assertTrue(response.data['status'])
+
+    def test_manager_permission_for_menu_writes(self):
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(2):
+            self.client.delete('/api/menu-items/999999')
+        with self.assertNumQueries(1):
+            self.client.delete('/api/menu-items/999999')
+
+    def test_delivery_crew_changes_invalidate_cache(self):
+        self.client.force_authenticate(self.customer)
+        self.client.get('/api/orders')
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(5):
+            self.client.post('/api/groups/delivery-crew/users', {'username': 'customer'})
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/orders')
+        self.assertEqual(response.data['count'], 0)
+
+        self.client.force_authenticate(self.manager)
+        self.client.delete('/api/groups/delivery-crew/users', {'username': 'customer'})
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/orders').data['count'], 1)
+
+    def test_manager_group_changes_invalidate_cache(self):
+        admin = User.objects.create_superuser(username='admin')
+        self.client.force_authenticate(admin)
+        self.client.post('/api/groups/manager/users', {'username': 'courier'})
+        request = type('Request', (), {'user': self.courier})()
+        self.assertEqual(get_roles(request), {'Manager', 'Delivery Crew'})
+
+
+class AnalyticsTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.drinks = Category.objects.create(title='Drinks', slug='drinks')
+        MenuItem.objects.filter(pk=cls.menuitems[1].pk).update(category=cls.drinks)
+        cls.manager = User.objects.create_user(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+
+    def checkout(self, date, size):
+        self.fill_cart(self.customer, size)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.post('/api/orders', {'date': date}, format='json').status_code, 201)
+
+    def report(self, name, query=''):
+        self.client.force_authenticate(self.manager)
+        return self.client.get(f'/api/analytics/{name}{query}')
+
+    def rollups(self):
+        return (
+            list(DailySales.objects.order_by('date').values_list('date', 'orders', 'items', 'revenue')),
+            list(ItemSales.objects.order_by('date', 'menuitem').values_list('date', 'menuitem', 'category', 'quantity', 'revenue')),
+        )
+
+    def test_checkout_updates_the_rollups(self):
+        self.checkout('2024-01-01', 2)
+        self.checkout('2024-01-01', 3)
+        self.checkout('2024-01-02', 1)
+
+        daily = self.report('daily').data['results']
+        self.assertEqual([(str(row['date']), row['orders'], row['items'], row['revenue']) for row in daily],
+                         [('2024-01-01', 2, 10, '35.00'), ('2024-01-02', 1, 2, '7.00')])
+        self.assertEqual(self.report('daily', '?from=2024-01-02').data['results'][0]['orders'], 1)
+
+        categories = self.report('categories').data['results']
+        self.assertEqual([(row['title'], row['quantity'], row['revenue']) for row in categories],
+                         [('Mains', 8, '28.00'), ('Drinks', 4, '14.00')])
+
+        top = self.report('top-items', '?limit=1&by=quantity').data['results']
+        self.assertEqual([(row['menuitem'], row['quantity'], row['revenue']) for row in top],
+                         [(self.menuitems[0].pk, 6, '21.00')])
+        self.assertEqual(len(self.report('menu-items', '?to=2024-01-01').data['results']), 3)
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        self.checkout('2024-01-01', 2)
+        self.checkout('2024-03-05', 3)
+        incremental = self.rollups()
+        ItemSales.objects.all().delete()
+        DailySales.objects.create(date='2023-01-01', orders=5)
+
+        self.assertEqual(rebuild_all(days=31), 3)
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_reports_are_for_managers(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/analytics/daily').status_code, 403)
+        self.assertEqual(self.report('weekly').status_code, 404)
+        self.assertEqual(self.report('daily', '?from=yesterday').status_code, 400)
+        self.assertEqual(self.report('top-items', '?by=price').status_code, 400)
+
+
+@override_settings(PROFILING=True)
+class ProfilingTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.manager = User.objects.create_user(username='manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.client.force_authenticate(self.manager)
+
+    def test_requests_are_recorded_per_endpoint(self):
+        for pk in (self.menuitems[0].pk, self.menuitems[1].pk):
+            self.client.get(f'/api/menu-items/{pk}')
+        self.client.get('/api/nothing-here')
+
+        text = self.client.get('/api/_metrics').content.decode()
+        self.assertIn('restaurant_request_duration_seconds_count{method="GET",endpoint="api/menu-items/<int:pk>"} 2', text)
+        self.assertIn('restaurant_request_queries_bucket{method="GET",endpoint="api/menu-items/<int:pk>",le="1"} 2', text)
+        self.assertIn('endpoint="<unmatched>"', text)
+
+        report = self.client.get('/api/_metrics?format=json').json()
+        row = next(row for row in report['endpoints'] if row['endpoint'] == 'api/menu-items/<int:pk>')
+        self.assertEqual((row['requests'], row['mean_queries']), (2, 1))
+        self.assertGreater(row['mean_render_ms'], 0)
+
+    async def test_queries_of_asgi_requests_are_recorded(self):
+        response = await AsyncClient().get(f'/api/menu-items/{self.menuitems[0].pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(registry.histograms[('queries', 'GET', 'api/menu-items/<int:pk>')].sum, 1)
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ('BREW', 'PROPFIND'):
+            self.client.generic(method, '/api/menu-items')
+        self.assertEqual({key[1] for key in registry.histograms}, {'OTHER'})
+
+    def test_repeated_statements_are_counted(self):
+        registry = Registry()
+        registry.record('GET', 'api/orders', {'latency': 0.2}, ['SELECT a', 'SELECT b', 'SELECT b', 'SELECT b'])
+        registry.record('GET', 'api/orders', {'latency': 0.1}, ['SELECT b', 'SELECT b'])
+        self.assertEqual(registry.duplicates, {('GET', 'api/orders', 'SELECT b'): 3})
+
+    def test_metrics_are_for_managers(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+
+
+class SeedAndBenchTests(TestCase):
+    def test_seed_data(self):
+        call_command('seed_data', categories=3, menu_items=20, users=30, couriers=4, managers=1, orders=250,
+                     batch_size=100, stdout=io.StringIO())
+        self.assertEqual(MenuItem.objects.count(), 20)
+        self.assertEqual(User.objects.filter(groups__name='Delivery Crew').count(), 4)
+        self.assertEqual(Order.objects.count(), 250)
+        #the totals of the orders match their items, and the sales rollups were built from them
+        order = Order.objects.order_by('?').first()
+        self.assertEqual(order.total, sum(item.price for item in order.order.all()))
+        self.assertEqual(DailySales.objects.aggregate(n=models.Sum('orders'))['n'], 250)
+        #a new order gets an id after the seeded ones
+        self.assertEqual(Order.objects.create(user=order.user, date=order.date).pk, Order.objects.count())
+
+    def test_bench_api_records_and_compares(self):
+        call_command('seed_data', categories=2, menu_items=10, users=10, couriers=2, managers=1, orders=60, stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as directory, override_settings(ALLOWED_HOSTS=['localhost']):
+            baseline = Path(directory) / 'baseline.json'
+            call_command('bench_api', requests=3, warmup=1, output=str(baseline), stdout=io.StringIO())
+            results = json.loads(baseline.read_text())['results']
+            self.assertEqual(results['checkout']['queries'], 16)
+            self.assertEqual(len(results), 7)
+
+            data = json.loads(baseline.read_text())
+            data['results']['cart-list']['queries'] = 1
+            baseline.write_text(json.dumps(data))
+            stderr = io.StringIO()
+            with self.assertRaisesMessage(CommandError, 'cart-list: 1 -> 3 queries'):
+                call_command('bench_api', requests=3, warmup=0, baseline=str(baseline), only='cart-list',
+                             stdout=io.StringIO(), stderr=stderr)
+            #the same seeded data, whatever the scenarios and request counts
+            self.assertNotIn('different data', stderr.getvalue())
+
+    def test_find_regressions(self):
+        base = {'menu': {'p95_ms': 10.0, 'throughput_rps': 200.0, 'queries': 2}}
+        self.assertEqual(find_regressions(base, {'menu': {'p95_ms': 11.5, 'throughput_rps': 180.0, 'queries': 2}}, 0.2), [])
+        self.assertEqual(len(find_regressions(base, {'menu': {'p95_ms': 20.0, 'throughput_rps': 90.0, 'queries': 3}}, 0.2)), 3)
+        #sub-millisecond changes are noise
+        self.assertEqual(find_regressions({'menu': {'p95_ms': 0.2, 'throughput_rps': 5000.0, 'queries': 0}},
+                                          {'menu': {'p95_ms': 0.5, 'throughput_rps': 2000.0, 'queries': 0}}, 0.2), [])
+
+
+class ReservationTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user(username='other')
+        cls.small = Table.objects.create(number=1, seats=2)
+        cls.big = Table.objects.create(number=2, seats=6)
+        Table.objects.create(number=3, seats=8, active=False)
+        cls.day = timezone.localdate() + datetime.timedelta(days=7)
+        Seating.objects.create(name='Dinner', weekday=cls.day.weekday(), opens='18:00', closes='22:00')
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.datetime.combine(self.day, datetime.time(hour, minute)))
+
+    def starts(self, party, **kwargs):
+        return [(slot['start'].hour, slot['start'].minute) for slot in reservations.find_availability(party, self.day, **kwargs)]
+
+    def test_availability_follows_the_bookings(self):
+        #90 minute bookings between 18:00 and 22:00 can start from 18:00 to 20:30
+        self.assertEqual(len(self.starts(2)), 11)
+        reservations.book(self.customer, 2, self.at(19))
+        reservations.book(self.customer, 2, self.at(19))
+        #both tables are taken from 19:00 to 20:30, so nothing can start between 17:45 and 20:15
+        self.assertEqual(self.starts(2), [(20, 30)])
+        #the window and the party size narrow the search, the inactive table is never offered
+        self.assertEqual(self.starts(7), [])
+        #the tables and opening hours come from the cache, only the slots are read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.starts(4, from_time=datetime.time(20), to_time=datetime.time(21)), [(20, 30)])
+        #a new table is offered right away
+        Table.objects.create(number=4, seats=4)
+        self.assertEqual(len(self.starts(4)), 11)
+
+    def test_smallest_fitting_table_is_booked(self):
+        self.assertEqual(reservations.book(self.customer, 2, self.at(18)).table, self.small)
+        self.assertEqual(reservations.book(self.customer, 2, self.at(18, 30)).table, self.big)
+        with self.assertRaisesMessage(Exception, 'No table is free'):
+            reservations.book(self.other, 1, self.at(19))
+        self.assertEqual(BookingSlot.objects.count(), 12)
+
+    def test_double_booking_is_rejected_by_the_slot_index(self):
+        booking = reservations.book(self.customer, 2, self.at(18), table=self.small)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BookingSlot.objects.create(booking=booking, table=self.small, slot=reservations.slot_number(self.at(19)))
+
+        #a concurrent request that read the slots before the first booking was saved falls back to the next table
+        with mock.patch.object(reservations, 'taken_slots', return_value=set()):
+            self.assertEqual(reservations.book(self.other, 2, self.at(18, 30)).table, self.big)
+            with self.assertRaisesMessage(Exception, 'No table is free'):
+                reservations.book(self.other, 2, self.at(18, 15), table=self.small)
+
+    def test_times_must_fit_the_grid_and_the_opening_hours(self):
+        for start, duration in ((self.at(18, 10), None), (self.at(21), None), (self.at(12), None),
+                                (self.at(18), datetime.timedelta(minutes=20)), (timezone.now() - datetime.timedelta(days=1), None)):
+            with self.assertRaises(Exception):
+                reservations.book(self.customer, 2, start, duration)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_booking_endpoints(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/reservations', {'party_size': 3, 'start': self.at(18).isoformat(), 'duration': 120})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['table'], response.data['end']), (self.big.pk, self.at(20).isoformat().replace('+00:00', 'Z')))
+        self.assertEqual(self.client.post('/api/reservations', {'party_size': 3, 'start': self.at(19).isoformat()}).status_code, 400)
+
+        response = self.client.get(f'/api/reservations/availability?party=3&date={self.day}&from=20:00')
+        self.assertEqual([slot['tables'][0]['number'] for slot in response.data['available']], [2, 2, 2])
+        self.assertEqual(self.client.get('/api/reservations/availability?party=3').status_code, 400)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get('/api/reservations').data['count'], 0)
+        booking = Booking.objects.get()
+        self.assertEqual(self.client.delete(f'/api/reservations/{booking.pk}').status_code, 404)
+        self.assertEqual(self.client.post('/api/tables', {'number': 9, 'seats': 4}).status_code, 403)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.delete(f'/api/reservations/{booking.pk}').status_code, 204)
+        self.assertFalse(BookingSlot.objects.exists())
+
+
+class TokenCacheTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(user=cls.customer)
+
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_is_cached(self):
+        #token + user, groups and the count of the orders (the customer has none)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get('/api/orders').status_code, 200)
+        #the token and the groups come from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/orders').status_code, 200)
+
+    def test_logout_drops_the_cached_token(self):
+        self.client.get('/api/orders')
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/orders').status_code, 401)
+
+    def test_deactivation_drops_the_cached_token(self):
+        self.client.get('/api/orders')
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/orders').status_code, 401)
+
+    def test_login_keeps_the_cached_token(self):
+        self.client.get('/api/orders')
+        self.customer.save(update_fields=['last_login'])
+        with self.assertNumQueries(1):
+            self.client.get('/api/orders')
+
+    async def test_async_views_share_the_cache(self):
+        factory = AsyncRequestFactory(SERVER_NAME='testserver')
+        request = factory.get('/api/orders', headers={'Authorization': f'Token {self.token.key}'})
+        user, _ = await async_views.authenticate(request)
+        self.assertEqual(user, self.customer)
+        self.assertIsNotNone(await cache.aget(f'token:{self.token.key}'))
+
+
+class OrderQueryCountTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username='admin')
+
+    def create_orders(self, count, items_per_order=3):
+        orders = Order.objects.bulk_create([Order(user=self.customer, date='2024-01-01') for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=1, price=menuitem.price)
+            for order in orders
+            for menuitem in self.menuitems[:items_per_order]
+        ])
+        return orders
+
+    def list_queries(self, user, count):
+        Order.objects.all().delete()
+        self.create_orders(count)
+        cache.clear()
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders')
+        self.assertEqual(len(response.data['results']), min(count, 4))
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_does_not_grow_with_orders(self):
+        #count, page of orders, items of the page (+ groups for the customer)
+        self.assertEqual(self.list_queries(self.admin, 1), 3)
+        self.assertEqual(self.list_queries(self.admin, 4), 3)
+        self.assertEqual(self.list_queries(self.customer, 1), 4)
+        self.assertEqual(self.list_queries(self.customer, 4), 4)
+
+    def test_every_order_gets_its_items(self):
+        self.create_orders(4, items_per_order=2)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/orders')
+        self.assertEqual([len(order['orderitem']) for order in response.data['results']], [2, 2, 2, 2])
+
+    def test_single_order(self):
+        order = self.create_orders(1)[0]
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/orders/{order.pk}')
+        self.assertEqual(len(response.data['orderitem']), 3)
+
+
+class KeysetPaginationTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username='admin')
+        #three orders a day, so the pages have to break ties on the id
+        Order.objects.bulk_create([
+            Order(user=cls.customer, date=f'2024-01-{1 + i // 3:02d}') for i in range(10)
+        ])
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_orders_by_cursor(self):
+        self.client.force_authenticate(self.admin)
+        expected = list(Order.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/orders?cursor='), expected)
+        self.assertEqual(self.walk('/api/orders?cursor=&page_size=3'), expected)
+
+    def test_menu_items_by_cursor(self):
+        MenuItem.objects.filter(pk=self.menuitems[5].pk).update(price='1.00')
+        expected = list(MenuItem.objects.order_by('price', 'title').values_list('id', flat=True))
+        ids = self.walk('/api/menu-items?cursor=&page_size=7')
+        self.assertEqual(ids, expected)
+        self.assertEqual(ids[0], self.menuitems[5].pk)
+
+    def test_page_size_is_capped(self):
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f'Extra {i}', price='1.00', featured=False, category=self.category) for i in range(100)
+        ])
+        response = self.client.get('/api/menu-items?page_size=1000')
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/orders?cursor=nonsense').status_code, 404)
+
+    def test_cursor_with_ordering_is_rejected(self):
+        #the cursor pages are in the keyset order, a different ?ordering= would be dropped silently
+        response = self.client.get('/api/menu-items?cursor=&ordering=-price')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+        self.assertEqual(self.client.get('/api/menu-items?cursor=&ordering=').status_code, 200)
+
+    def test_page_number_mode_is_unchanged(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/orders?page=2')
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class SparseFieldsetTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username='admin')
+        cls.courier = User.objects.create_user(username='courier', email='courier@example.com')
+        cls.orders = Order.objects.bulk_create([
+            Order(user=cls.customer, date=f'2024-01-0{1 + i}', total=Decimal('7.5') * i, delivery_crew=cls.courier if i % 2 else None)
+            for i in range(4)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=2, price=Decimal('7.00'))
+            for order in cls.orders for menuitem in cls.menuitems[:2]
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def test_compact_data_is_the_serializer_data(self):
+        orders = list(Order.objects.prefetch_related('order').order_by('id'))
+        self.assertEqual(compact_data(OrderSerializer, orders), OrderSerializer(orders, many=True).data)
+        self.assertEqual(compact_data(OrderSerializer, orders, ('id', 'total'), ('delivery_crew',)),
+                         OrderSerializer(orders, many=True, fields=('id', 'total'), expand=('delivery_crew',)).data)
+        self.assertEqual(compact_data(MenuItemSerializer, self.menuitems), MenuItemSerializer(self.menuitems, many=True).data)
+
+    def test_fields_limit_the_columns_and_the_payload(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders?fields=id,status')
+        self.assertEqual(response.data['results'][0], {'id': self.orders[3].pk, 'status': False})
+        page = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('total', page)
+        #no prefetch of the items: the count and the page
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+        #the delivery crew is joined, the keyset page is one query
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders?fields=id,total&expand=delivery_crew&cursor=&page_size=2')
+        self.assertEqual(response.data['results'], [
+            {'id': self.orders[3].pk, 'total': '22.50', 'delivery_crew': {'id': self.courier.pk, 'username': 'courier', 'email': 'courier@example.com'}},
+            {'id': self.orders[2].pk, 'total': '15.00', 'delivery_crew': None},
+        ])
+
+        response = self.client.get('/api/menu-items?fields=title&expand=category&page_size=1')
+        self.assertEqual(response.data['results'], [{'title': 'Dish 0', 'category': {'id': self.category.pk, 'title': 'Mains', 'slug': 'mains'}}])
+
+    def test_unknown_fields(self):
+        self.assertEqual(self.client.get('/api/orders?fields=id,secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/menu-items?expand=title').status_code, 400)
+
+
+#Runs EXPLAIN QUERY PLAN on every query an endpoint sends to the hot tables and fails if one of them reads a whole table
+@skipUnless(connection.vendor == 'sqlite', 'the plans are checked with SQLite EXPLAIN QUERY PLAN')
+class QueryPlanTests(RestaurantTestCase):
+    hot_tables = ['AppRestaurantAPI_order', 'AppRestaurantAPI_orderitem', 'AppRestaurantAPI_cart']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username='admin')
+        cls.courier = User.objects.create_user(username='courier')
+        cls.courier.groups.add(Group.objects.create(name='Delivery Crew'))
+        orders = Order.objects.bulk_create([
+            Order(user=cls.customer, delivery_crew=cls.courier, date=f'2024-01-{1 + i:02d}') for i in range(10)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=cls.menuitems[0], quantity=1, price='3.50') for order in orders
+        ])
+        cls.order = orders[0]
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        return [
+            step for step in plan
+            for table in self.hot_tables
+            if step == f'SCAN {table}' or step.startswith(f'SCAN {table} ') and ' USING ' not in step
+        ]
+
+    def assertNoFullScans(self, user, url):
+        cache.clear()
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for query in ctx.captured_queries:
+            if query['sql'].startswith('SELECT'):
+                self.assertEqual(self.full_scans(query['sql']), [], query['sql'])
+
+    def test_order_lists(self):
+        for user in (self.customer, self.courier, self.admin):
+            self.assertNoFullScans(user, '/api/orders')
+            self.assertNoFullScans(user, '/api/orders?page=2')
+            self.assertNoFullScans(user, '/api/orders?cursor=')
+
+    def test_single_order(self):
+        self.assertNoFullScans(self.admin, f'/api/orders/{self.order.pk}')
+
+    def test_cart(self):
+        self.fill_cart(self.customer, 3)
+        self.assertNoFullScans(self.customer, '/api/cart/menu-items')
+
+    def test_harness_detects_scans(self):
+        self.assertTrue(self.full_scans('SELECT * FROM "AppRestaurantAPI_order" WHERE "total" > 1'))
+
+
+
+@override_settings(ASYNC_ORDERS=True)
+class AsyncCheckoutTests(RestaurantTestCase):
+    def checkout(self, data=None):
+        self.client.force_authenticate(self.customer)
+        return self.client.post('/api/orders', data or {'date': '2024-01-01'}, format='json')
+
+    def test_checkout_is_queued_and_processed(self):
+        self.fill_cart(self.customer, 3)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(run_worker(), 1)
+        job = self.client.get(response.data['url']).data
+        self.assertEqual(job['status'], CheckoutJob.DONE)
+        order = Order.objects.get(pk=job['order'])
+        self.assertEqual(order.total, Decimal('21.00'))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_retried_post_reuses_the_pending_job(self):
+        self.fill_cart(self.customer, 2)
+        first = self.checkout()
+        second = self.checkout()
+        self.assertEqual(first.data['job'], second.data['job'])
+        run_worker()
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_job_is_processed_once(self):
+        self.fill_cart(self.customer, 2)
+        self.checkout()
+        process_next_job()
+        #a new cart of the same user isn't picked up by the finished job
+        self.fill_cart(self.customer, 2)
+        self.assertIsNone(process_next_job())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_invalid_data_is_rejected_before_queueing(self):
+        self.fill_cart(self.customer, 1)
+        self.assertEqual(self.checkout({'date': 'not a date'}).status_code, 400)
+        self.assertFalse(CheckoutJob.objects.exists())
+
+    def test_job_fails_when_cart_was_emptied(self):
+        self.fill_cart(self.customer, 1)
+        job_id = self.checkout().data['job']
+        Cart.objects.all().delete()
+        job = process_next_job()
+        self.assertEqual(job.pk, job_id)
+        self.assertEqual(job.status, CheckoutJob.FAILED)
+
+    def test_broken_job_fails_after_its_attempts(self):
+        other = User.objects.create_user(username='other')
+        self.fill_cart(self.customer, 1)
+        self.fill_cart(other, 1)
+        bad = self.checkout().data['job']
+        self.client.force_authenticate(other)
+        good = self.client.post('/api/orders', {'date': '2024-01-01'}, format='json').data['job']
+
+        place_order = checkout.place_order
+
+        def place(user, data):
+            if user == self.customer:
+                raise RuntimeError('boom')
+            return place_order(user, data)
+        with mock.patch.object(checkout, 'place_order', side_effect=place), self.assertLogs('AppRestaurantAPI.checkout'):
+            self.assertEqual(run_worker(), 4)
+        job = CheckoutJob.objects.get(pk=bad)
+        self.assertEqual((job.status, job.attempts, job.errors), (CheckoutJob.FAILED, 3, {'detail': 'RuntimeError: boom'}))
+        self.assertEqual(CheckoutJob.objects.get(pk=good).status, CheckoutJob.DONE)
+
+    def test_other_users_cannot_see_the_job(self):
+        self.fill_cart(self.customer, 1)
+        url = self.checkout().data['url']
+        self.client.force_authenticate(User.objects.create_user(username='other'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+
+#The async views are called directly, the urls only route to them when ASYNC_VIEWS is on
+class AsyncViewTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(user=cls.customer)
+        orders = Order.objects.bulk_create([Order(user=cls.customer, date=f'2024-01-{1 + i:02d}') for i in range(6)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=cls.menuitems[0], quantity=1, price='3.50') for order in orders
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory(SERVER_NAME='testserver')
+
+    def sync_data(self, url, **headers):
+        self.client.credentials(**headers)
+        return json.loads(self.client.get(url).content)
+
+    async def test_menu_items_match_the_sync_view(self):
+        expected = await sync_to_async(self.sync_data)('/api/menu-items?page=3')
+        await cache.aclear()
+        response = await async_views.menu_items(self.factory.get('/api/menu-items?page=3'))
+        self.assertEqual(json.loads(response.content), expected)
+        self.assertIn('ETag', response)
+
+        cached = await async_views.menu_items(self.factory.get('/api/menu-items?page=3', headers={'If-None-Match': response['ETag']}))
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_menu_pages_are_cached_apart_from_the_sync_views(self):
+        version, _ = await sync_to_async(get_menu_state)()
+        request = self.factory.get('/api/menu-items')
+        await cache.aset(menu_page_key(request), {'count': 0}, version=version)
+        response = await async_views.menu_items(request)
+        self.assertEqual(json.loads(response.content)['count'], 30)
+
+    async def test_categories(self):
+        response = await async_views.categories(self.factory.get('/api/categories'))
+        self.assertEqual(json.loads(response.content)['results'], [{'id': self.category.id, 'title': 'Mains', 'slug': 'mains'}])
+
+    async def test_orders_match_the_sync_view(self):
+        auth = f'Token {self.token.key}'
+        expected = await sync_to_async(self.sync_data)('/api/orders?page=2', HTTP_AUTHORIZATION=auth)
+        response = await async_views.orders(self.factory.get('/api/orders?page=2', headers={'Authorization': auth}))
+        self.assertEqual(json.loads(response.content), expected)
+
+    async def test_orders_need_authentication(self):
+        response = await async_views.orders(self.factory.get('/api/orders'))
+        self.assertEqual(response.status_code, 401)
+        response = await async_views.orders(self.factory.get('/api/orders', headers={'Authorization': 'Token nope'}))
+        self.assertEqual(json.loads(response.content), {'detail': 'Invalid token.'})
+
+    async def test_session_user_without_auser(self):
+        #before django 5.0 the AuthenticationMiddleware only sets request.user
+        request = self.factory.get('/api/orders')
+        request.user = self.customer
+        self.assertFalse(hasattr(request, 'auser'))
+        self.assertEqual(await async_views.authenticate(request), (self.customer, None))
+        response = await async_views.orders(request)
+        self.assertEqual(json.loads(response.content)['count'], 6)
+
+    async def test_invalid_page(self):
+        response = await async_views.menu_items(self.factory.get('/api/menu-items?page=99'))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_other_requests_go_to_the_sync_view(self):
+        request = self.factory.get('/api/menu-items?cursor=')
+        response = await async_views.menu_items(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', json.loads(response.content))
+
+
+class MenuBulkTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username='admin')
+        Category.objects.create(title='Salads', slug='salads')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def test_csv_import_upserts_by_title(self):
+        body = 'title,price,featured,category\nDish 0,9.99,true,salads\nNew dish,4.00,false,mains\n'
+        #categories, then per batch: existing items, one insert, one update (+ savepoint and release)
+        with self.assertNumQueries(6):
+            response = self.client.post('/api/menu-items/import', body, content_type='text/csv')
+        self.assertEqual(response.data, {'created': 1, 'updated': 1, 'errors': []})
+        updated = MenuItem.objects.get(title='Dish 0')
+        self.assertEqual((updated.price, updated.featured, updated.category.slug), (Decimal('9.99'), True, 'salads'))
+        self.assertTrue(MenuItem.objects.filter(title='New dish', category=self.category).exists())
+
+    def test_json_lines_import_reports_row_errors(self):
+        body = '\n'.join([
+            json.dumps({'title': 'Soup', 'price': '5.00', 'category': 'mains'}),
+            json.dumps({'title': 'Cake', 'price': 'cheap', 'category': 'mains'}),
+            'not json',
+            json.dumps({'title': 'Pie', 'price': '5.00', 'category': 'desserts'}),
+        ])
+        response = self.client.post('/api/menu-items/import', body, content_type='application/jsonl')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        self.assertIn('price', response.data['errors'][0]['errors'])
+
+    def test_invalid_utf8_is_reported(self):
+        body = b'title,price,featured,category\nSoup,5.00,false,mains\n\xff\xfe,1.00,false,mains\nPie,5.00,false,mains\n'
+        response = self.client.post('/api/menu-items/import', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['errors'][0]['row']), (1, 3))
+        self.assertTrue(MenuItem.objects.filter(title='Soup').exists())
+
+    def test_titles_created_by_a_concurrent_import(self):
+        body = 'title,price,featured,category\nDish 0,9.99,false,mains\n'
+        in_bulk = QuerySet.in_bulk
+        #the batch doesn't see "Dish 0" once (it is retried and updates it), then twice (it is reported)
+        for stale_reads, gives_up in ((1, False), (2, True)):
+            reads = []
+
+            def stale(queryset, *args, **kwargs):
+                reads.append(1)
+                return {} if len(reads) <= stale_reads else in_bulk(queryset, *args, **kwargs)
+            with mock.patch.object(QuerySet, 'in_bulk', stale):
+                response = self.client.post('/api/menu-items/import', body, content_type='text/csv')
+            self.assertEqual(response.data['updated'], 0 if gives_up else 1)
+            self.assertEqual(len(response.data['errors']), 1 if gives_up else 0)
+
+    def test_import_invalidates_the_menu_cache(self):
+        self.client.get('/api/menu-items')
+        self.client.post('/api/menu-items/import', 'title,price,featured,category\nAAA,1.00,false,mains\n', content_type='text/csv')
+        self.assertEqual(self.client.get('/api/menu-items').data['count'], 31)
+
+    def test_import_needs_a_manager(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/menu-items/import', '', content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_round_trip(self):
+        response = self.client.get('/api/menu-items/export?type=jsonl')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 30)
+        self.assertEqual(json.loads(lines[0]), {'title': 'Dish 0', 'price': '3.50', 'featured': False, 'category': 'mains', 'inventory': 0})
+
+        MenuItem.objects.filter(pk=self.menuitems[0].pk).update(inventory=12)
+        csv_body = b''.join(self.client.get('/api/menu-items/export').streaming_content).decode()
+        MenuItem.objects.update(inventory=0)
+        response = self.client.post('/api/menu-items/import', csv_body, content_type='text/csv')
+        self.assertEqual(response.data, {'created': 0, 'updated': 30, 'errors': []})
+        self.assertEqual(MenuItem.objects.get(pk=self.menuitems[0].pk).inventory, 12)
+
+    def test_import_without_inventory_keeps_the_stock(self):
+        MenuItem.objects.filter(pk=self.menuitems[0].pk).update(inventory=12)
+        self.client.post('/api/menu-items/import', 'title,price,featured,category\nDish 0,9.99,false,mains\n', content_type='text/csv')
+        self.assertEqual(MenuItem.objects.get(pk=self.menuitems[0].pk).inventory, 12)
+
+    def test_partial_rows_keep_the_featured_flag(self):
+        MenuItem.objects.filter(pk=self.menuitems[0].pk).update(featured=True)
+        body = json.dumps({'title': 'Dish 0', 'price': '9.99', 'category': 'mains'}) + '\n' + \
+            json.dumps({'title': 'Soup', 'price': '5.00', 'category': 'mains'})
+        response = self.client.post('/api/menu-items/import', body, content_type='application/jsonl')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(MenuItem.objects.get(pk=self.menuitems[0].pk).featured, True)
+        self.assertEqual(MenuItem.objects.get(title='Soup').featured, False)
+
+
+
+class CartTests(RestaurantTestCase):
+    def add(self, menuitem, quantity, **extra):
+        self.client.force_authenticate(self.customer)
+        return self.client.post('/api/cart/menu-items', {'menuitem': menuitem.pk, 'quantity': quantity, **extra}, format='json')
+
+    def test_price_comes_from_the_menu(self):
+        response = self.add(self.menuitems[0], 2, unit_price='0.01')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['unit_price'], response.data['price']), ('3.50', '7.00'))
+
+    def test_adding_twice_increments(self):
+        self.add(self.menuitems[0], 2)
+        MenuItem.objects.filter(pk=self.menuitems[0].pk).update(price='4.00')
+        response = self.add(self.menuitems[0], 1)
+        self.assertEqual(response.status_code, 201)
+        row = Cart.objects.get(user=self.customer)
+        self.assertEqual((row.quantity, row.unit_price, row.price), (3, Decimal('4.00'), Decimal('12.00')))
+
+    def test_total_is_maintained(self):
+        self.add(self.menuitems[0], 2)
+        self.add(self.menuitems[1], 1)
+        self.add(self.menuitems[0], 1)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/cart/menu-items')
+        self.assertEqual(response.data['total'], Decimal('14.00'))
+
+        self.client.delete('/api/cart/menu-items')
+        self.assertEqual(self.client.get('/api/cart/menu-items').data['total'], Decimal('0'))
+
+    def test_checkout_total_is_the_sum_of_the_items(self):
+        self.add(self.menuitems[0], 3)
+        response = self.client.post('/api/orders', {'date': '2024-01-01'}, format='json')
+        self.assertEqual(response.data['total'], '10.50')
+        self.assertEqual(self.client.get('/api/cart/menu-items').data['total'], Decimal('0'))
+
+    def test_quantity_must_be_positive(self):
+        self.assertEqual(self.add(self.menuitems[0], 0).status_code, 400)
+
+    def test_quantity_is_capped(self):
+        for _ in range(3):
+            self.assertEqual(self.add(self.menuitems[0], 1000).status_code, 201)
+        row = Cart.objects.get(user=self.customer)
+        self.assertEqual((row.quantity, row.price), (1000, Decimal('3500.00')))
+
+    def test_rows_deleted_with_their_menu_item_refresh_the_total(self):
+        self.add(self.menuitems[0], 2)
+        self.add(self.menuitems[1], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menuitems[0].delete()
+        self.assertEqual(self.client.get('/api/cart/menu-items').data['total'], Decimal('3.50'))
+
+
+class DispatchTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.managers = Group.objects.create(name='Manager')
+        cls.crew = Group.objects.create(name='Delivery Crew')
+        cls.manager = User.objects.create_user(username='manager')
+        cls.manager.groups.add(cls.managers)
+        cls.couriers = [User.objects.create_user(username=f'courier{i}') for i in range(3)]
+        cls.crew.user_set.add(*cls.couriers)
+
+    def orders(self, count, **kwargs):
+        return Order.objects.bulk_create([Order(user=self.customer, date='2024-01-01', **kwargs) for _ in range(count)])
+
+    def load(self, courier):
+        return Order.objects.filter(delivery_crew=courier, status=False).count()
+
+    def test_assign_balances_from_current_load(self):
+        self.assertEqual(assign([1, 2, 3, 4], {7: 2, 8: 0, 9: 1}), {8: [1, 2], 9: [3], 7: [4]})
+
+    def test_dispatch_evens_out_the_load(self):
+        self.orders(4, delivery_crew=self.couriers[0])
+        self.orders(1, delivery_crew=self.couriers[1])
+        #delivered orders don't count to the load and are not dispatched
+        self.orders(5, delivery_crew=self.couriers[2], status=True)
+        self.orders(3, status=True)
+        self.orders(7)
+
+        with self.assertNumQueries(6):
+            summary = dispatch_orders()
+        self.assertEqual(summary['assigned'], 7)
+        self.assertEqual([self.load(courier) for courier in self.couriers], [4, 4, 4])
+        self.assertEqual(Order.objects.filter(delivery_crew__isnull=True).count(), 3)
+        self.assertEqual(dispatch_orders()['assigned'], 0)
+
+    def test_dispatch_limit_takes_oldest_first(self):
+        newer = self.orders(2)
+        older = Order.objects.create(user=self.customer, date='2023-01-01')
+        dispatch_orders(limit=1)
+        self.assertEqual(list(Order.objects.filter(delivery_crew__isnull=False)), [older])
+        self.assertTrue(all(order.delivery_crew_id is None for order in Order.objects.filter(id__in=[o.id for o in newer])))
+
+    def test_inactive_members_get_nothing(self):
+        User.objects.filter(id=self.couriers[0].id).update(is_active=False)
+        self.orders(4)
+        dispatch_orders()
+        self.assertEqual([self.load(courier) for courier in self.couriers], [0, 2, 2])
+
+    def test_dispatch_endpoint_is_for_managers(self):
+        self.orders(3)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.post('/api/orders/dispatch').status_code, 403)
+        self.client.force_authenticate(self.manager)
+        response = self.client.post('/api/orders/dispatch?limit=2')
+        self.assertEqual(response.data['assigned'], 2)
+        self.assertEqual(response.data['couriers'], 3)
+
+
+class ArchiveTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username='admin')
+        cls.other = User.objects.create_user(username='other')
+        old = timezone.localdate() - datetime.timedelta(days=400)
+        cls.old = Order.objects.bulk_create(
+            [Order(user=cls.customer if i < 4 else cls.other, date=old, status=True, total=Decimal('7.00')) for i in range(5)]
+        )
+        #old but not delivered yet, and recent
+        cls.pending = Order.objects.create(user=cls.customer, date=old, total=Decimal('7.00'))
+        cls.recent = Order.objects.create(user=cls.customer, date=timezone.localdate(), status=True, total=Decimal('7.00'))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=menuitem, quantity=1, price=Decimal('3.50'))
+            for order in [*cls.old, cls.pending, cls.recent] for menuitem in cls.menuitems[:2]
+        ])
+
+    def test_old_delivered_orders_are_moved(self):
+        rebuild_all()
+        revenue = DailySales.objects.get(date=self.pending.date).revenue
+        self.assertEqual(archive_orders(batch_size=2), 5)
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.pending.pk, self.recent.pk})
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), {order.pk for order in self.old})
+        self.assertEqual(ArchivedOrderItem.objects.count(), 10)
+        self.assertEqual(OrderItem.objects.count(), 4)
+        self.assertEqual(archive_orders(), 0)
+        #the rollups rebuilt after the archiving still count the archived orders
+        rebuild_all()
+        self.assertEqual(DailySales.objects.get(date=self.pending.date).revenue, revenue)
+        self.assertEqual(ItemSales.objects.get(date=self.pending.date, menuitem=self.menuitems[0]).quantity, 6)
+
+    def test_live_and_archive_endpoints(self):
+        archive_orders()
+        self.client.force_authenticate(self.customer)
+        self.assertEqual([order['id'] for order in self.client.get('/api/orders').data['results']], [self.recent.pk, self.pending.pk])
+        self.assertEqual(self.client.get(f'/api/orders/{self.old[0].pk}').status_code, 404)
+
+        response = self.client.get('/api/orders/archive?page_size=10')
+        self.assertEqual(response.data['count'], 4)
+        order = self.client.get(f'/api/orders/archive/{self.old[0].pk}').data
+        self.assertEqual((order['total'], order['status'], len(order['orderitem'])), ('7.00', True, 2))
+        self.assertEqual(self.client.get(f'/api/orders/archive/{self.old[4].pk}').status_code, 404)
+        self.assertEqual(self.client.patch(f'/api/orders/archive/{self.old[0].pk}', {'status': False}).status_code, 405)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/orders/archive?cursor=&fields=id,user')
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'user'})
+
+
+class OrderBulkTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.managers = Group.objects.create(name='Manager')
+        cls.crew = Group.objects.create(name='Delivery Crew')
+        cls.manager = User.objects.create_user(username='manager')
+        cls.manager.groups.add(cls.managers)
+        cls.couriers = [User.objects.create_user(username=f'courier{i}') for i in range(2)]
+        cls.crew.user_set.add(*cls.couriers)
+        cls.orders = Order.objects.bulk_create(
+            [Order(user=cls.customer, date='2024-01-01', delivery_crew=cls.couriers[i % 2]) for i in range(6)]
+        )
+
+    def patch(self, user, data):
+        self.client.force_authenticate(user)
+        with mock.patch.object(broker, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/orders/bulk', data, format='json')
+        self.published = [event for call in publish.call_args_list for event in call.args[0]]
+        return response
+
+    def test_shift_change_reassigns_with_one_update(self):
+        self.orders[0].status = True
+        self.orders[0].save()
+        #roles, the new member, the savepoint around the locked read and the one UPDATE
+        with self.assertNumQueries(6):
+            response = self.patch(self.manager, {'filter': {'delivery_crew': self.couriers[0].pk, 'status': False},
+                                                 'delivery_crew': self.couriers[1].pk})
+        self.assertEqual(response.data, {'matched': 2, 'updated': 2})
+        self.assertEqual(Order.objects.filter(delivery_crew=self.couriers[1], status=False).count(), 5)
+        self.assertEqual(sorted(event['id'] for event in self.published), [self.orders[2].pk, self.orders[4].pk])
+        self.assertEqual({event['delivery_crew'] for event in self.published}, {self.couriers[1].pk})
+
+    def test_orders_with_the_new_values_are_not_written(self):
+        ids = [order.pk for order in self.orders[:3]]
+        self.assertEqual(self.patch(self.manager, {'ids': ids, 'status': True}).data, {'matched': 3, 'updated': 3})
+        self.assertEqual(self.patch(self.manager, {'ids': ids + [10_000], 'status': True}).data, {'matched': 3, 'updated': 0})
+        self.assertEqual(self.published, [])
+
+    def test_role_rules(self):
+        ids = [order.pk for order in self.orders]
+        self.assertEqual(self.patch(self.customer, {'ids': ids, 'status': True}).status_code, 403)
+        self.assertEqual(self.patch(self.couriers[0], {'ids': ids, 'delivery_crew': self.couriers[0].pk}).status_code, 403)
+        #a delivery crew member only delivers the orders assigned to him
+        self.assertEqual(self.patch(self.couriers[0], {'ids': ids, 'status': True}).data, {'matched': 3, 'updated': 3})
+        self.assertEqual(Order.objects.filter(status=True).count(), 3)
+        self.assertEqual(self.patch(self.manager, {'ids': ids, 'delivery_crew': self.customer.pk}).status_code, 400)
+
+    def test_invalid_requests(self):
+        for data in ({'status': True}, {'ids': [1], 'filter': {'status': False}, 'status': True}, {'ids': [1]},
+                     {'filter': {}, 'status': True}, {'ids': [], 'status': True}):
+            self.assertEqual(self.patch(self.manager, data).status_code, 400, data)
+
+
+
+class IdempotencyTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fill_cart(self.customer, 3)
+        self.client.force_authenticate(self.customer)
+
+    def checkout(self, key='order-1', date='2024-01-01'):
+        return self.client.post('/api/orders', {'date': date}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_checkout_is_replayed(self):
+        first = self.checkout()
+        self.assertEqual(first.status_code, 201)
+        #the cart is empty now, a second checkout would answer "no item in cart"
+        #the INSERT refused by the unique index (in its savepoint) and the read of the stored response
+        with self.assertNumQueries(5):
+            retry = self.checkout()
+        self.assertEqual((retry.status_code, retry.data, retry['Idempotent-Replayed']), (201, first.data, 'true'))
+        self.assertEqual(Order.objects.count(), 1)
+        #another key is another request, and the key of a user means nothing for the others
+        self.assertEqual(self.checkout(key='order-2').data, {'message:': 'no item in cart'})
+        self.client.force_authenticate(User.objects.create_user(username='other'))
+        self.assertNotIn('Idempotent-Replayed', self.checkout())
+
+    def test_retried_cart_add_is_added_once(self):
+        for _ in range(2):
+            response = self.client.post('/api/cart/menu-items', {'menuitem': self.menuitems[5].pk, 'quantity': 2},
+                                        format='json', HTTP_IDEMPOTENCY_KEY='add-5')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Cart.objects.get(user=self.customer, menuitem=self.menuitems[5]).quantity, 2)
+
+    def test_key_reused_with_another_body(self):
+        self.checkout()
+        self.assertEqual(self.checkout(date='2024-01-02').status_code, 422)
+        self.assertEqual(self.checkout(key='k' * 256).status_code, 400)
+
+    def test_duplicate_waits_for_the_first_request(self):
+        first = self.checkout()
+        record = IdempotencyKey.objects.get()
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None, response=None)
+        with override_settings(IDEMPOTENCY_WAIT=0):
+            response = self.checkout()
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+
+        #the first request finishes while the duplicate waits for it
+        def finished(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(status_code=201, response=first.data)
+        with mock.patch.object(idempotency.time, 'sleep', side_effect=finished) as sleep:
+            response = self.checkout()
+        self.assertEqual((response.status_code, response.data), (201, first.data))
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_replay_has_the_headers_of_the_view(self):
+        create = OrderView.create
+
+        def located(view, request, *args, **kwargs):
+            response = create(view, request, *args, **kwargs)
+            response['Location'] = f"/api/orders/{response.data['id']}"
+            return response
+        with mock.patch.object(OrderView, 'create', located):
+            first = self.checkout()
+        retry = self.checkout()
+        self.assertEqual((retry['Location'], retry['Content-Type']), (first['Location'], 'application/json'))
+
+    def test_overlapping_request_does_not_overwrite_the_retry(self):
+        first, _ = idempotency.claim(self.customer, 'slow', 'digest')
+        first.created = timezone.now() - datetime.timedelta(minutes=5)
+        IdempotencyKey.objects.filter(pk=first.pk).update(created=first.created)
+        retry, owner = idempotency.claim(self.customer, 'slow', 'digest')
+        self.assertTrue(owner)
+
+        with self.assertLogs('AppRestaurantAPI.idempotency', 'WARNING'):
+            idempotency.finish(first, Response({'order': 1}, 201))
+        idempotency.finish(retry, Response({'order': 2}, 201))
+        self.assertEqual(IdempotencyKey.objects.get().response, {'order': 2})
+
+    def test_expired_and_failed_keys_run_again(self):
+        self.checkout()
+        IdempotencyKey.objects.update(expires=timezone.now())
+        self.assertEqual(idempotency.prune_expired(), 1)
+        self.fill_cart(self.customer, 1)
+        with mock.patch.object(OrderView, 'create', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.checkout()
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+#A client of /api/orders/events talking straight to the ASGI application, like uvicorn / daphne would
+class EventStream:
+    def __init__(self, token):
+        self.token = token
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.requested = False
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        await self.messages.put(message)
+
+    async def open(self):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/api/orders/events', 'raw_path': b'/api/orders/events', 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {self.token}'.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        self.task = asyncio.create_task(application(scope, self.receive, self.send))
+        self.start = await self.messages.get()
+        if self.start['status'] == 200:
+            #the first chunk (the retry interval) means the client is subscribed
+            await self.read()
+        return self
+
+    async def read(self):
+        return (await asyncio.wait_for(self.messages.get(), 5))['body'].decode()
+
+    async def events(self):
+        data = []
+        while not self.messages.empty():
+            body = (await self.messages.get())['body'].decode()
+            data += [json.loads(line[6:]) for line in body.splitlines() if line.startswith('data: ')]
+        return data
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+class OrderEventTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.managers = Group.objects.create(name='Manager')
+        cls.crew = Group.objects.create(name='Delivery Crew')
+        cls.manager = User.objects.create_user(username='manager')
+        cls.manager.groups.add(cls.managers)
+        cls.courier = User.objects.create_user(username='courier')
+        cls.courier.groups.add(cls.crew)
+        cls.other = User.objects.create_user(username='other')
+        cls.tokens = {user: Token.objects.create(user=user).key for user in (cls.customer, cls.manager, cls.courier, cls.other)}
+        cls.order = Order.objects.create(user=cls.customer, date='2024-01-01')
+
+    def setUp(self):
+        super().setUp()
+        #like the test client, the connection of the test transaction must not be closed at the start of each request
+        request_signals.request_started.disconnect(close_old_connections)
+        self.addCleanup(request_signals.request_started.connect, close_old_connections)
+
+    def save(self, order, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(order, name, value)
+            order.save()
+
+    def dispatch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch_orders()
+
+    async def settle(self):
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    async def test_changes_reach_the_clients_that_see_the_order(self):
+        streams = {
+            user: await asyncio.gather(*[EventStream(self.tokens[user]).open() for _ in range(75)])
+            for user in (self.customer, self.manager, self.courier, self.other)
+        }
+        self.assertEqual(broker.count(), 300)
+        self.assertEqual(streams[self.customer][0].start['status'], 200)
+
+        await sync_to_async(self.save)(self.order, delivery_crew=self.courier)
+        await sync_to_async(self.save)(self.order, status=True)
+        await self.settle()
+
+        expected = [
+            {'id': self.order.pk, 'status': False, 'delivery_crew': self.courier.pk},
+            {'id': self.order.pk, 'status': True, 'delivery_crew': self.courier.pk},
+        ]
+        for user in (self.customer, self.manager, self.courier):
+            for stream in streams[user]:
+                self.assertEqual(await stream.events(), expected)
+        for stream in streams[self.other]:
+            self.assertEqual(await stream.events(), [])
+
+        await asyncio.gather(*[stream.close() for group in streams.values() for stream in group])
+        self.assertEqual(broker.count(), 0)
+
+    async def test_dispatch_is_pushed(self):
+        courier = await EventStream(self.tokens[self.courier]).open()
+        await sync_to_async(self.dispatch)()
+        await self.settle()
+        self.assertEqual(await courier.events(), [{'id': self.order.pk, 'status': False, 'delivery_crew': self.courier.pk}])
+        await courier.close()
+
+    async def test_needs_authentication(self):
+        stream = await EventStream('nope').open()
+        self.assertEqual(stream.start['status'], 401)
+        await stream.close()
+
+    @override_settings(ORDER_EVENTS_DATABASE=True, ORDER_EVENTS_POLL=0.01)
+    async def test_database_fan_out(self):
+        manager = await EventStream(self.tokens[self.manager]).open()
+        customer = await EventStream(self.tokens[self.customer]).open()
+        await sync_to_async(self.save)(self.order, status=True)
+        self.assertEqual(await sync_to_async(self.order.events.count)(), 1)
+
+        self.assertIn('"status": true', await manager.read())
+        self.assertIn('"status": true', await customer.read())
+        await manager.close()
+        await customer.close()
+        await asyncio.wait_for(broker.listener, 5)
+
+    @override_settings(ORDER_EVENTS_DATABASE=True, ORDER_EVENTS_POLL=0.01)
+    async def test_event_committed_late_is_delivered(self):
+        manager = await EventStream(self.tokens[self.manager]).open()
+        #the event with the higher id commits first, the lower id is skipped over and looked for again
+        await OrderEvent.objects.acreate(id=2, order=self.order, status=True)
+        self.assertIn('"status": true', await manager.read())
+        await OrderEvent.objects.acreate(id=1, order=self.order, status=False)
+        self.assertIn('"status": false', await manager.read())
+        await manager.close()
+        await asyncio.wait_for(broker.listener, 5)
+
+    @override_settings(ORDER_EVENTS_DATABASE=True)
+    def test_writers_prune_old_events(self):
+        self.save(self.order, status=True)
+        OrderEvent.objects.update(created=timezone.now() - 2 * events.KEEP_EVENTS)
+        with mock.patch.object(events, 'pruned', 0):
+            self.save(self.order, status=False)
+        self.assertEqual(list(OrderEvent.objects.values_list('status', flat=True)), [False])
+
+
+@override_settings(
+    STORAGES={'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+    LANDING_BUILD_DIR=None,
+)
+class LandingPageTests(TestCase):
+    def setUp(self):
+        get_landing_page.cache_clear()
+
+    def tearDown(self):
+        get_landing_page.cache_clear()
+
+    def test_gzip_variant_and_etag(self):
+        response = self.client.get('/api/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'<!DOCTYPE html>', gzip.decompress(response.content))
+
+        not_modified = self.client.get('/api/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_identity_has_its_own_etag(self):
+        plain = self.client.get('/api/')
+        compressed = self.client.get('/api/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+        self.assertEqual(self.client.get('/api/', HTTP_ACCEPT_ENCODING='gzip;q=0').get('Content-Encoding'), None)
+
+    def test_template_is_rendered_once(self):
+        self.client.get('/api/')
+        with self.assertTemplateNotUsed('index.html'):
+            self.client.get('/api/')
+
+    def test_prebuilt_page_is_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            (Path(directory) / 'index.html').write_bytes(b'<p>prebuilt</p>')
+            with override_settings(LANDING_BUILD_DIR=directory):
+                self.assertEqual(self.client.get('/api/').content, b'<p>prebuilt</p>')
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        css = Path(self.root.name) / 'css'
+        css.mkdir()
+        (css / 'style.0123456789ab.css').write_bytes(b'body{}' * 100)
+        (css / 'style.0123456789ab.css.gz').write_bytes(gzip.compress(b'body{}' * 100))
+        (css / 'style.css').write_bytes(b'body{}' * 100)
+
+    def get(self, path, **headers):
+        with override_settings(STATIC_ROOT=self.root.name):
+            return static_asset(RequestFactory().get('/static/' + path, **headers), path)
+
+    def test_hashed_files_are_cached_for_a_year(self):
+        response = self.get('css/style.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'text/css')
+
+    def test_plain_names_are_revalidated(self):
+        response = self.get('css/style.css')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(self.get('css/style.css', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_paths_outside_the_root_are_refused(self):
+        with self.assertRaises(Http404):
+            self.get('../secret.txt')
@@ -1,23 +1,63 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+
+#With ASYNC_VIEWS on in settings.py the read-heavy lists are served by the async views (async_views.py), otherwise by the DRF views
+if getattr(settings, 'ASYNC_VIEWS', False):
+    categories_view = async_views.categories
+    menu_items_view = async_views.menu_items
+    orders_view = async_views.orders
+else:
+    categories_view = views.CategoriesView.as_view()
+    menu_items_view = views.MenuItemsView.as_view()
+    orders_view = views.OrderView.as_view()
 
 urlpatterns = [
     #This is how we map class based views to the URLS, the difference with the function based views is that here we add ".as_view()" at the end
 
     #The below path leads us to the categories our restaurant has
-    path('categories', views.CategoriesView.as_view()),
+    path('categories', categories_view),
     #The path below let's us see and modify the exact category referring to its ID
     path('categories/<int:pk>', views.SingleCategoryView.as_view()),
     #The path below leads us to the menuitems our restaurant has
-    path('menu-items', views.MenuItemsView.as_view()),
+    path('menu-items', menu_items_view),
     #Below is the same as above, but here <int:pk> specifies that at the end of url user adds a number of the specific number and goes there
     path('menu-items/<int:pk>', views.SingleMenuItemView.as_view()),
+    #The path below searches the menu items by their title and category as the user types
+    path('menu-items/search', views.MenuSearchView.as_view()),
+    #The paths below import many menu items at once from CSV / JSON lines and export the whole menu the same way
+    path('menu-items/import', views.MenuImportView.as_view()),
+    path('menu-items/export', views.MenuExportView.as_view()),
     #The path below leads us to the CART of a specific user
     path('cart/menu-items', views.CartView.as_view()),
     #The path below leads us to the page with orders to see or create
-    path('orders', views.OrderView.as_view()),
+    path('orders', orders_view),
+    #The path below streams the status / delivery crew changes of the orders as Server-Sent Events (needs ASGI)
+    path('orders/events', async_views.order_events),
+    #The path below assigns the orders without a delivery crew member, managers only
+    path('orders/dispatch', views.DispatchView.as_view()),
+    #The path below changes the status / delivery crew of many orders at once (managers, delivery crew for the status only)
+    path('orders/bulk', views.OrderBulkView.as_view()),
     #The path below let's us see and modify the exact order referring to its ID
     path('orders/<int:pk>', views.SingleOrderView.as_view()),
+    #The paths below read the delivered orders moved to the archive (see archive.py)
+    path('orders/archive', views.ArchivedOrdersView.as_view()),
+    path('orders/archive/<int:pk>', views.SingleArchivedOrderView.as_view()),
+    #The path below shows the status of a checkout queued when ASYNC_ORDERS is on
+    path('orders/jobs/<int:pk>', views.CheckoutJobView.as_view(), name='checkout-job'),
+    #The paths below lead us to the tables, the opening hours and the bookings of tables, and to the free times for a party
+    path('tables', views.TablesView.as_view()),
+    path('tables/<int:pk>', views.SingleTableView.as_view()),
+    path('seatings', views.SeatingsView.as_view()),
+    path('seatings/<int:pk>', views.SingleSeatingView.as_view()),
+    path('reservations', views.BookingsView.as_view()),
+    path('reservations/<int:pk>', views.SingleBookingView.as_view()),
+    path('reservations/availability', views.AvailabilityView.as_view()),
+    #The path below leads managers to the sales reports: analytics/daily, analytics/categories, analytics/menu-items, analytics/top-items
+    path('analytics/<slug:report>', views.AnalyticsView.as_view()),
+    #The path below exposes the request metrics collected when PROFILING is on, in the Prometheus text format
+    path('_metrics', views.MetricsView.as_view()),
 
 
 
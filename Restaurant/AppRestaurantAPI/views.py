@@ -1,6 +1,3 @@
-from django.shortcuts import render
-
-
 #importing generics which help our classes to perform HTTP methods like GET, POST, PUT, PATCH
 from rest_framework import generics
 
@@ -9,10 +6,26 @@ from rest_framework.permissions import IsAuthenticated
 
 #importing the models we created to the views so we could refer to them here to perform certain actions
 
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, CheckoutJob, Table, Seating, Booking, ArchivedOrder
 
 #Importing serializers we created at serializers.py
-from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer, UserSerilializer
+from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer, UserSerilializer, CheckoutJobSerializer
+from .serializers import TableSerializer, SeatingSerializer, BookingSerializer, ArchivedOrderSerializer
+
+#Importing the checkout functions which turn a cart into an order (directly or through the queue of checkout jobs)
+from .checkout import place_order, enqueue_checkout
+
+#Importing the functions which keep the total of the cart
+from .cart import clear_cart, get_cart_total
+
+#Importing the mixin that caches the serialized pages of the menu
+from .menu_cache import MenuCacheMixin
+
+#Importing the pagination classes which add the keyset (cursor) mode to the lists of orders and menu items
+from .pagination import OrderPagination, MenuItemPagination
+
+#Importing the helpers that read the roles (groups) of the user once per request
+from .roles import is_manager_or_super, is_delivery_crew, is_customer
 
 # The line below imports the RESPONSE method for the RETURN method.
 # It is used as a way to send a response from the server to the client in the form of a serialized data structure, such as JSON or XML.
@@ -35,17 +48,65 @@ from rest_framework import viewsets
 # Imports the status method which is able to return an HTTP result status e.g. status.HTTP_403_Forbidden or status.HTTP_404_NOTFOUND
 from rest_framework import status, permissions
 
+# Imports the project settings, used to read the switches of the app (e.g. ASYNC_ORDERS)
+from django.conf import settings
+
+# Imports the reverse func which builds the absolute url of a named path
+from rest_framework.reverse import reverse
+
+# Imports the APIView class, the base of the views which don't fit the generic ones, and the response that streams its content
+from rest_framework.views import APIView
+from django.http import Http404, StreamingHttpResponse
+
+# Imports the bulk import and export of the menu
+from . import menu_bulk
+
+# Imports the search of the menu, answered from an in-memory index
+from . import menu_search
+
+# Imports the sparse fieldsets (?fields= / ?expand=) and the compact serialization of the lists
+from .fieldsets import SparseFieldsetMixin
+
+# Imports the filters and the ordering of the menu items list
+from .filters import MenuItemFilter, MenuItemOrdering
+from rest_framework.filters import SearchFilter
+
+# Imports the precompressed delivery of the landing page and the static files
+from .landing import landing_response, static_response
+
+#Importing the dispatch of the pending orders to the delivery crew
+from .dispatch import dispatch_orders
+
+#Importing the bulk change of the status / delivery crew of the orders
+from .order_bulk import bulk_update_orders
+
+#Importing the sales reports
+from . import analytics
+
+#Importing the table reservations
+from . import reservations
+import datetime
+from django.utils.dateparse import parse_date, parse_time
+
+#Importing the profiling of the requests
+from . import profiling
+from rest_framework.renderers import JSONRenderer
+
+#Importing the Idempotency-Key handling of the POST endpoints
+from .idempotency import IdempotentMixin
+
 
 #The class below is a custom permission method that I've created that checks of the user belongs to superuser or to a manager group..
 #..if so the return of the function will be TRUE which will allow actions
-#The class is used at get_permissions func at any view
+#The class is used at get_permissions func at any view. The groups of the user are read through roles.py, so they are loaded once per request
 class IsManagerOrSuper(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_superuser or request.user.groups.filter(name='Manager').exists()
+        return is_manager_or_super(request)
 
 
 
-class CategoriesView(generics.ListCreateAPIView):
+#The list of categories and the list of menu items are served from the menu cache for GET requests (see menu_cache.py)
+class CategoriesView(IdempotentMixin, MenuCacheMixin, generics.ListCreateAPIView):
     #ListCreateAPIView requires 2 args - queryset which represnts model and serializer class
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -73,13 +134,17 @@ class SingleCategoryView(generics.RetrieveUpdateDestroyAPIView):
 
 
 
-class MenuItemsView(generics.ListCreateAPIView):
+class MenuItemsView(IdempotentMixin, MenuCacheMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
+    #Filtering by category, featured, price range and stock (see filters.py), then the search and the ordering
+    filter_backends = [MenuItemFilter, SearchFilter, MenuItemOrdering]
     #The line below allows us a search for items by title of the category
     search_fields = ['category__title']
-    #The line below allows us ordering by either price or inventory (if we remove that, that ordering will be performed across all fields of Model)
-    ordering_fields = ['price', 'inventory']
+    #The line below allows us ordering by price, inventory or title (if we remove that, that ordering will be performed across all fields of Model)
+    ordering_fields = ['price', 'inventory', 'title']
+    #Page number pagination, or keyset pagination on (price, title) when the "cursor" param is sent
+    pagination_class = MenuItemPagination
 
 
     #Below is a function that used to get the permissions that are required for a certain request.
@@ -120,7 +185,52 @@ class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
 
 
 
-class CartView(generics.ListCreateAPIView):
+#Search as you type over the titles of the menu items and their categories: ?q=chicken piz&limit=10 (at most 50).
+#The results come ranked from the in-memory index of menu_search.py, the database is not queried
+class MenuSearchView(APIView):
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status.HTTP_400_BAD_REQUEST)
+        query = request.query_params.get('q', '')
+        return Response({'query': query, 'results': menu_search.search(query, limit)})
+
+
+#Bulk import of menu items from the body of the request, as CSV (Content-Type: text/csv) or JSON lines (any other type).
+#The body is read as a stream and imported in batches (see menu_bulk.py), the response reports created/updated items and the rejected rows.
+#It takes no Idempotency-Key (the body would have to be read whole to be fingerprinted), an import is an upsert and can be sent again
+class MenuImportView(APIView):
+    permission_classes = [IsAuthenticated, IsManagerOrSuper]
+
+    def post(self, request):
+        file_format = menu_bulk.CSV if request.content_type.startswith('text/csv') else menu_bulk.JSON_LINES
+        lines = menu_bulk.decode_lines(request.stream or [])
+        report = menu_bulk.import_rows(menu_bulk.read_rows(lines, file_format))
+        return Response(report)
+
+
+#Streaming export of the whole menu, ?type=csv (default) or ?type=jsonl. The rows are sent while they are read from the database
+class MenuExportView(APIView):
+    permission_classes = [IsAuthenticated, IsManagerOrSuper]
+
+    def get(self, request):
+        if request.query_params.get('type') == menu_bulk.JSON_LINES:
+            file_format, content_type = menu_bulk.JSON_LINES, 'application/jsonl'
+        else:
+            file_format, content_type = menu_bulk.CSV, 'text/csv'
+        response = StreamingHttpResponse(menu_bulk.export_lines(file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="menu.{file_format}"'
+        return response
+
+
+
+
+
+
+
+
+class CartView(IdempotentMixin, generics.ListCreateAPIView):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
@@ -131,9 +241,15 @@ class CartView(generics.ListCreateAPIView):
     def get_queryset(self):
         return Cart.objects.all().filter(user=self.request.user)
 
+    #The list of the cart also returns the total of the whole cart, it is stored in CartTotal so nothing is summed here
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['total'] = get_cart_total(self.request.user)
+        return response
+
     #This func enables to perform the DELETE request which will delete all the items filtered to a specific user currently using the Cart API
     def delete(self, request, *args, **kwargs):
-        Cart.objects.all().filter(user=self.request.user).delete()
+        clear_cart(self.request.user)
         return Response("ok")
 
 
@@ -146,93 +262,145 @@ class CartView(generics.ListCreateAPIView):
 
 
 
-class OrderView(generics.ListCreateAPIView):
+#The func below returns the orders a user is allowed to see, it is used by OrderView and by the async orders view (async_views.py)
+def get_order_queryset(request):
+    #The items of all the orders on the page are loaded with one extra query (prefetch_related),..
+    #..otherwise OrderSerializer would run a query for the "orderitem" list of every order.
+    #Newest orders come first, the ordering matches the composite indexes of the Order model
+    return scope_orders(request, Order.objects.all().prefetch_related('order').order_by('-date', '-id'))
+
+
+#The func below limits a queryset of orders, live or archived, to the ones the user is allowed to see
+def scope_orders(request, queryset):
+    #Below we set specific conditions to the queryset, check if the user is admin (superuser) and then perform the action of displaying..
+    #..all items in the Orders
+    if request.user.is_superuser:
+        return queryset
+    elif is_customer(request): #normal customer doesn't belong to any group, then we return the items specific to that user
+        return queryset.filter(user=request.user)
+    elif is_delivery_crew(request): #Filterin the users belonging only to the group "Delivery Crew"
+        return queryset.filter(delivery_crew=request.user)  #only show oreders assigned to a specific delivery crew member
+    else: #delivery crew or manager
+        return queryset #If a user accesig belongs to another group other than 0, delivery crew
+
+
+class OrderView(IdempotentMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    #Page number pagination, or keyset pagination on (date, id) when the "cursor" param is sent
+    pagination_class = OrderPagination
 
-    #The func below is used to specify queryset we get with conditions depending on the code inside the func
+    #The func below is used to specify queryset we get with conditions depending on the user, see get_order_queryset above
     def get_queryset(self):
-
-        #Below we set specific conditions to the queryset, check if the user is admin (superuser) and then perform the action of displaying..
-        #..all items in the Orders
-        if self.request.user.is_superuser:
-            return Order.objects.all()
-        elif self.request.user.groups.count()==0: #normal customer doesn't below to the group therefore has count of 0 accroding to the biult in..
-            #..Groups model, then we return the items specific to that user
-            return Order.objects.all().filter(user=self.request.user)
-        elif self.request.user.groups.filter(name='Delivery Crew').exists(): #Filterin the users belonging only to the group "Delivery Crew"
-            return Order.objects.all().filter(delivery_crew=self.request.user)  #only show oreders assigned to a specific delivery crew member
-        else: #delivery crew or manager
-            return Order.objects.all() #If a user accesig belongs to another group other than 0, delivery crew
+        return get_order_queryset(self.request)
 
     #Func that specifies the conditions for the create method. It is used to create and order from the items stored in a user's cart.
-    # 1)  if the objects in the Cart belonging to a specific user =0 then we display a message "no items in cart"
+    #The checkout itself (one transaction, bulk insert of the items) is in checkout.py.
+    #With ASYNC_ORDERS on in settings.py the order isn't placed here: the request is validated, a CheckoutJob is queued..
+    #..and 202 is returned with the job id, the workers (manage.py checkout_worker) then place the order
     def create(self, request, *args, **kwargs):
-        menuitem_count = Cart.objects.all().filter(user=self.request.user).count()
-        if menuitem_count == 0:
+        if getattr(settings, 'ASYNC_ORDERS', False):
+            return self.enqueue(request)
+
+        order_serializer = place_order(self.request.user, request.data)
+        # if the objects in the Cart belonging to a specific user =0 then we display a message "no items in cart"
+        if order_serializer is None:
+            return Response({"message:": "no item in cart"})
+        return Response(order_serializer.data, status.HTTP_201_CREATED)
+
+    #Validates the cart and the posted data the same way the checkout will and queues the job
+    def enqueue(self, request):
+        if not Cart.objects.filter(user=self.request.user).exists():
             return Response({"message:": "no item in cart"})
 
+        data = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
+        OrderSerializer(data={**data, 'user': self.request.user.id, 'total': 0}).is_valid(raise_exception=True)
+
+        job = enqueue_checkout(self.request.user, data)
+        return Response(
+            {"job": job.id, "status": job.status, "url": reverse('checkout-job', args=[job.id], request=request)},
+            status.HTTP_202_ACCEPTED,
+        )
+
+
+
 
-        #2) A copy of the data passed to POST request is assigned to the variable data for possible manipulation of data to modify fields below.
 
-        # For example, if a developer wants to add some additional parameters to the request data dictionary..
-        # ..they can make a shallow copy of the dictionary and add the additional parameters to the copy, instead of adding the parameter..
-        # ..directly to the original dictionary. This ensures that the original request data dictionary remains unchanged.
-        data = request.data.copy()
-        #3) The total price of the items in the user's cart is calculated using get_total_price func below and stored in the total variable.
-        total = self.get_total_price(self.request.user)
-        #4) The calculated total is added to the data as a key-value pair. This becomes our value at OrderSerializer for the field "total"
-        data['total'] = total
-        #5) The user ID associated with the request is added to the data as a key-value pair.This becomes our value at OrderSerializer for the field "user"
-        data['user'] = self.request.user.id
-        #6) The data is then passed to the OrderSerializer to be validated.
-        order_serializer = OrderSerializer(data=data)#in brackets here first "data" is mandatory and always has that name, second is our variable..
-        #..which we defined above and could use another name
 
-        #7) If the data is valid, the fields get a value assigned from the data we have designed above and then it gets saved.
-        if (order_serializer.is_valid()):
-            order = order_serializer.save()
-            #8) The items in the user's cart are retrieved belonging to a user who made a request
-            items = Cart.objects.all().filter(user=self.request.user).all()
-            #9) For each item in the cart, an OrderItem is created and saved referrign to the menuitem_id, price and quantity
-            for item in items.values():
-                orderitem = OrderItem(
-                    order=order,
-                    menuitem_id=item['menuitem_id'],
-                    price=item['price'],
-                    quantity=item['quantity'],
-                )
-                orderitem.save()
-            # 10) after the number 9 all the items belongign to a user in his Cart get deleted
-            Cart.objects.all().filter(user=self.request.user).delete()
-            # 11) A copy of the order serializer data is stored in the result variable to manipulate the total data below
-            result = order_serializer.data.copy()
-            # 12) The calculated total is added to the result as a key-value pair.
-            result['total'] = total
-            # 13) Returns the data we get as the result at order_serializer
-            return Response(order_serializer.data)
 
 
 
-    # The func that calculates the total field
-    def get_total_price(self, user):
-        total = 0
-        items = Cart.objects.all().filter(user=user).all()
-        for item in items.values():
-            total += item['price']
-        return total
 
 
 
 
 
+#The view below shows the status of a queued checkout (ASYNC_ORDERS), when it is done "order" holds the id of the new order
+class CheckoutJobView(generics.RetrieveAPIView):
+    serializer_class = CheckoutJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if self.request.user.is_superuser:
+            return CheckoutJob.objects.all()
+        return CheckoutJob.objects.all().filter(user=self.request.user)
+
+
+
+
+
+
+
+
+
+
+
+
+
+#The view below hands out the orders without a delivery crew member to the least loaded members (dispatch.py), managers only.
+#?limit=N assigns at most N orders
+class DispatchView(IdempotentMixin, APIView):
+    permission_classes = [IsAuthenticated, IsManagerOrSuper]
+
+    def post(self, request):
+        limit = request.query_params.get('limit')
+        return Response(dispatch_orders(limit=int(limit) if limit and limit.isdigit() else None))
+
+
+#The view below changes the status and/or the delivery crew of many orders at once with one UPDATE (order_bulk.py),..
+#..the orders are given as a list of ids or as a filter and the response only counts them: {"matched": n, "updated": n}
+class OrderBulkView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    def patch(self, request):
+        return Response(bulk_update_orders(request, get_order_queryset(request), request.data))
 
 
+#The view below answers the sales reports (analytics.py) for managers: daily, categories, menu-items and top-items,..
+#..all of them limited with ?from=YYYY-MM-DD&to=YYYY-MM-DD
+class AnalyticsView(APIView):
+    permission_classes = [IsAuthenticated, IsManagerOrSuper]
 
+    def get(self, request, report):
+        if report not in analytics.REPORTS:
+            raise Http404
+        start, end = analytics.date_range(request.query_params)
+        results = analytics.REPORTS[report](request.query_params, start, end)
+        return Response({'from': start, 'to': end, 'results': results})
 
 
+#The view below exposes the histograms of ProfilingMiddleware (profiling.py) in the Prometheus text format,..
+#..?format=json gives the slowest endpoints and the repeated SQL statements instead (see "manage.py profile_report")
+class MetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsManagerOrSuper]
+    renderer_classes = [profiling.PrometheusRenderer, JSONRenderer]
+
+    def get(self, request):
+        if request.accepted_renderer.format == 'json':
+            limit = request.query_params.get('limit', '')
+            return Response(profiling.registry.report(limit=int(limit) if limit.isdigit() else 20))
+        return Response(profiling.registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 class SingleOrderView(generics.RetrieveUpdateAPIView):
@@ -242,7 +410,7 @@ class SingleOrderView(generics.RetrieveUpdateAPIView):
 
     #specifying the conditions for the update (put / patch method)
     def update(self, request, *args, **kwargs):
-        if self.request.user.groups.count()==0: # Normal user, not belonging to any group = Customer
+        if is_customer(self.request): # Normal user, not belonging to any group = Customer
             return Response('Not Ok')
         else: #everyone else - Super Admin, Manager and Delivery Crew
             return super().update(request, *args, **kwargs)
@@ -260,8 +428,134 @@ class SingleOrderView(generics.RetrieveUpdateAPIView):
 
 
 
+#The views below read the history of the orders moved to the archive (archive.py), with the same visibility as /api/orders.
+#The archive is read only, the list takes the same params as /api/orders (?page=, ?cursor=, ?fields=, ?expand=)
+def get_archived_order_queryset(request):
+    return scope_orders(request, ArchivedOrder.objects.all().prefetch_related('items').order_by('-date', '-id'))
+
+
+class ArchivedOrdersView(SparseFieldsetMixin, generics.ListAPIView):
+    serializer_class = ArchivedOrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderPagination
+
+    def get_queryset(self):
+        return get_archived_order_queryset(self.request)
+
+
+class SingleArchivedOrderView(generics.RetrieveAPIView):
+    serializer_class = ArchivedOrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return get_archived_order_queryset(self.request)
+
+
+
+
+
+
+
+
+
+#-------------------------------------------------------------- Table reservations (reservations.py)
+
+#The tables and the opening hours (seatings) can be seen by everyone and changed by managers, like the menu
+class TablesView(IdempotentMixin, generics.ListCreateAPIView):
+    queryset = Table.objects.all().order_by('number')
+    serializer_class = TableSerializer
+
+    def get_permissions(self):
+        permission_classes = []
+        if self.request.method != 'GET':
+            permission_classes = [IsManagerOrSuper]
+
+        return [permission() for permission in permission_classes]
+
+
+class SingleTableView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = Table.objects.all()
+    serializer_class = TableSerializer
+
+    def get_permissions(self):
+        permission_classes = []
+        if self.request.method != 'GET':
+            permission_classes = [IsManagerOrSuper]
+
+        return [permission() for permission in permission_classes]
+
+
+class SeatingsView(IdempotentMixin, generics.ListCreateAPIView):
+    queryset = Seating.objects.all().order_by('weekday', 'opens')
+    serializer_class = SeatingSerializer
+
+    def get_permissions(self):
+        permission_classes = []
+        if self.request.method != 'GET':
+            permission_classes = [IsManagerOrSuper]
+
+        return [permission() for permission in permission_classes]
+
+
+class SingleSeatingView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = Seating.objects.all()
+    serializer_class = SeatingSerializer
+
+    def get_permissions(self):
+        permission_classes = []
+        if self.request.method != 'GET':
+            permission_classes = [IsManagerOrSuper]
+
+        return [permission() for permission in permission_classes]
+
+
+#Customers see and make their own bookings, managers see all of them
+class BookingsView(IdempotentMixin, generics.ListCreateAPIView):
+    serializer_class = BookingSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Booking.objects.all().order_by('start', 'id')
+        if is_manager_or_super(self.request):
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+
+#A booking is cancelled with DELETE, its slots are freed with it
+class SingleBookingView(generics.RetrieveDestroyAPIView):
+    serializer_class = BookingSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if is_manager_or_super(self.request):
+            return Booking.objects.all()
+        return Booking.objects.all().filter(user=self.request.user)
+
+
+#Free start times for a party: ?party=4&date=2024-05-01, optionally &from=18:00&to=21:00&duration=90 (minutes)
+class AvailabilityView(APIView):
+    def get(self, request):
+        params = request.query_params
+        try:
+            party_size = int(params.get('party', ''))
+            duration = datetime.timedelta(minutes=int(params['duration'])) if params.get('duration') else None
+        except ValueError:
+            return Response({'message': 'party and duration must be numbers'}, status.HTTP_400_BAD_REQUEST)
+        try:
+            day = parse_date(params.get('date', ''))
+            from_time = parse_time(params['from']) if params.get('from') else datetime.time.min
+            to_time = parse_time(params['to']) if params.get('to') else datetime.time.max
+        except ValueError:
+            day = None
+        if day is None or from_time is None or to_time is None or party_size < 1:
+            return Response({'message': 'date (YYYY-MM-DD) and party are required, from/to are HH:MM'}, status.HTTP_400_BAD_REQUEST)
+
+        available = reservations.find_availability(party_size, day, from_time, to_time, duration)
+        return Response({'date': day, 'party': party_size, 'available': available})
+
+
 #thIS class is to modify users belonging to managers' group
-class GroupViewSet(viewsets.ViewSet):
+class GroupViewSet(IdempotentMixin, viewsets.ViewSet):
     # Using the viewsets we need to specify the action for used HTTP requests. For that we use def LIST (GET), def create (POST),def destroy (DELETE)
     #.. The names of the functions are always the same for any viewset
     permission_classes = [IsAdminUser]
@@ -297,7 +591,7 @@ class GroupViewSet(viewsets.ViewSet):
 
 
 
-class DeliveryCrewViewSet(viewsets.ViewSet):
+class DeliveryCrewViewSet(IdempotentMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     def list(self, request):
         users = User.objects.all().filter(groups__name='Delivery Crew')
@@ -306,9 +600,8 @@ class DeliveryCrewViewSet(viewsets.ViewSet):
 
     def create(self, request):
         #only for super admin and managers
-        if self.request.user.is_superuser == False:
-            if self.request.user.groups.filter(name='Manager').exists() == False:
-                return Response({"message":"forbidden"}, status.HTTP_403_FORBIDDEN)
+        if not is_manager_or_super(self.request):
+            return Response({"message":"forbidden"}, status.HTTP_403_FORBIDDEN)
 
         user = get_object_or_404(User, username=request.data['username'])
         dc = Group.objects.get(name="Delivery Crew")
@@ -317,9 +610,8 @@ class DeliveryCrewViewSet(viewsets.ViewSet):
 
     def destroy(self, request):
         #only for super admin and managers
-        if self.request.user.is_superuser == False:
-            if self.request.user.groups.filter(name='Manager').exists() == False:
-                return Response({"message":"forbidden"}, status.HTTP_403_FORBIDDEN)
+        if not is_manager_or_super(self.request):
+            return Response({"message":"forbidden"}, status.HTTP_403_FORBIDDEN)
         user = get_object_or_404(User, username=request.data['username'])
         dc = Group.objects.get(name="Delivery Crew")
         dc.user_set.remove(user)
@@ -332,5 +624,11 @@ class DeliveryCrewViewSet(viewsets.ViewSet):
 
 
 
+#The landing page is rendered once and sent precompressed with a strong ETag (see landing.py)
 def index(request):
-    return render(request, 'index.html')
\ No newline at end of file
+    return landing_response(request)
+
+
+#Serves the files collected to STATIC_ROOT with their prebuilt gzip/brotli versions, only routed when SERVE_STATIC is on
+def static_asset(request, path):
+    return static_response(request, path)
\ No newline at end of file
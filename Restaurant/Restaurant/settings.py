@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    #records the latency and the queries of every request when PROFILING is on (first, so it measures the other middleware too)
+    'AppRestaurantAPI.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,6 +98,25 @@ DATABASES = {
 }
 
 
+#The cache used by the app (e.g. for the menu pages, see AppRestaurantAPI/menu_cache.py).
+#Local memory is enough for development and tests, in production with several processes point it to a shared backend..
+#..like 'django.core.cache.backends.redis.RedisCache' so all the processes see the same menu version
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+#How long (in seconds) a cached menu page is kept, a change of the menu invalidates the pages earlier
+MENU_CACHE_TIMEOUT = 60 * 60
+
+#How long (in seconds) the group names of a user are cached between requests (see AppRestaurantAPI/roles.py)
+ROLE_CACHE_TIMEOUT = 60
+
+#How long (in seconds) a token and its user are cached between requests (see AppRestaurantAPI/authentication.py)
+TOKEN_CACHE_TIMEOUT = 60 * 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -143,6 +164,25 @@ STATICFILES_DIRS = [
     BASE_DIR / "static"
 ]
 
+#collectstatic copies all the static files here, with the content hash in their names and .gz/.br versions next to them..
+#..(see AppRestaurantAPI/storage.py). While DEBUG is on, the {% static %} tag keeps using the plain names
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'AppRestaurantAPI.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+#Where "manage.py build_landing" writes the pre-rendered landing page, the index view sends it from there when it exists
+LANDING_BUILD_DIR = BASE_DIR / "build" / "landing"
+
+#Set to True when django serves the static files itself (no web server in front of it)
+SERVE_STATIC = False
+
 
 
 # Default primary key field type
@@ -164,8 +204,8 @@ REST_FRAMEWORK = {
 
     #This section provides the options for deafault authentication to our web app
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        #enables authentication with the built in token auth in django using rest framework lib
-        'rest_framework.authentication.TokenAuthentication',
+        #enables authentication with the built in token auth in django using rest framework lib, with the token lookup cached
+        'AppRestaurantAPI.authentication.CachedTokenAuthentication',
         #enables a djoser auth simultaniously with the standart auth method just line above
         'rest_framework.authentication.SessionAuthentication',
     ),
@@ -175,6 +215,54 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 4
 }
 
+#When True, POST /api/orders only queues the checkout and answers 202 with a job id, the order is placed by the workers..
+#..started with "python manage.py checkout_worker --processes N". The status is at /api/orders/jobs/<id>
+ASYNC_ORDERS = False
+
+#How often (in seconds) an idle checkout worker looks for new jobs
+CHECKOUT_WORKER_POLL = 1.0
+
+#A checkout job that raised an unexpected error this many times is marked failed instead of being retried again
+CHECKOUT_JOB_MAX_ATTEMPTS = 3
+
+#When True, the GET lists of categories, menu items and orders are served by async views (AppRestaurantAPI/async_views.py)..
+#..which don't hold a thread per request when the project runs under ASGI (e.g. "uvicorn Restaurant.asgi:application")
+ASYNC_VIEWS = False
+
+#/api/orders/events (AppRestaurantAPI/events.py): with ORDER_EVENTS_DATABASE on the changes of the orders are written to the..
+#..database and polled every ORDER_EVENTS_POLL seconds, so they reach the clients of every process. Leave it off with a single ASGI process
+ORDER_EVENTS_DATABASE = False
+ORDER_EVENTS_POLL = 0.5
+#Seconds between the keepalive comments sent to an idle event stream
+ORDER_EVENTS_KEEPALIVE = 15
+
+#Delivered orders older than ORDER_ARCHIVE_DAYS days are moved to the archive tables by "manage.py archive_orders"..
+#..(AppRestaurantAPI/archive.py), /api/orders then only reads the recent ones and the history is at /api/orders/archive
+ORDER_ARCHIVE_DAYS = 365
+
+#A POST sent with an Idempotency-Key header is done once, its retries get the same response (AppRestaurantAPI/idempotency.py).
+#The keys are kept IDEMPOTENCY_KEY_TTL seconds, a retry arriving while the first request runs waits up to IDEMPOTENCY_WAIT..
+#..seconds for its response, a request that hasn't finished after IDEMPOTENCY_LOCK_TIMEOUT seconds is taken to be lost
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_WAIT = 10
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+#When True, the latency, SQL queries and render time of every request are recorded per endpoint (AppRestaurantAPI/profiling.py)..
+#..and exposed at /api/_metrics
+PROFILING = False
+
+#Table reservations (AppRestaurantAPI/reservations.py): bookings start and end on a grid of RESERVATION_SLOT_MINUTES,..
+#..last RESERVATION_DURATION_MINUTES unless the client asks otherwise, and at most RESERVATION_MAX_MINUTES.
+#The booked slots are stored by number, so RESERVATION_SLOT_MINUTES can't be changed once there are bookings.
+#The tables and opening hours are cached for FLOOR_PLAN_CACHE_TIMEOUT seconds (dropped sooner when they change)
+RESERVATION_SLOT_MINUTES = 15
+RESERVATION_DURATION_MINUTES = 90
+RESERVATION_MAX_MINUTES = 240
+FLOOR_PLAN_CACHE_TIMEOUT = 60 * 60
+
+#The biggest page a client can ask for with the ?page_size= query param (see AppRestaurantAPI/pagination.py)
+MAX_PAGE_SIZE = 100
+
 
 #Addin a Djoser section to our settings.py to use and customize
 DJOSER = {
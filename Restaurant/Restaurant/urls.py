@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 
 #Importing path for views and include to include apps' urls.py
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from django.conf import settings
+from AppRestaurantAPI.views import static_asset
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -32,6 +35,13 @@ urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
 ]
 
+#When django itself has to serve the collected static files (no web server in front), they are sent with their..
+#..precompressed versions and, for the hashed names, a one year cache
+if getattr(settings, 'SERVE_STATIC', False):
+    urlpatterns += [
+        re_path(r'^' + settings.STATIC_URL.strip('/') + r'/(?P<path>.+)$', static_asset),
+    ]
+
 
 
 